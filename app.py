@@ -40,6 +40,10 @@ def main():
             st.session_state.current_page = "analytics"
             st.rerun()
 
+        if st.button("🏢 Visão Consolidada", use_container_width=True):
+            st.session_state.current_page = "consolidated"
+            st.rerun()
+
         if st.button("📢 Anúncios", use_container_width=True):
             st.session_state.current_page = "announcements"
             st.rerun()
@@ -73,6 +77,9 @@ def main():
         elif page == "analytics":
             from pages.analytics import load_page
             load_page()
+        elif page == "consolidated":
+            from pages.consolidated import show_consolidated
+            show_consolidated()
         elif page == "announcements":
             from pages.announcements import show_announcements
             show_announcements()
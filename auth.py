@@ -2,11 +2,30 @@ import streamlit as st
 import hashlib
 import json
 import os
+import tempfile
+import threading
+import time
+import atexit
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: in-process lock only
+
 # Authentication file path
 AUTH_FILE = "users.json"
 
+# last_login updates are kept in memory and written at most once per interval
+LOGIN_FLUSH_SECONDS = 60
+
+# In-process cache of users.json, invalidated when the file's mtime/size change
+_users_cache = {"signature": None, "users": None}
+_pending_logins = {}
+_last_flush = [time.monotonic()]
+_store_lock = threading.RLock()
+
 def hash_password(password):
     """Hash a password for storing."""
     return hashlib.sha256(str(password).encode()).hexdigest()
@@ -15,21 +34,72 @@ def verify_password(password, hashed):
     """Verify a password against its hash."""
     return hash_password(password) == hashed
 
+def _file_signature():
+    """(mtime, size) of the auth file, or None if it does not exist."""
+    try:
+        stat = os.stat(AUTH_FILE)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+@contextmanager
+def _locked_store():
+    """Exclusive lock on the user store (threads in-process, fcntl across processes)."""
+    with _store_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(f"{AUTH_FILE}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _read_users_file():
+    """Read users.json from disk (None if missing or unreadable)."""
+    try:
+        with open(AUTH_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_users_file(users):
+    """Atomically replace users.json (temp file in the same directory + os.replace)."""
+    directory = os.path.dirname(os.path.abspath(AUTH_FILE))
+    fd, tmp_path = tempfile.mkstemp(prefix=".users.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(users, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, AUTH_FILE)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _users_cache["signature"] = _file_signature()
+    _users_cache["users"] = users
+
 def load_users():
-    """Load users from JSON file."""
-    if os.path.exists(AUTH_FILE):
-        try:
-            with open(AUTH_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
+    """Load users from JSON file (cached until the file changes on disk)."""
+    signature = _file_signature()
+    if signature is not None and signature == _users_cache["signature"]:
+        return _users_cache["users"]
+
+    with _store_lock:
+        users = _read_users_file() if signature is not None else None
+        if users is None:
             return create_default_users()
-    return create_default_users()
+        _users_cache["signature"] = signature
+        _users_cache["users"] = users
+        return users
 
 def save_users(users):
-    """Save users to JSON file."""
+    """Save users to JSON file (locked, atomic)."""
     try:
-        with open(AUTH_FILE, 'w', encoding='utf-8') as f:
-            json.dump(users, f, ensure_ascii=False, indent=2)
+        with _locked_store():
+            _write_users_file(users)
         return True
     except:
         return False
@@ -49,6 +119,35 @@ def create_default_users():
     save_users(default_users)
     return default_users
 
+def flush_last_logins(force=False):
+    """
+    Write pending last_login updates in one read-modify-write under the file lock
+    Re-reads users.json inside the lock so changes by other processes are kept
+    Returns number of users updated
+    """
+    with _store_lock:
+        if not _pending_logins or (not force and time.monotonic() - _last_flush[0] < LOGIN_FLUSH_SECONDS):
+            return 0
+        pending = dict(_pending_logins)
+        _pending_logins.clear()
+        _last_flush[0] = time.monotonic()
+
+        try:
+            with _locked_store():
+                users = _read_users_file()
+                if users is None:
+                    return 0
+                for username, last_login in pending.items():
+                    if username in users:
+                        users[username]["last_login"] = last_login
+                _write_users_file(users)
+            return len(pending)
+        except Exception:
+            # Keep the updates for the next flush (newer logins win)
+            for username, last_login in pending.items():
+                _pending_logins.setdefault(username, last_login)
+            return 0
+
 def authenticate_user(username, password):
     """Authenticate a user."""
     users = load_users()
@@ -56,13 +155,17 @@ def authenticate_user(username, password):
     if username in users:
         user_data = users[username]
         if verify_password(password, user_data["password"]):
-            # Update last login
-            user_data["last_login"] = datetime.now().isoformat()
-            users[username] = user_data
-            save_users(users)
+            # Record last login (written to disk in batches, not on every login)
+            user_data = dict(user_data, last_login=datetime.now().isoformat())
+            with _store_lock:
+                _pending_logins[username] = user_data["last_login"]
+            flush_last_logins()
             return user_data
     return None
 
+# Pending last_login updates are written when the process exits
+atexit.register(flush_last_logins, True)
+
 def is_admin(user_data):
     """Check if user is admin."""
     return user_data and user_data.get("role") == "admin"
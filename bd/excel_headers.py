@@ -0,0 +1,133 @@
+"""
+Excel Header Detection
+Parses each sheet once (header=None) and scores candidate header rows in memory
+Shared by the upload, timeline and analytics pages
+"""
+
+import streamlit as st
+import pandas as pd
+from .excel_reader import file_bytes, parse_sheets, pick_engine, read_excel_fast
+
+# Header rows tried in order - MINIPA exports usually start around row 9-10
+HEADER_CANDIDATES = [0, 8, 9, 10, 7, 6, 11, 12]
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _parse_workbook(file_bytes, max_sheets, engine):
+    """
+    Parse the first max_sheets sheets of a workbook exactly once
+    Returns (all sheet names, {sheet: raw DataFrame with header=None})
+    """
+    return parse_sheets(file_bytes, max_sheets, header=None, engine=engine)
+
+def load_workbook_sheets(uploaded_file, max_sheets=5):
+    """
+    Read a workbook once and keep every parsed sheet in memory
+    Returns (sheet_names, {sheet: raw DataFrame})
+    """
+    engine = pick_engine(getattr(uploaded_file, 'name', None))
+    return _parse_workbook(file_bytes(uploaded_file), max_sheets, engine)
+
+def _is_valid_header(value):
+    """Same rule the pages used on read_excel column names (no None/nan/Unnamed)"""
+    if pd.isna(value):
+        return False
+    col_str = str(value).strip()
+    return (col_str != 'None' and
+            not col_str.startswith('Unnamed') and
+            col_str != 'nan' and
+            len(col_str) > 0)
+
+def _column_names(header_values):
+    """Column names as read_excel(header=n) would build them (Unnamed: i, dedup .1 .2)"""
+    names = []
+    seen = {}
+    for i, value in enumerate(header_values):
+        name = f"Unnamed: {i}" if pd.isna(value) else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def frame_from_raw(raw, header_row, nrows=None):
+    """
+    Build the DataFrame read_excel(header=header_row, nrows=nrows) would return
+    from an already-parsed header=None sheet
+    """
+    if header_row >= len(raw):
+        return pd.DataFrame()
+
+    stop = None if nrows is None else header_row + 1 + nrows
+    df = raw.iloc[header_row + 1:stop].copy()
+    df.columns = _column_names(raw.iloc[header_row].tolist())
+    return df.reset_index(drop=True).infer_objects()
+
+def score_header_row(raw, header_row, nrows=20, expected_columns=None):
+    """
+    Score one candidate header row of a parsed sheet
+    Returns dict with valid_columns, real_headers, data_rows, score and sample
+    """
+    if header_row >= len(raw):
+        return None
+
+    real_headers = [str(v).strip() for v in raw.iloc[header_row].tolist() if _is_valid_header(v)]
+    sample = frame_from_raw(raw, header_row, nrows)
+    data_rows = len(sample.dropna(how='all'))
+    score = len(real_headers) * data_rows
+
+    if expected_columns:
+        # Prioritize files with the expected columns
+        matches = sum(1 for expected in expected_columns
+                      if any(expected.lower() in col.lower() for col in real_headers))
+        score += matches * 10
+
+    return {
+        'valid_columns': len(real_headers),
+        'real_headers': real_headers,
+        'data_rows': data_rows,
+        'score': score,
+        'sample': sample
+    }
+
+def detect_excel_table(uploaded_file, max_sheets=5, expected_columns=None, nrows=20,
+                       min_valid_columns=3, min_data_rows=3):
+    """
+    Find the best (sheet, header row) of a workbook with a single parse per sheet
+    Returns dict with sheets, sheet, header_row and the full DataFrame (df),
+    where sheet/df are None when no candidate qualifies
+    """
+    sheets, raw_sheets = load_workbook_sheets(uploaded_file, max_sheets)
+
+    best = {'sheets': sheets, 'raw_sheets': raw_sheets, 'sheet': None,
+            'header_row': 0, 'score': 0, 'df': None}
+
+    for sheet, raw in raw_sheets.items():
+        for header_row in HEADER_CANDIDATES:
+            result = score_header_row(raw, header_row, nrows, expected_columns)
+            if result is None:
+                continue
+            if (result['score'] > best['score'] and
+                    result['valid_columns'] >= min_valid_columns and
+                    result['data_rows'] >= min_data_rows):
+                best.update(sheet=sheet, header_row=header_row, score=result['score'])
+
+    if best['sheet'] is not None:
+        # Full dataset from the rows already in memory
+        df_full = frame_from_raw(raw_sheets[best['sheet']], best['header_row'])
+        best['df'] = df_full.dropna(how='all')  # Remove completely empty rows
+
+    return best
+
+def read_sheet(uploaded_file, sheet_name=0, header_row=0, max_sheets=5):
+    """
+    Full DataFrame for an explicit sheet/header using the cached parse
+    (fallback paths that used pd.read_excel(header=n) directly)
+    """
+    sheets, raw_sheets = load_workbook_sheets(uploaded_file, max_sheets)
+    if isinstance(sheet_name, int):
+        sheet_name = sheets[sheet_name]
+    if sheet_name in raw_sheets:
+        return frame_from_raw(raw_sheets[sheet_name], header_row)
+    return read_excel_fast(uploaded_file, sheet_name=sheet_name, header=header_row)
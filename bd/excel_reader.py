@@ -0,0 +1,158 @@
+"""
+Excel Reader Engines
+Picks the fastest available parser (calamine when installed, openpyxl
+read-only otherwise) and offers a streaming row-chunk generator
+"""
+
+import io
+import hashlib
+import pandas as pd
+
+def file_bytes(source):
+    """Raw bytes of a Streamlit UploadedFile, file-like object, bytes or path"""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    if hasattr(source, 'read'):
+        source.seek(0)
+        return source.read()
+    with open(source, 'rb') as f:
+        return f.read()
+
+def file_hash(source):
+    """SHA-256 of the raw file bytes - identical files match even when renamed"""
+    return hashlib.sha256(file_bytes(source)).hexdigest()
+
+def _calamine_available():
+    """python-calamine installed and pandas new enough for engine='calamine' (2.2+)"""
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return False
+    major, minor = (int(part) for part in pd.__version__.split('.')[:2])
+    return (major, minor) >= (2, 2)
+
+def available_engines():
+    """Excel engines usable in this environment, fastest first"""
+    engines = []
+    if _calamine_available():
+        engines.append('calamine')
+    engines.append('openpyxl')
+    return engines
+
+def pick_engine(file_name=None, engine=None):
+    """
+    Engine for read_excel: explicit choice, else calamine, else openpyxl
+    (legacy .xls falls back to pandas' default reader when calamine is missing)
+    """
+    if engine:
+        return engine
+    if _calamine_available():
+        return 'calamine'
+    if file_name and str(file_name).lower().endswith('.xls'):
+        return None
+    return 'openpyxl'
+
+def read_excel_fast(source, sheet_name=0, header=0, usecols=None, nrows=None, engine=None):
+    """
+    pd.read_excel with the fastest available engine
+    usecols accepts column names, letters or a callable to read only mapped columns
+    """
+    data = file_bytes(source)
+    chosen = pick_engine(getattr(source, 'name', None), engine)
+    return pd.read_excel(io.BytesIO(data), sheet_name=sheet_name, header=header,
+                         usecols=usecols, nrows=nrows, engine=chosen)
+
+def parse_sheets(source, max_sheets=5, header=None, engine=None):
+    """
+    Parse the first max_sheets sheets with a single workbook load
+    Returns (all sheet names, {sheet: DataFrame})
+    """
+    data = file_bytes(source)
+    chosen = pick_engine(getattr(source, 'name', None), engine)
+    xl_file = pd.ExcelFile(io.BytesIO(data), engine=chosen)
+    sheets = xl_file.sheet_names
+    parsed = {}
+    for sheet in sheets[:max_sheets]:
+        try:
+            parsed[sheet] = xl_file.parse(sheet, header=header)
+        except Exception:
+            continue
+    return sheets, parsed
+
+def _iter_raw_rows(data, sheet_name, engine):
+    """
+    Yield raw row tuples without building the workbook DOM
+    Both engines yield the same cells: rows and columns keep their sheet
+    positions (from A1) and blank cells are None
+    """
+    if engine == 'calamine':
+        from python_calamine import CalamineWorkbook
+        workbook = CalamineWorkbook.from_filelike(io.BytesIO(data))
+        name = workbook.sheet_names[sheet_name] if isinstance(sheet_name, int) else sheet_name
+        sheet = workbook.get_sheet_by_name(name)
+        # calamine starts rows at the first used column and returns blanks as ''
+        start = sheet.start or (0, 0)
+        padding = (None,) * start[1]
+        for row in sheet.iter_rows():
+            yield padding + tuple(None if value == '' else value for value in row)
+    else:
+        from openpyxl import load_workbook
+        workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        try:
+            ws = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+            for row in ws.iter_rows(values_only=True):
+                yield row
+        finally:
+            workbook.close()
+
+def _chunk_frame(buffer, columns):
+    """
+    Rows of one chunk as a DataFrame without blank rows
+    Columns blank in the whole chunk are float NaN (as read_excel types them),
+    so chunks concatenate to the same dtypes whatever the chunk boundaries
+    """
+    frame = pd.DataFrame(buffer, columns=columns)
+    for position in frame.isna().all().to_numpy().nonzero()[0]:
+        frame.isetitem(position, frame.iloc[:, position].astype('float64'))
+    return frame.dropna(how='all')
+
+def iter_excel_chunks(source, sheet_name=0, header_row=0, chunk_size=10000, usecols=None, engine=None):
+    """
+    Stream a sheet as DataFrame chunks of chunk_size rows (constant memory)
+    header_row is the 0-based row holding column names; usecols is a list of
+    names or a callable selecting which columns to keep
+    """
+    data = file_bytes(source)
+    chosen = pick_engine(getattr(source, 'name', None), engine)
+    if chosen not in ('calamine', 'openpyxl'):
+        chosen = 'openpyxl'
+
+    rows = _iter_raw_rows(data, sheet_name, chosen)
+    for _ in range(header_row):
+        next(rows, None)
+
+    header = next(rows, None)
+    if header is None:
+        return
+
+    names = [f"Unnamed: {i}" if value is None or value == '' else value for i, value in enumerate(header)]
+    if usecols is None:
+        keep = list(range(len(names)))
+    elif callable(usecols):
+        keep = [i for i, name in enumerate(names) if usecols(name)]
+    else:
+        wanted = set(usecols)
+        keep = [i for i, name in enumerate(names) if name in wanted]
+    columns = [names[i] for i in keep]
+
+    buffer = []
+    for row in rows:
+        buffer.append([row[i] if i < len(row) else None for i in keep])
+        if len(buffer) >= chunk_size:
+            yield _chunk_frame(buffer, columns)
+            buffer = []
+
+    if buffer:
+        yield _chunk_frame(buffer, columns)
@@ -0,0 +1,153 @@
+"""
+Snowflake Timeline Analyses
+Post-upload stage that computes the purchase timeline of a new TIMELINE
+version for every meta_meses the page offers and bulk-writes it to
+TIMELINE.ANALISES, so page views read precomputed rows instead of
+recomputing the timeline in Python.
+"""
+
+import streamlit as st
+from .snowflake_connection import pooled_connection
+from .snowflake_versions import version_fingerprint
+from .snowflake_data import fetch_dataframe, resolve_version, load_data_with_history
+from .snowflake_bulk import bulk_load_dataframe, batch_insert_records
+from .timeline_calc import calcular_timeline
+
+# meta_meses values precomputed at upload time (the timeline slider range)
+ANALYSIS_META_MESES = range(3, 13)
+
+# Timeline column -> TIMELINE.ANALISES column
+ANALYSIS_COLUMNS = {
+    'Produto': 'produto',
+    'Fornecedor': 'fornecedor',
+    'Dias_Restantes': 'dias_restantes',
+    'Estoque_Atual': 'estoque_atual',
+    'Vendas_Mensais': 'vendas_mensais',
+    'MOQ': 'moq',
+    'Qtd_Otimizada': 'qtd_comprar',
+    'Valor_Pedido': 'valor_pedido',
+    'CBM_Pedido': 'cbm_pedido',
+    'Urgencia': 'urgencia'
+}
+
+def build_timeline_analyses(df, empresa, upload_version, version_id, usuario="minipa"):
+    """
+    Timeline of a version for every ANALYSIS_META_MESES value as one insert-ready frame
+    Returns DataFrame with TIMELINE.ANALISES column names
+    """
+    import pandas as pd
+
+    frames = []
+    for meta_meses in ANALYSIS_META_MESES:
+        timeline = calcular_timeline(df, meta_meses)
+        rows = timeline[list(ANALYSIS_COLUMNS)].rename(columns=ANALYSIS_COLUMNS)
+        rows['ordem'] = range(len(rows))  # Keeps calcular_timeline's stable sort order
+        rows['total_linhas'] = len(rows)  # Expected rows - the loader rejects incomplete analyses
+        rows['meta_meses'] = meta_meses
+        frames.append(rows)
+
+    analyses = pd.concat(frames, ignore_index=True)
+    analyses['empresa'] = empresa
+    analyses['upload_version'] = upload_version
+    analyses['version_id'] = version_id
+    analyses['created_by'] = usuario
+    for column in ['dias_restantes', 'moq', 'qtd_comprar']:
+        analyses[column] = analyses[column].round().astype('int64')
+    return analyses
+
+def precompute_timeline_analyses(empresa, upload_version, version_id, usuario="minipa"):
+    """
+    Compute and store the timeline analyses of a TIMELINE version
+    Reads the version like the timeline page does, replaces any rows stored
+    for it and loads the new ones with a single COPY INTO (executemany fallback).
+    A load with rejected rows is removed again, so the page recomputes instead
+    of showing a partial timeline.
+    Returns number of rows written or None if failed
+    """
+    df = load_data_with_history(empresa=empresa, version_id=version_id)
+    if df is None or df.empty:
+        return None
+
+    analyses = build_timeline_analyses(df, empresa, upload_version, version_id, usuario)
+    delete_sql = "DELETE FROM TIMELINE.ANALISES WHERE empresa = %s AND upload_version = %s"
+
+    with pooled_connection() as conn:
+        if not conn:
+            return None
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute(delete_sql, (empresa, upload_version))
+
+            result = bulk_load_dataframe(conn, analyses, "ANALISES", schema="TIMELINE")
+            if result is None:
+                columns = list(analyses.columns)
+                records = list(analyses.astype(object).itertuples(index=False, name=None))
+                result = batch_insert_records(conn, "ANALISES", columns, records, schema="TIMELINE")
+
+            if result['rejected'] > 0:
+                cursor.execute(delete_sql, (empresa, upload_version))
+                conn.commit()
+                cursor.close()
+                st.warning(f"⚠️ {result['rejected']} análises rejeitadas - timeline será calculada ao abrir a página")
+                return None
+
+            conn.commit()
+            cursor.close()
+
+        except Exception as e:
+            # Any rows left behind fail the loader's row-count check
+            st.warning(f"⚠️ Erro ao gravar análises da timeline: {str(e)}")
+            return None
+
+    load_timeline_analyses.clear()
+    return result['loaded']
+
+def load_timeline_analyses(empresa, version_id=None, meta_meses=6):
+    """
+    Precomputed timeline of a version (None = active) for one meta_meses
+    Cached until the TIMELINE versions fingerprint changes
+    Returns DataFrame with the timeline columns (no colors/dates) or None if not precomputed
+    """
+    if meta_meses not in ANALYSIS_META_MESES:
+        return None
+    fingerprint = version_fingerprint(empresa, "TIMELINE")
+    return _load_timeline_analyses_cached(empresa, version_id, meta_meses, fingerprint)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _load_timeline_analyses_cached(empresa, version_id, meta_meses, fingerprint):
+    """
+    Cached body of load_timeline_analyses - fingerprint only serves as cache key
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return None
+
+        try:
+            upload_version, _, _, _ = resolve_version(conn, empresa, "TIMELINE", version_id)
+            if not upload_version:
+                return None
+
+            query = f"""
+            SELECT {', '.join(f'{column} as "{name}"' for name, column in ANALYSIS_COLUMNS.items())},
+                   total_linhas as "Total_Linhas"
+            FROM TIMELINE.ANALISES
+            WHERE empresa = %s AND upload_version = %s AND meta_meses = %s
+            ORDER BY ordem
+            """
+            df = fetch_dataframe(conn, query, [empresa, upload_version, meta_meses])
+            if df.empty:
+                return None
+
+            # Incomplete load (or rows stored before the count existed) - caller recomputes
+            total = df['Total_Linhas'].iloc[0]
+            if df['Total_Linhas'].isna().any() or (df['Total_Linhas'] != total).any() or len(df) != total:
+                return None
+            return df.drop(columns='Total_Linhas')
+
+        except Exception:
+            # Table/columns not created yet - caller recomputes
+            return None
+
+# Cache clearing through the public name (load_timeline_analyses.clear())
+load_timeline_analyses.clear = _load_timeline_analyses_cached.clear
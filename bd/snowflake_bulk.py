@@ -0,0 +1,133 @@
+"""
+Snowflake Bulk Loading
+Handles set-based ingestion of DataFrames (Parquet stage + COPY INTO)
+and chunked executemany inserts when staging is not available
+"""
+
+import time
+import streamlit as st
+
+def bulk_load_dataframe(conn, df, table_name, schema="ESTOQUE"):
+    """
+    Load a DataFrame into a Snowflake table with a single COPY INTO
+    The frame is written as compressed Parquet, PUT to a temporary stage
+    and copied with ON_ERROR=CONTINUE so bad rows are rejected, not fatal.
+
+    Args:
+        conn: Open Snowflake connection
+        df: Insert-ready DataFrame (column names = table columns)
+        table_name: Target table without schema (e.g. PRODUTOS)
+        schema: Target schema
+
+    Returns dict with loaded/rejected counts and first error,
+    or None if bulk loading is unavailable (caller should fall back)
+    """
+    try:
+        from snowflake.connector.pandas_tools import write_pandas
+    except ImportError:
+        return None
+
+    try:
+        # Upper-case names match the unquoted identifiers used in create_tables
+        success, nchunks, nrows, output = write_pandas(
+            conn,
+            df.rename(columns=str.upper),
+            table_name=table_name,
+            schema=schema,
+            compression="snappy",
+            on_error="CONTINUE",
+            quote_identifiers=True,
+            auto_create_table=False
+        )
+    except Exception as e:
+        # Missing pyarrow, no stage privileges, etc. - nothing was copied
+        st.warning(f"⚠️ Carga em massa indisponível ({str(e)}). Usando inserção alternativa...")
+        return None
+
+    # COPY INTO result rows: (file, status, rows_parsed, rows_loaded, error_limit,
+    #                         errors_seen, first_error, first_error_line, ...)
+    rows_loaded = sum(int(row[3] or 0) for row in output)
+    first_error = next((row[6] for row in output if row[6]), None)
+
+    return {
+        'success': success,
+        'chunks': nchunks,
+        'loaded': rows_loaded,
+        'rejected': max(len(df) - rows_loaded, 0),
+        'first_error': first_error
+    }
+
+def batch_insert_records(conn, table_name, columns, records, schema="ESTOQUE",
+                         chunk_size=5000, max_retries=2):
+    """
+    Insert rows in chunks with executemany (no stage required)
+    Each chunk is one multi-row INSERT round trip. A failing chunk is retried
+    max_retries times; if it still fails its rows are inserted one by one so
+    only the bad rows are rejected.
+
+    Returns dict with loaded/rejected counts and per-chunk throughput
+    """
+    insert_sql = f"""
+    INSERT INTO {schema}.{table_name} 
+    ({', '.join(columns)})
+    VALUES ({', '.join(['%s'] * len(columns))})
+    """
+
+    cursor = conn.cursor()
+    loaded = 0
+    rejected = 0
+    chunk_stats = []
+    total_chunks = max(1, -(-len(records) // chunk_size))
+    progress = st.progress(0.0, text="📤 Enviando dados em lotes...")
+
+    for chunk_number, start in enumerate(range(0, len(records), chunk_size), start=1):
+        chunk = records[start:start + chunk_size]
+        chunk_start = time.perf_counter()
+        attempts = 0
+        chunk_loaded = 0
+
+        while True:
+            attempts += 1
+            try:
+                cursor.executemany(insert_sql, chunk)
+                chunk_loaded = len(chunk)
+                break
+            except Exception as chunk_error:
+                if attempts <= max_retries:
+                    time.sleep(0.5 * attempts)
+                    continue
+
+                st.warning(f"⚠️ Lote {chunk_number} falhou após {attempts} tentativas ({str(chunk_error)}). Inserindo linha a linha...")
+                for idx, record in enumerate(chunk):
+                    try:
+                        cursor.execute(insert_sql, record)
+                        chunk_loaded += 1
+                    except Exception as row_error:
+                        if rejected < 5:  # Show only first 5 errors
+                            st.warning(f"⚠️ Erro na linha {start + idx + 1}: {str(row_error)}")
+                        rejected += 1
+                break
+
+        elapsed = time.perf_counter() - chunk_start
+        rows_per_second = chunk_loaded / elapsed if elapsed > 0 else float(chunk_loaded)
+        loaded += chunk_loaded
+        chunk_stats.append({
+            'chunk': chunk_number,
+            'rows': len(chunk),
+            'loaded': chunk_loaded,
+            'attempts': attempts,
+            'seconds': round(elapsed, 2),
+            'rows_per_second': round(rows_per_second, 1)
+        })
+        progress.progress(
+            chunk_number / total_chunks,
+            text=f"📤 Lote {chunk_number}/{total_chunks}: {chunk_loaded} linhas ({rows_per_second:,.0f} linhas/s)"
+        )
+
+    cursor.close()
+
+    return {
+        'loaded': loaded,
+        'rejected': rejected,
+        'chunks': chunk_stats
+    }
@@ -0,0 +1,130 @@
+"""
+Snowflake Version Disk Cache
+Stores each uploaded version as a compressed Parquet file so loads survive
+restarts and redeploys. Versions are immutable once uploaded, so entries
+never go stale - they are only evicted by the LRU size budget or on delete.
+"""
+
+import os
+import shutil
+import time
+import uuid
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Local disk cache settings
+CACHE_SETTINGS = {
+    "directory": os.path.join(".cache", "versions"),
+    "max_bytes": 512 * 1024 * 1024,  # LRU budget: 512 MB
+    "compression": "zstd"
+}
+
+def _cache_path(empresa, table_type, upload_version):
+    safe_version = str(upload_version).replace(os.sep, "_")
+    return os.path.join(CACHE_SETTINGS["directory"], empresa, table_type, f"{safe_version}.parquet")
+
+def read_cached_version(empresa, table_type, upload_version):
+    """
+    Load a version from local disk (memory-mapped Parquet)
+    Returns DataFrame or None on cache miss
+    """
+    if not PYARROW_AVAILABLE or not upload_version:
+        return None
+
+    path = _cache_path(empresa, table_type, upload_version)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        table = pq.read_table(path, memory_map=True)
+        os.utime(path, None)  # Mark as recently used for LRU eviction
+        return table.to_pandas()
+    except Exception:
+        # Corrupt or partial file - drop it and let the caller reload
+        evict_cached_version(empresa, table_type, upload_version)
+        return None
+
+def write_cached_version(empresa, table_type, upload_version, df):
+    """
+    Persist a loaded version to local disk (atomic write)
+    Returns True if written
+    """
+    if not PYARROW_AVAILABLE or not upload_version or df is None:
+        return False
+
+    path = _cache_path(empresa, table_type, upload_version)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(table, tmp_path, compression=CACHE_SETTINGS["compression"])
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+    enforce_cache_budget()
+    return True
+
+def evict_cached_version(empresa, table_type, upload_version):
+    """Remove one version from the disk cache (e.g. after delete_version)"""
+    path = _cache_path(empresa, table_type, upload_version)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def clear_disk_cache():
+    """Remove every cached version (e.g. after the whole database is cleared)"""
+    shutil.rmtree(CACHE_SETTINGS["directory"], ignore_errors=True)
+
+def enforce_cache_budget(max_bytes=None):
+    """
+    Delete least-recently-used files until the cache fits max_bytes
+    Returns number of files evicted
+    """
+    max_bytes = max_bytes or CACHE_SETTINGS["max_bytes"]
+    entries = []
+    for root, _, files in os.walk(CACHE_SETTINGS["directory"]):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            # Leftover temp files from interrupted writes are always removed
+            if name.endswith(".tmp") and time.time() - stat.st_mtime > 3600:
+                entries.append((0, stat.st_size, path))
+            elif name.endswith(".parquet"):
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes and not path.endswith(".tmp"):
+            break
+        try:
+            os.remove(path)
+            total -= size
+            evicted += 1
+        except OSError:
+            continue
+    return evicted
+
+def get_cache_statistics():
+    """Number of cached versions and total size in bytes"""
+    files = 0
+    total = 0
+    for root, _, names in os.walk(CACHE_SETTINGS["directory"]):
+        for name in names:
+            if name.endswith(".parquet"):
+                files += 1
+                total += os.path.getsize(os.path.join(root, name))
+    return {"versions": files, "bytes": total, "max_bytes": CACHE_SETTINGS["max_bytes"]}
@@ -9,6 +9,8 @@ with a clean, modular structure.
 # Import all functions from modular files
 from .snowflake_connection import (
     get_snowflake_connection,
+    get_connection_pool,
+    pooled_connection,
     get_snowpark_session, 
     test_connection,
     DATABASE_SCHEMA
@@ -23,25 +25,68 @@ from .snowflake_tables import (
 
 from .snowflake_data import (
     load_data_with_history,
-    load_analytics_data
+    load_analytics_data,
+    fetch_dataframe,
+    fetch_dataframe_batches
+)
+
+from .snowflake_cache import (
+    read_cached_version,
+    write_cached_version,
+    evict_cached_version,
+    clear_disk_cache,
+    get_cache_statistics
 )
 
 from .snowflake_versions import (
     generate_version_id,
     create_new_version,
+    find_duplicate_version,
+    get_versions_fingerprint,
+    version_fingerprint,
     get_upload_versions,
     set_active_version,
+    ensure_active_versions_table,
+    point_active_version,
     get_version_by_id,
     get_active_version,
     delete_version,
-    fix_active_versions
+    fix_active_versions,
+    diff_versions,
+    compare_version_frames
 )
 
 from .snowflake_upload import (
     upload_excel_to_snowflake,
+    upload_data_hash,
     analyze_excel_structure
 )
 
+from .snowflake_history import (
+    record_version_history,
+    backfill_product_history,
+    get_product_history
+)
+
+from .snowflake_forecast import (
+    forecast_consumption
+)
+
+from .snowflake_analyses import (
+    precompute_timeline_analyses,
+    load_timeline_analyses
+)
+
+from .snowflake_parallel import (
+    load_concurrently,
+    load_company_group
+)
+
+from .snowflake_bulk import (
+    bulk_load_dataframe,
+    batch_insert_records
+)
+
 from .snowflake_migration import (
     migrate_to_multi_company_versioned,
     migrate_existing_tables
@@ -56,6 +101,8 @@ from .snowflake_admin import (
 __all__ = [
     # Connection
     'get_snowflake_connection',
+    'get_connection_pool',
+    'pooled_connection',
     'get_snowpark_session',
     'test_connection',
     'DATABASE_SCHEMA',
@@ -69,20 +116,51 @@ __all__ = [
     # Data Loading
     'load_data_with_history',
     'load_analytics_data',
+    'fetch_dataframe',
+    'fetch_dataframe_batches',
+    'read_cached_version',
+    'write_cached_version',
+    'evict_cached_version',
+    'clear_disk_cache',
+    'get_cache_statistics',
     
     # Version Management
     'generate_version_id',
     'create_new_version',
+    'find_duplicate_version',
+    'get_versions_fingerprint',
+    'version_fingerprint',
     'get_upload_versions',
     'set_active_version',
+    'ensure_active_versions_table',
+    'point_active_version',
     'get_version_by_id',
     'get_active_version',
     'delete_version',
     'fix_active_versions',
+    'diff_versions',
+    'compare_version_frames',
+    
+    # Product History
+    'record_version_history',
+    'backfill_product_history',
+    'get_product_history',
+    'forecast_consumption',
+    
+    # Precomputed Analyses
+    'precompute_timeline_analyses',
+    'load_timeline_analyses',
+    
+    # Concurrent Loading
+    'load_concurrently',
+    'load_company_group',
     
     # Upload & Analysis
     'upload_excel_to_snowflake',
+    'upload_data_hash',
     'analyze_excel_structure',
+    'bulk_load_dataframe',
+    'batch_insert_records',
     
     # Migration
     'migrate_to_multi_company_versioned',
@@ -103,11 +181,22 @@ def show_module_structure():
     st.info("""
     🏗️ **Nova Estrutura Modular do Snowflake:**
     
-    📁 **bd/snowflake_connection.py** - Conexões & configuração básica ✅
+    📁 **bd/snowflake_connection.py** - Conexões (pool reutilizável) & configuração básica ✅
     📁 **bd/snowflake_tables.py** - Criação e gerenciamento de tabelas ✅
     📁 **bd/snowflake_data.py** - Carregamento de dados (com cache) ✅
+    📁 **bd/snowflake_cache.py** - Cache local em disco das versões (Parquet, LRU) ✅
     📁 **bd/snowflake_versions.py** - Controle de versões ✅
     📁 **bd/snowflake_upload.py** - Upload e análise de Excel ✅
+    📁 **bd/snowflake_delta.py** - Uploads incrementais (somente alterações, validade por versão) ✅
+    📁 **bd/snowflake_history.py** - Histórico por produto (série de todas as versões) ✅
+    📁 **bd/snowflake_forecast.py** - Previsão de consumo (tendência e sazonalidade vetorizadas) ✅
+    📁 **bd/snowflake_analyses.py** - Análises da timeline pré-calculadas no upload (meta 3-12 meses) ✅
+    📁 **bd/snowflake_parallel.py** - Carga paralela (empresas e tipos de tabela em threads) ✅
+    📁 **bd/excel_reader.py** - Leitura rápida de Excel (calamine/openpyxl, streaming) ✅
+    📁 **bd/excel_headers.py** - Detecção de cabeçalhos (uma leitura por planilha) ✅
+    📁 **bd/table_export.py** - Exportação da Tabela Geral (xlsx streaming, CSV, Parquet) ✅
+    📁 **bd/timeline_calc.py** - Cálculo da timeline de compras (página e pré-cálculo) ✅
+    📁 **bd/snowflake_bulk.py** - Carga em massa (Parquet + COPY INTO, lotes) ✅
     📁 **bd/snowflake_migration.py** - Funções de migração ✅
     📁 **bd/snowflake_admin.py** - Administração e limpeza ✅
     
@@ -3,6 +3,10 @@ Snowflake Connection & Configuration
 Handles basic connection and configuration for MINIPA purchasing system
 """
 
+import threading
+import time
+from contextlib import contextmanager
+
 import streamlit as st
 import snowflake.connector
 from snowflake.snowpark import Session
@@ -24,6 +28,16 @@ DATABASE_SCHEMA = {
     }
 }
 
+# Process-wide connection pool settings
+POOL_SETTINGS = {
+    "pool_size": 4,              # Idle connections kept open for reuse
+    "max_overflow": 4,           # Extra connections allowed under load
+    "acquire_timeout": 30,       # Seconds to wait for a free connection
+    "idle_timeout": 900,         # Close connections idle for more than 15 min
+    "max_lifetime": 10800,       # Recycle connections after 3 hours
+    "health_check_after": 60     # Ping connections idle for more than 1 min
+}
+
 def get_snowflake_connection():
     """
     Get Snowflake connection using Streamlit secrets
@@ -53,6 +67,178 @@ def get_snowflake_connection():
         st.info("💡 Verifique se o arquivo .streamlit/secrets.toml está configurado corretamente.")
         return None
 
+class SnowflakeConnectionPool:
+    """
+    Thread-safe pool of snowflake.connector connections
+    Reuses authenticated sessions instead of opening one per function call
+    """
+
+    def __init__(self, settings=None):
+        self.settings = dict(POOL_SETTINGS, **(settings or {}))
+        self._idle = []  # [(conn, created_at, last_used_at)]
+        self._created = {}  # id(conn) -> created_at
+        self._checked_out = 0
+        self._condition = threading.Condition()
+
+    @property
+    def max_connections(self):
+        return self.settings["pool_size"] + self.settings["max_overflow"]
+
+    def _close_quietly(self, conn):
+        self._created.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self, now):
+        """Close idle connections past idle_timeout or max_lifetime (lock held)"""
+        keep = []
+        for conn, created_at, last_used_at in self._idle:
+            if (now - last_used_at > self.settings["idle_timeout"] or
+                    now - created_at > self.settings["max_lifetime"]):
+                self._close_quietly(conn)
+            else:
+                keep.append((conn, created_at, last_used_at))
+        self._idle = keep
+
+    def _is_healthy(self, conn, last_used_at, now):
+        """Cheap liveness check - only pings connections that sat idle for a while"""
+        try:
+            if conn.is_closed():
+                return False
+            if now - last_used_at > self.settings["health_check_after"]:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """
+        Check out a connection, reusing an idle one when possible
+        Returns connection object or None if unavailable
+        """
+        deadline = time.monotonic() + self.settings["acquire_timeout"]
+
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._evict_idle(now)
+
+                if self._idle:
+                    conn, created_at, last_used_at = self._idle.pop()
+                    self._checked_out += 1
+                    break
+
+                if self._checked_out + len(self._idle) < self.max_connections:
+                    conn = None
+                    self._checked_out += 1
+                    break
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    st.error("❄️ Todas as conexões com o Snowflake estão ocupadas. Tente novamente em instantes.")
+                    return None
+                self._condition.wait(remaining)
+
+        # Health check and connect outside the lock so other sessions are not blocked
+        if conn is not None and not self._is_healthy(conn, last_used_at, time.monotonic()):
+            self._close_quietly(conn)
+            conn = None
+
+        if conn is None:
+            conn = get_snowflake_connection()
+            if conn is None:
+                with self._condition:
+                    self._checked_out -= 1
+                    self._condition.notify()
+                return None
+            self._created[id(conn)] = time.monotonic()
+
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+        Return a connection to the pool (or close it if broken or over pool_size)
+        """
+        with self._condition:
+            self._checked_out -= 1
+            now = time.monotonic()
+            created_at = self._created.get(id(conn), now)
+
+            try:
+                broken = conn.is_closed()
+            except Exception:
+                broken = True
+
+            if (discard or broken or
+                    len(self._idle) >= self.settings["pool_size"] or
+                    now - created_at > self.settings["max_lifetime"]):
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, created_at, now))
+
+            self._condition.notify()
+
+    def close_all(self):
+        """Close every idle connection (checked-out ones are closed on release)"""
+        with self._condition:
+            for conn, _, _ in self._idle:
+                self._close_quietly(conn)
+            self._idle = []
+
+    def stats(self):
+        with self._condition:
+            return {
+                "idle": len(self._idle),
+                "checked_out": self._checked_out,
+                "max_connections": self.max_connections
+            }
+
+@st.cache_resource(show_spinner=False)
+def get_connection_pool():
+    """
+    Process-wide connection pool shared by every Streamlit session
+    """
+    return SnowflakeConnectionPool()
+
+_local = threading.local()
+
+@contextmanager
+def pooled_connection():
+    """
+    Check out a pooled Snowflake connection for the duration of a with block
+    Yields connection object or None if failed
+
+    Re-entrant per thread: nested bd/ calls (e.g. upload -> create_new_version)
+    share the connection already held by the caller instead of opening another.
+    """
+    held = getattr(_local, "conn", None)
+    if held is not None:
+        yield held
+        return
+
+    pool = get_connection_pool()
+    conn = pool.acquire()
+    if conn is None:
+        yield None
+        return
+
+    _local.conn = conn
+    discard = False
+    try:
+        yield conn
+    except snowflake.connector.errors.Error:
+        # Connection-level failures must not be handed to the next caller
+        discard = True
+        raise
+    finally:
+        _local.conn = None
+        pool.release(conn, discard=discard)
+
 def get_snowpark_session():
     """
     Get Snowpark session for advanced operations
@@ -83,17 +269,16 @@ def test_connection():
     Test Snowflake connection
     Returns True if successful
     """
-    conn = get_snowflake_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT CURRENT_VERSION()")
-            version = cursor.fetchone()[0]
-            cursor.close()
-            conn.close()
-            st.success(f"✅ Conectado ao Snowflake! Versão: {version}")
-            return True
-        except Exception as e:
-            st.error(f"❄️ Erro no teste: {str(e)}")
-            return False
+    with pooled_connection() as conn:
+        if conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT CURRENT_VERSION()")
+                version = cursor.fetchone()[0]
+                cursor.close()
+                st.success(f"✅ Conectado ao Snowflake! Versão: {version}")
+                return True
+            except Exception as e:
+                st.error(f"❄️ Erro no teste: {str(e)}")
+                return False
     return False 
\ No newline at end of file
@@ -5,80 +5,140 @@ Handles data loading with caching for timeline and analytics data
 
 import streamlit as st
 import pandas as pd
-from .snowflake_connection import get_snowflake_connection
+import numpy as np
+from .snowflake_connection import pooled_connection
+from .snowflake_cache import read_cached_version, write_cached_version
+from .snowflake_versions import version_fingerprint, VISIBLE_ROWS_SQL
 
-@st.cache_data(ttl=21600, show_spinner=False)  # 6 hours - optimized cache for data existence
-def check_data_exists(empresa, table_type, version_id=None):
+# Upload finished - rows for the version will not change anymore
+FINISHED_STATUSES = ('SUCCESS', 'PARTIAL')
+
+def compact_dtypes(df):
     """
-    Cache data existence checks to avoid COUNT(*) queries on every call
-    Returns: number of records found
+    Normalize Arrow result dtypes so every batch/version gets the same schema
+    Integer columns become int32 when the values fit (int64 otherwise);
+    decimals already arrive as float64 and text as strings
+    """
+    for column in df.columns:
+        if pd.api.types.is_integer_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column]):
+            values = df[column]
+            fits_int32 = values.empty or (values.min() >= np.iinfo(np.int32).min and
+                                          values.max() <= np.iinfo(np.int32).max)
+            df[column] = values.astype(np.int32 if fits_int32 else np.int64)
+    return df
+
+def _fetch_rows_fallback(cursor):
+    """DataFrame from plain row tuples when the Arrow result path is unavailable"""
+    columns = [col[0] for col in cursor.description]
+    return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+def fetch_dataframe(conn, query, params=None):
+    """
+    Run a query and build the DataFrame straight from the connector's Arrow
+    result batches (fetch_pandas_all) instead of Python row tuples
+    Falls back to fetchall when pyarrow or the Arrow format is not available
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params or None)
+        try:
+            df = cursor.fetch_pandas_all()
+        except Exception:
+            df = _fetch_rows_fallback(cursor)
+        return compact_dtypes(df)
+    finally:
+        cursor.close()
+
+def fetch_dataframe_batches(conn, query, params=None):
+    """
+    Generator variant of fetch_dataframe for large versions
+    Yields one DataFrame per Arrow result batch, so peak memory stays at one batch
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params or None)
+        try:
+            batches = cursor.fetch_pandas_batches()
+        except Exception:
+            batches = [_fetch_rows_fallback(cursor)]
+        for batch in batches:
+            yield compact_dtypes(batch)
+    finally:
+        cursor.close()
+
+def resolve_version(conn, empresa, table_type, version_id=None):
+    """
+    Look up upload_version and status of the requested (or active) version
+    Single-row metadata query used as the disk cache key and data filter
+    first/last version bound the rows to read (a delta upload reads its chain
+    from the base full upload; a full upload only its own rows)
+    Returns (upload_version, status, first_version, last_version) or all None
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return 0
-        
     try:
         cursor = conn.cursor()
-        
-        if table_type == "TIMELINE":
-            if version_id is None:
-                cursor.execute("""
-                SELECT COUNT(*) FROM ESTOQUE.PRODUTOS 
-                WHERE empresa = %s AND table_type = %s AND is_active = TRUE
-                """, (empresa, 'TIMELINE'))
-            else:
-                cursor.execute("""
-                SELECT COUNT(*) FROM ESTOQUE.PRODUTOS 
-                WHERE empresa = %s AND table_type = %s AND version_id = %s
-                """, (empresa, 'TIMELINE', version_id))
-        elif table_type == "ANALYTICS":
-            if version_id is None:
-                cursor.execute("""
-                SELECT COUNT(*) FROM ESTOQUE.ANALYTICS_DATA 
-                WHERE empresa = %s AND is_active = TRUE
-                """, (empresa,))
-            else:
-                cursor.execute("""
-                SELECT COUNT(*) FROM ESTOQUE.ANALYTICS_DATA 
-                WHERE empresa = %s AND version_id = %s
-                """, (empresa, version_id))
-        
-        total_records = cursor.fetchone()[0]
+        if version_id is None:
+            # Active version comes from the CONFIG.ACTIVE_VERSIONS pointer
+            cursor.execute("""
+            SELECT v.upload_version, v.status, COALESCE(v.base_version_id, v.version_id), v.version_id 
+            FROM CONFIG.ACTIVE_VERSIONS a
+            JOIN CONFIG.VERSIONS v
+              ON v.empresa = a.empresa AND v.table_type = a.table_type AND v.upload_version = a.upload_version
+            WHERE a.empresa = %s AND a.table_type = %s
+            """, (empresa, table_type))
+        else:
+            cursor.execute("""
+            SELECT upload_version, status, COALESCE(base_version_id, version_id), version_id 
+            FROM CONFIG.VERSIONS 
+            WHERE empresa = %s AND table_type = %s AND version_id = %s
+            """, (empresa, table_type, version_id))
+        result = cursor.fetchone()
         cursor.close()
-        conn.close()
-        return total_records
-        
+        return tuple(result) if result else (None, None, None, None)
     except Exception:
-        return 0
+        return None, None, None, None
 
 @st.cache_data(ttl=2592000, show_spinner=False)  # 30 days - table structure rarely changes
+def get_table_columns():
+    """
+    Column names of every table in the app schemas from one INFORMATION_SCHEMA query
+    Cleared by create_tables and the migrations when the structure changes
+    Returns: {"SCHEMA.TABLE": [COLUMN, ...]}
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return {}
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+            SELECT table_schema, table_name, column_name
+            FROM INFORMATION_SCHEMA.COLUMNS 
+            WHERE table_schema IN ('ESTOQUE', 'CONFIG', 'TIMELINE')
+            ORDER BY table_schema, table_name, ordinal_position
+            """)
+            tables = {}
+            for schema, table, column in cursor.fetchall():
+                tables.setdefault(f"{schema}.{table}".upper(), []).append(column.upper())
+            cursor.close()
+            return tables
+        except Exception:
+            return {}
+
 def check_table_structure(table_name):
     """
-    Cache table structure checks to avoid DESCRIBE TABLE on every call
+    Table structure check served from the cached INFORMATION_SCHEMA lookup
     Returns: (table_exists, has_empresa_column)
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return False, False
-        
-    try:
-        cursor = conn.cursor()
-        cursor.execute(f"DESCRIBE TABLE {table_name}")
-        columns = cursor.fetchall()
-        column_names = [col[0].upper() for col in columns]
-        has_empresa_column = 'EMPRESA' in column_names
-        cursor.close()
-        conn.close()
-        return True, has_empresa_column
-    except:
+    columns = get_table_columns().get(table_name.upper())
+    if columns is None:
         return False, False
+    return True, 'EMPRESA' in columns
 
 # Timeline de Compras - Company and version specific caching
-@st.cache_data(ttl=2592000, show_spinner="🔄 Carregando Timeline (atualização mensal)...")  # 30 days
 def load_data_with_history(empresa="MINIPA", version_id=None, usuario="minipa", limit_days=30):
     """
     Load data from Snowflake with multi-company versioning support
-    CACHED for 30 DAYS (monthly updates) - Massive credit savings!
+    CACHED until the TIMELINE versions fingerprint changes (upload, activation, delete)
     Backward compatible with old table structure.
     
     Args:
@@ -87,109 +147,88 @@ def load_data_with_history(empresa="MINIPA", version_id=None, usuario="minipa",
         usuario: User name
         limit_days: Days to look back for data
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return None
+    fingerprint = version_fingerprint(empresa, "TIMELINE")
+    return _load_data_with_history_cached(empresa, version_id, usuario, limit_days, fingerprint)
+
+@st.cache_data(show_spinner="🔄 Carregando Timeline...", max_entries=16)
+def _load_data_with_history_cached(empresa, version_id, usuario, limit_days, fingerprint):
+    """
+    Cached body of load_data_with_history - fingerprint only serves as cache key
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return None
         
-    try:
-        cursor = conn.cursor()
+        try:
+            # Completed versions are immutable - serve them from the local disk cache
+            upload_version, status, first_version, last_version = resolve_version(conn, empresa, "TIMELINE", version_id)
+            df_cached = read_cached_version(empresa, "TIMELINE", upload_version)
+            if df_cached is not None:
+                return df_cached
         
-        # Check if table has new structure (empresa column) - CACHED CHECK
-        table_exists, has_empresa_column = check_table_structure("ESTOQUE.PRODUTOS")
+            cursor = conn.cursor()
         
-        if not table_exists:
-            # st.warning("⚠️ Tabela PRODUTOS não encontrada")  # Removed to save credits
-            cursor.close()
-            conn.close()
-            return None
+            # Check if table has new structure (empresa column) - CACHED CHECK
+            table_exists, has_empresa_column = check_table_structure("ESTOQUE.PRODUTOS")
         
-        if not has_empresa_column:
-            # Old structure - load all data as MINIPA
-            # st.warning("⚠️ Estrutura antiga detectada. Para multi-empresa, execute a migração.")  # Removed to save credits
-            
-            if empresa != "MINIPA":
-                # st.info(f"💡 Nenhum dado para {empresa} na estrutura antiga.")  # Removed to save credits
+            if not table_exists:
+                # st.warning("⚠️ Tabela PRODUTOS não encontrada")  # Removed to save credits
                 cursor.close()
-                conn.close()
                 return None
+        
+            if not has_empresa_column:
+                # Old structure - load all data as MINIPA
+                # st.warning("⚠️ Estrutura antiga detectada. Para multi-empresa, execute a migração.")  # Removed to save credits
+            
+                if empresa != "MINIPA":
+                    # st.info(f"💡 Nenhum dado para {empresa} na estrutura antiga.")  # Removed to save credits
+                    cursor.close()
+                    return None
                 
-            try:
-                # Use old query structure
-                query = """
-                SELECT item as "Item", 
-                       modelo as "Modelo", 
-                       fornecedor as "Fornecedor", 
-                       qtd_atual as "QTD", 
-                       preco_unitario as "Preco_Unitario", 
-                       estoque_total as "Estoque_Total",
-                       in_transit as "In_Transit", 
-                       vendas_medias as "Vendas_Medias",
-                       cbm as "CBM", 
-                       moq as "MOQ", 
-                       data_upload
-                FROM ESTOQUE.PRODUTOS 
-                WHERE table_type = 'TIMELINE' OR table_type IS NULL
-                ORDER BY data_upload DESC
-                """
+                try:
+                    # Use old query structure
+                    query = """
+                    SELECT item as "Item", 
+                           modelo as "Modelo", 
+                           fornecedor as "Fornecedor", 
+                           qtd_atual as "QTD", 
+                           preco_unitario as "Preco_Unitario", 
+                           estoque_total as "Estoque_Total",
+                           in_transit as "In_Transit", 
+                           vendas_medias as "Vendas_Medias",
+                           cbm as "CBM", 
+                           moq as "MOQ", 
+                           data_upload as "data_upload"
+                    FROM ESTOQUE.PRODUTOS 
+                    WHERE table_type = 'TIMELINE' OR table_type IS NULL
+                    ORDER BY data_upload DESC
+                    """
                 
-                cursor.close()
-                df = pd.read_sql(query, conn, params=[])
-                conn.close()
+                    cursor.close()
+                    df = fetch_dataframe(conn, query)
                 
-                if not df.empty:
-                    pass  # st.info(f"📅 Estrutura antiga - {len(df)} produtos carregados como MINIPA")  # Removed to save credits
+                    if not df.empty:
+                        pass  # st.info(f"📅 Estrutura antiga - {len(df)} produtos carregados como MINIPA")  # Removed to save credits
                 
-                return df
+                    return df
                 
-            except Exception as old_query_error:
-                st.error(f"❌ Erro na estrutura antiga: {str(old_query_error)}")
+                except Exception as old_query_error:
+                    st.error(f"❌ Erro na estrutura antiga: {str(old_query_error)}")
+                    cursor.close()
+                    return None
+        
+            # New multi-company structure
+            if version_id is None and not upload_version:
+                # No active version pointer for this company yet
                 cursor.close()
-                conn.close()
                 return None
         
-        # New multi-company structure
-        # Determine which version to load
-        if version_id is None:
-            # st.info(f"📊 Carregando versão ativa para {empresa}")  # Removed to save credits
-            version_params = [empresa, 'TIMELINE']
-        else:
-            # st.info(f"📊 Carregando versão {version_id} para {empresa}")  # Removed to save credits
-            version_params = [empresa, 'TIMELINE', version_id]
+            if last_version is None:
+                # Version not registered in CONFIG.VERSIONS - read its own rows
+                first_version = last_version = version_id
         
-        # Check if the table exists and has data for this company - CACHED CHECK
-        total_records = check_data_exists(empresa, "TIMELINE", version_id)
-        
-        if total_records == 0:
-            # st.info(f"💡 Nenhum dado de timeline encontrado para {empresa}. Faça um upload primeiro.")  # Removed to save credits
-            cursor.close()
-            conn.close()
-            return None
-        
-        # Build the query based on version selection
-        if version_id is None:
-            query = """
-            SELECT item as "Item", 
-                   modelo as "Modelo", 
-                   fornecedor as "Fornecedor", 
-                   qtd_atual as "QTD", 
-                   preco_unitario as "Preco_Unitario", 
-                   estoque_total as "Estoque_Total",
-                   in_transit as "In_Transit", 
-                   vendas_medias as "Vendas_Medias",
-                   cbm as "CBM", 
-                   moq as "MOQ", 
-                   data_upload,
-                   upload_version,
-                   version_id
-            FROM ESTOQUE.PRODUTOS 
-            WHERE empresa = %s 
-            AND table_type = 'TIMELINE'
-            AND is_active = TRUE
-            ORDER BY data_upload DESC
-            """
-            query_params = [empresa]
-        else:
-            query = """
+            # Rows of the version (delta uploads: their chain rows still valid at the version)
+            query = f"""
             SELECT item as "Item", 
                    modelo as "Modelo", 
                    fornecedor as "Fornecedor", 
@@ -200,49 +239,50 @@ def load_data_with_history(empresa="MINIPA", version_id=None, usuario="minipa",
                    vendas_medias as "Vendas_Medias",
                    cbm as "CBM", 
                    moq as "MOQ", 
-                   data_upload,
-                   upload_version,
-                   version_id
+                   data_upload as "data_upload",
+                   upload_version as "upload_version",
+                   version_id as "version_id"
             FROM ESTOQUE.PRODUTOS 
             WHERE empresa = %s 
             AND table_type = 'TIMELINE'
-            AND version_id = %s
+            AND {VISIBLE_ROWS_SQL}
             ORDER BY data_upload DESC
             """
-            query_params = [empresa, version_id]
+            query_params = [empresa, first_version, last_version, last_version]
         
-        cursor.close()  # Close the cursor before pandas read_sql
+            cursor.close()  # fetch_dataframe opens its own cursor
         
-        df = pd.read_sql(query, conn, params=query_params)
-        conn.close()
+            df = fetch_dataframe(conn, query, query_params)
         
-        # Check if we got any data
-        if df.empty:
-            # st.info(f"💡 Nenhum dado encontrado para {empresa}.")  # Removed to save credits
-            return None
+            # Empty result = no data for this company/version (no separate COUNT query)
+            if df.empty:
+                # st.info(f"💡 Nenhum dado de timeline encontrado para {empresa}. Faça um upload primeiro.")  # Removed to save credits
+                return None
+        
+            # Show data summary
+            version_info = df['version_id'].iloc[0] if 'version_id' in df.columns and not df.empty else "N/A"
+            upload_date = df['data_upload'].max() if 'data_upload' in df.columns else "N/A"
         
-        # Show data summary
-        version_info = df['version_id'].iloc[0] if 'version_id' in df.columns and not df.empty else "N/A"
-        upload_date = df['data_upload'].max() if 'data_upload' in df.columns else "N/A"
+            # st.info(f"📅 {empresa} - Timeline v{version_info} | {len(df)} produtos | Upload: {upload_date}")  # Removed to save credits
         
-        # st.info(f"📅 {empresa} - Timeline v{version_info} | {len(df)} produtos | Upload: {upload_date}")  # Removed to save credits
+            # Remove metadata columns for return
+            columns_to_remove = ['upload_version', 'version_id']
+            df_clean = df.drop(columns=[col for col in columns_to_remove if col in df.columns])
         
-        # Remove metadata columns for return
-        columns_to_remove = ['upload_version', 'version_id']
-        df_clean = df.drop(columns=[col for col in columns_to_remove if col in df.columns])
+            if status in FINISHED_STATUSES:
+                write_cached_version(empresa, "TIMELINE", upload_version, df_clean)
         
-        return df_clean
+            return df_clean
         
-    except Exception as e:
-        st.error(f"❄️ Erro ao carregar dados para {empresa}: {str(e)}")
-        return None
+        except Exception as e:
+            st.error(f"❄️ Erro ao carregar dados para {empresa}: {str(e)}")
+            return None
 
 # Análise de Estoque - Company and version specific caching  
-@st.cache_data(ttl=604800, show_spinner="🔄 Carregando Análise (atualização semanal)...")  # 7 days
 def load_analytics_data(empresa="MINIPA", version_id=None, usuario="minipa", limit_days=30):
     """
     Load analytics data from Snowflake with multi-company versioning support
-    CACHED for 7 DAYS (weekly updates) - Major credit savings!
+    CACHED until the ANALYTICS versions fingerprint changes (upload, activation, delete)
     Backward compatible with old table structure.
     
     Args:
@@ -251,101 +291,84 @@ def load_analytics_data(empresa="MINIPA", version_id=None, usuario="minipa", lim
         usuario: User name
         limit_days: Days to look back for data
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return None
+    fingerprint = version_fingerprint(empresa, "ANALYTICS")
+    return _load_analytics_data_cached(empresa, version_id, usuario, limit_days, fingerprint)
+
+@st.cache_data(show_spinner="🔄 Carregando Análise...", max_entries=16)
+def _load_analytics_data_cached(empresa, version_id, usuario, limit_days, fingerprint):
+    """
+    Cached body of load_analytics_data - fingerprint only serves as cache key
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return None
         
-    try:
-        cursor = conn.cursor()
+        try:
+            # Completed versions are immutable - serve them from the local disk cache
+            upload_version, status, first_version, last_version = resolve_version(conn, empresa, "ANALYTICS", version_id)
+            df_cached = read_cached_version(empresa, "ANALYTICS", upload_version)
+            if df_cached is not None:
+                return df_cached
         
-        # Check if analytics table exists and has new structure - CACHED CHECK
-        table_exists, has_empresa_column = check_table_structure("ESTOQUE.ANALYTICS_DATA")
+            cursor = conn.cursor()
         
-        if not table_exists:
-            # st.info("💡 Tabela de analytics não existe ainda. Faça upload de dados de análise primeiro.")  # Removed to save credits
-            cursor.close()
-            conn.close()
-            return None
+            # Check if analytics table exists and has new structure - CACHED CHECK
+            table_exists, has_empresa_column = check_table_structure("ESTOQUE.ANALYTICS_DATA")
         
-        if not has_empresa_column:
-            # Old structure - load all data as MINIPA
-            st.warning("⚠️ Estrutura antiga de analytics detectada. Para multi-empresa, execute a migração.")
-            
-            if empresa != "MINIPA":
-                st.info(f"💡 Nenhum dado de análise para {empresa} na estrutura antiga.")
+            if not table_exists:
+                # st.info("💡 Tabela de analytics não existe ainda. Faça upload de dados de análise primeiro.")  # Removed to save credits
                 cursor.close()
-                conn.close()
                 return None
+        
+            if not has_empresa_column:
+                # Old structure - load all data as MINIPA
+                st.warning("⚠️ Estrutura antiga de analytics detectada. Para multi-empresa, execute a migração.")
+            
+                if empresa != "MINIPA":
+                    st.info(f"💡 Nenhum dado de análise para {empresa} na estrutura antiga.")
+                    cursor.close()
+                    return None
                 
-            try:
-                # Use old query structure
-                query = """
-                SELECT produto as "Produto", 
-                       estoque as "Estoque", 
-                       consumo_6_meses as "Consumo 6 Meses",
-                       media_6_meses as "Média 6 Meses", 
-                       estoque_cobertura as "Estoque Cobertura",
-                       COALESCE(moq, 0) as "MOQ",
-                       COALESCE(ultimo_fornecedor, 'Brazil') as "UltimoFornecedor",
-                       data_upload
-                FROM ESTOQUE.ANALYTICS_DATA 
-                ORDER BY data_upload DESC
-                """
+                try:
+                    # Use old query structure
+                    query = """
+                    SELECT produto as "Produto", 
+                           estoque as "Estoque", 
+                           consumo_6_meses as "Consumo 6 Meses",
+                           media_6_meses as "Média 6 Meses", 
+                           estoque_cobertura as "Estoque Cobertura",
+                           COALESCE(moq, 0) as "MOQ",
+                           COALESCE(ultimo_fornecedor, 'Brazil') as "UltimoFornecedor",
+                           data_upload as "data_upload"
+                    FROM ESTOQUE.ANALYTICS_DATA 
+                    ORDER BY data_upload DESC
+                    """
                 
-                cursor.close()
-                df = pd.read_sql(query, conn, params=[])
-                conn.close()
+                    cursor.close()
+                    df = fetch_dataframe(conn, query)
                 
-                if not df.empty:
-                    st.info(f"📊 Estrutura antiga - {len(df)} produtos de análise carregados como MINIPA")
+                    if not df.empty:
+                        st.info(f"📊 Estrutura antiga - {len(df)} produtos de análise carregados como MINIPA")
                 
-                return df
+                    return df
                 
-            except Exception as old_query_error:
-                st.error(f"❌ Erro na estrutura antiga de analytics: {str(old_query_error)}")
+                except Exception as old_query_error:
+                    st.error(f"❌ Erro na estrutura antiga de analytics: {str(old_query_error)}")
+                    cursor.close()
+                    return None
+        
+            # New multi-company structure
+            if version_id is None and not upload_version:
+                # No active version pointer for this company yet
                 cursor.close()
-                conn.close()
                 return None
         
-        # New multi-company structure
-        # Determine which version to load
-        if version_id is None:
-            # st.info(f"📊 Carregando análise ativa para {empresa}")  # Removed to save credits
-            version_params = [empresa]
-        else:
-            # st.info(f"📊 Carregando análise v{version_id} para {empresa}")  # Removed to save credits
-            version_params = [empresa, version_id]
+            if last_version is None:
+                # Version not registered in CONFIG.VERSIONS - read its own rows
+                first_version = last_version = version_id
         
-        # Check if the analytics table exists and has data for this company - CACHED CHECK
-        total_records = check_data_exists(empresa, "ANALYTICS", version_id)
-        
-        if total_records == 0:
-            # st.info(f"💡 Nenhum dado de análise encontrado para {empresa}. Faça upload de um arquivo de análise primeiro.")  # Removed to save credits
-            cursor.close()
-            conn.close()
-            return None
-        
-        # Build the query based on version selection
-        if version_id is None:
-            query = """
-            SELECT produto as "Produto", 
-                   estoque as "Estoque", 
-                   consumo_6_meses as "Consumo 6 Meses",
-                   media_6_meses as "Média 6 Meses", 
-                   estoque_cobertura as "Estoque Cobertura",
-                   moq as "MOQ",
-                   ultimo_fornecedor as "UltimoFornecedor",
-                   data_upload,
-                   upload_version,
-                   version_id
-            FROM ESTOQUE.ANALYTICS_DATA 
-            WHERE empresa = %s 
-            AND is_active = TRUE
-            ORDER BY data_upload DESC
-            """
-            query_params = [empresa]
-        else:
-            query = """
+            # Rows of the version (delta uploads: their chain rows still valid at the version)
+            query = f"""
             SELECT produto as "Produto", 
                    estoque as "Estoque", 
                    consumo_6_meses as "Consumo 6 Meses",
@@ -353,38 +376,44 @@ def load_analytics_data(empresa="MINIPA", version_id=None, usuario="minipa", lim
                    estoque_cobertura as "Estoque Cobertura",
                    moq as "MOQ",
                    ultimo_fornecedor as "UltimoFornecedor",
-                   data_upload,
-                   upload_version,
-                   version_id
+                   data_upload as "data_upload",
+                   upload_version as "upload_version",
+                   version_id as "version_id"
             FROM ESTOQUE.ANALYTICS_DATA 
             WHERE empresa = %s 
-            AND version_id = %s
+            AND {VISIBLE_ROWS_SQL}
             ORDER BY data_upload DESC
             """
-            query_params = [empresa, version_id]
+            query_params = [empresa, first_version, last_version, last_version]
         
-        cursor.close()  # Close the cursor before pandas read_sql
+            cursor.close()  # fetch_dataframe opens its own cursor
         
-        df = pd.read_sql(query, conn, params=query_params)
-        conn.close()
+            df = fetch_dataframe(conn, query, query_params)
         
-        # Check if we got any data
-        if df.empty:
-            st.info(f"💡 Nenhum dado de análise encontrado para {empresa}.")
-            return None
+            # Empty result = no data for this company/version (no separate COUNT query)
+            if df.empty:
+                # st.info(f"💡 Nenhum dado de análise encontrado para {empresa}. Faça upload de um arquivo de análise primeiro.")  # Removed to save credits
+                return None
         
-        # Show data summary
-        version_info = df['version_id'].iloc[0] if 'version_id' in df.columns and not df.empty else "N/A"
-        upload_date = df['data_upload'].max() if 'data_upload' in df.columns else "N/A"
+            # Show data summary
+            version_info = df['version_id'].iloc[0] if 'version_id' in df.columns and not df.empty else "N/A"
+            upload_date = df['data_upload'].max() if 'data_upload' in df.columns else "N/A"
         
-        # st.info(f"📊 {empresa} - Analytics v{version_info} | {len(df)} produtos | Upload: {upload_date}")  # Removed to save credits
+            # st.info(f"📊 {empresa} - Analytics v{version_info} | {len(df)} produtos | Upload: {upload_date}")  # Removed to save credits
         
-        # Remove metadata columns for return
-        columns_to_remove = ['upload_version', 'version_id']
-        df_clean = df.drop(columns=[col for col in columns_to_remove if col in df.columns])
+            # Remove metadata columns for return
+            columns_to_remove = ['upload_version', 'version_id']
+            df_clean = df.drop(columns=[col for col in columns_to_remove if col in df.columns])
         
-        return df_clean
+            if status in FINISHED_STATUSES:
+                write_cached_version(empresa, "ANALYTICS", upload_version, df_clean)
         
-    except Exception as e:
-        st.error(f"❄️ Erro ao carregar dados de análise para {empresa}: {str(e)}")
-        return None 
+            return df_clean
+        
+        except Exception as e:
+            st.error(f"❄️ Erro ao carregar dados de análise para {empresa}: {str(e)}")
+            return None
+
+# Backward compatible cache clearing (load_data_with_history.clear())
+load_data_with_history.clear = _load_data_with_history_cached.clear
+load_analytics_data.clear = _load_analytics_data_cached.clear
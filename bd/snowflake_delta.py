@@ -0,0 +1,151 @@
+"""
+Snowflake Delta Uploads
+Diffs an incoming upload against the active version by product key and
+stores only inserted/changed rows; replaced and removed rows are closed with
+valid_to_version (SCD-style validity ranges, see VISIBLE_ROWS_SQL)
+"""
+
+import pandas as pd
+from .snowflake_versions import VISIBLE_ROWS_SQL
+from .snowflake_data import fetch_dataframe, FINISHED_STATUSES
+
+# Data table and extra row filter of each table type
+DATA_TABLES = {
+    "TIMELINE": ("PRODUTOS", "AND table_type = 'TIMELINE'"),
+    "ANALYTICS": ("ANALYTICS_DATA", "")
+}
+
+# Product key of each table type (matches the UNIQUE constraints in create_tables)
+PRODUCT_KEYS = {
+    "TIMELINE": ["item", "modelo"],
+    "ANALYTICS": ["produto"]
+}
+
+# DECIMAL(p, s) scale of stored columns - incoming values are compared at this precision
+DECIMAL_SCALES = {
+    "preco_unitario": 2,
+    "vendas_medias": 2,
+    "cbm": 4,
+    "consumo_6_meses": 2,
+    "media_6_meses": 2,
+    "estoque_cobertura": 2
+}
+
+# Row ids per UPDATE statement when closing rows
+CLOSE_CHUNK_SIZE = 1000
+
+def get_delta_base(cursor, empresa, table_type):
+    """
+    Version a delta upload can be built on: the active version, only when it
+    is also the latest finished version (the tip of its chain)
+    Returns dict with version_id and base_version_id (chain start) or None
+    """
+    try:
+        cursor.execute("""
+        SELECT v.version_id, COALESCE(v.base_version_id, v.version_id), v.status,
+               (SELECT MAX(version_id) FROM CONFIG.VERSIONS
+                WHERE empresa = a.empresa AND table_type = a.table_type)
+        FROM CONFIG.ACTIVE_VERSIONS a
+        JOIN CONFIG.VERSIONS v
+          ON v.empresa = a.empresa AND v.table_type = a.table_type AND v.upload_version = a.upload_version
+        WHERE a.empresa = %s AND a.table_type = %s
+        """, (empresa, table_type))
+        result = cursor.fetchone()
+    except Exception:
+        return None  # No versions/pointer yet - nothing to diff against
+
+    if not result:
+        return None
+    version_id, base_version_id, status, latest_version = result
+    if status not in FINISHED_STATUSES or version_id != latest_version:
+        return None
+    return {'version_id': version_id, 'base_version_id': base_version_id}
+
+def load_version_rows(conn, empresa, table_type, first_version, last_version, columns):
+    """
+    Stored rows (id + business columns) visible at last_version
+    Returns DataFrame with lower-case column names
+    """
+    table_name, table_filter = DATA_TABLES[table_type]
+    query = f"""
+    SELECT id, {', '.join(columns)}
+    FROM ESTOQUE.{table_name}
+    WHERE empresa = %s {table_filter}
+    AND {VISIBLE_ROWS_SQL}
+    """
+    df = fetch_dataframe(conn, query, [empresa, first_version, last_version, last_version])
+    df.columns = [str(col).lower() for col in df.columns]
+    return df
+
+def _comparable(df, columns, numeric_columns):
+    """Business columns with NULLs filled and decimals rounded like the table stores them"""
+    frame = df[columns].copy()
+    for column in columns:
+        if column in numeric_columns:
+            values = pd.to_numeric(frame[column], errors='coerce').astype('float64')
+            frame[column] = values.fillna(0).round(DECIMAL_SCALES.get(column, 0))
+        else:
+            frame[column] = frame[column].fillna('').astype(str)
+    return frame
+
+def diff_upload_frame(df_insert, base_rows, table_type):
+    """
+    Vectorized diff of an insert-ready frame against the stored rows of a version
+
+    Returns dict with:
+        rows: df_insert rows to write (new + changed products)
+        close_ids: stored row ids replaced or removed by the upload
+        inserted/changed/deleted/unchanged: product counts
+    or None when a product key repeats (the delta would be ambiguous)
+    """
+    keys = PRODUCT_KEYS[table_type]
+    values = [col for col in df_insert.columns if col not in keys]
+
+    if df_insert.duplicated(keys).any() or base_rows.duplicated(keys).any():
+        return None
+
+    # Types come from the normalized upload frame (stored decimals may arrive as Decimal)
+    numeric_columns = {col for col in values if pd.api.types.is_numeric_dtype(df_insert[col])}
+    incoming = _comparable(df_insert, keys + values, numeric_columns)
+    incoming['_row'] = range(len(incoming))
+    stored = _comparable(base_rows, keys + values, numeric_columns)
+    stored['_id'] = base_rows['id'].to_numpy()
+
+    merged = incoming.merge(stored, on=keys, how='outer', suffixes=('', '_base'), indicator=True)
+    both = merged['_merge'] == 'both'
+
+    differs = pd.Series(False, index=merged.index)
+    for column in values:
+        differs |= merged[column] != merged[f"{column}_base"]
+
+    changed = both & differs
+    inserted = merged['_merge'] == 'left_only'
+    deleted = merged['_merge'] == 'right_only'
+
+    write_rows = merged.loc[inserted | changed, '_row'].astype(int).sort_values()
+    close_ids = merged.loc[changed | deleted, '_id'].astype('int64').tolist()
+
+    return {
+        'rows': df_insert.iloc[write_rows.to_numpy()].reset_index(drop=True),
+        'close_ids': close_ids,
+        'inserted': int(inserted.sum()),
+        'changed': int(changed.sum()),
+        'deleted': int(deleted.sum()),
+        'unchanged': int((both & ~differs).sum())
+    }
+
+def close_rows(cursor, empresa, table_type, row_ids, version_id):
+    """
+    Mark stored rows as no longer valid from version_id on (chunked UPDATE by id)
+    Returns number of rows closed
+    """
+    table_name, _ = DATA_TABLES[table_type]
+    closed = 0
+    for start in range(0, len(row_ids), CLOSE_CHUNK_SIZE):
+        chunk = row_ids[start:start + CLOSE_CHUNK_SIZE]
+        cursor.execute(f"""
+        UPDATE ESTOQUE.{table_name} SET valid_to_version = %s
+        WHERE empresa = %s AND id IN ({', '.join(['%s'] * len(chunk))})
+        """, [version_id, empresa] + list(chunk))
+        closed += cursor.rowcount or 0
+    return closed
@@ -0,0 +1,200 @@
+"""
+Snowflake Consumption Forecast
+Per-product consumption forecasts from the monthly consumption recorded in
+every uploaded version (ESTOQUE.PRODUTO_HISTORICO). The whole catalog is fit
+at once on a products x versions matrix: batched least squares for the trend,
+exponential smoothing for the level and calendar-month seasonal indices.
+"""
+
+import streamlit as st
+import numpy as np
+import pandas as pd
+from .snowflake_connection import pooled_connection
+from .snowflake_versions import version_fingerprint
+from .snowflake_data import fetch_dataframe
+
+# Forecast settings
+FORECAST_SETTINGS = {
+    "alpha": 0.5,            # Exponential smoothing weight of the newest observation
+    "horizon": 3,            # Months ahead
+    "min_points": 2,         # Observations needed to fit a trend
+    "seasonal_months": 12,   # History span needed before seasonal indices are used
+    "min_seasonal_index": 0.05  # Floor for months with no consumption (keeps the deseasonalizing divide finite)
+}
+
+# Average month length in days (upload dates -> month axis)
+DAYS_PER_MONTH = 30.4375
+
+def load_consumption_matrix(conn, empresa, table_type):
+    """
+    Monthly consumption of every product in every recorded version
+    Returns (produtos, version dates, matrix products x versions with NaN gaps)
+    """
+    query = """
+    SELECT produto, version_id, data_upload, consumo_mensal
+    FROM ESTOQUE.PRODUTO_HISTORICO
+    WHERE empresa = %s AND table_type = %s
+    """
+    df = fetch_dataframe(conn, query, [empresa, table_type])
+    df.columns = [str(col).lower() for col in df.columns]
+    if df.empty:
+        return None, None, None
+
+    df['consumo_mensal'] = pd.to_numeric(df['consumo_mensal'], errors='coerce').astype('float64')
+    matrix = df.pivot_table(index='produto', columns='version_id', values='consumo_mensal', aggfunc='last')
+    datas = pd.to_datetime(df.groupby('version_id')['data_upload'].min().reindex(matrix.columns), utc=True)
+    return matrix.index.to_numpy(), datas, matrix.to_numpy(dtype='float64')
+
+def month_axis(datas):
+    """Months since the first version (version order when upload dates are missing)"""
+    if datas.isna().any():
+        return np.arange(len(datas), dtype='float64')
+    return ((datas - datas.min()).dt.total_seconds() / 86400 / DAYS_PER_MONTH).to_numpy(dtype='float64')
+
+def fit_linear_trend(matrix, t):
+    """
+    Batched least squares y = a + b*t for every row at once, skipping NaN gaps
+    Returns (intercept, slope, points) arrays - slope is 0 for rows with < min_points
+    """
+    observed = ~np.isnan(matrix)
+    y = np.where(observed, matrix, 0.0)
+    w = observed.astype('float64')
+
+    n = w.sum(axis=1)
+    st_ = w @ t
+    stt = w @ (t * t)
+    sy = y.sum(axis=1)
+    sty = y @ t
+
+    denominator = n * stt - st_ * st_
+    enough = (n >= FORECAST_SETTINGS["min_points"]) & (denominator > 1e-9)
+    slope = np.divide(n * sty - st_ * sy, denominator, out=np.zeros_like(n), where=enough)
+    intercept = np.divide(sy - slope * st_, n, out=np.zeros_like(n), where=n > 0)
+    return intercept, slope, n.astype(int)
+
+def smooth_level(matrix, alpha):
+    """
+    Exponential smoothing of every row, one vectorized step per version
+    Gaps keep the previous level. Returns last level (NaN for rows never observed).
+    """
+    level = np.full(matrix.shape[0], np.nan)
+    for column in matrix.T:
+        observed = ~np.isnan(column)
+        first = observed & np.isnan(level)
+        level = np.where(first, column, level)
+        update = observed & ~first
+        level = np.where(update, alpha * column + (1 - alpha) * level, level)
+    return level
+
+def seasonal_indices(matrix, t, datas, intercept, slope):
+    """
+    Calendar-month index (actual / trend) per product, 1.0 where unknown
+    Floored at min_seasonal_index so zero-consumption months can be divided by
+    Only used when the history spans seasonal_months; returns products x 12 array
+    """
+    indices = np.ones((matrix.shape[0], 12))
+    if datas.isna().any() or t.max() - t.min() < FORECAST_SETTINGS["seasonal_months"] - 1:
+        return indices
+
+    fitted = intercept[:, None] + slope[:, None] * t[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(fitted > 0, matrix / fitted, np.nan)
+
+    meses = datas.dt.month.to_numpy() - 1
+    for mes in range(12):
+        columns = meses == mes
+        if columns.any():
+            valid = np.isfinite(ratio[:, columns])
+            total = np.where(valid, ratio[:, columns], 0.0).sum(axis=1)
+            count = valid.sum(axis=1)
+            indices[:, mes] = np.divide(total, count, out=np.ones_like(total), where=count > 0)
+
+    # Normalize so a product's indices average 1 (seasonality does not shift the level)
+    mean = indices.mean(axis=1, keepdims=True)
+    indices = np.divide(indices, mean, out=np.ones_like(indices), where=mean > 0)
+    return np.maximum(indices, FORECAST_SETTINGS["min_seasonal_index"])
+
+def forecast_matrix(matrix, datas, alpha=None, horizon=None):
+    """
+    Forecast every row of a products x versions consumption matrix
+    Trend by least squares on the deseasonalized series, level by exponential
+    smoothing of what the trend does not explain (no smoothing lag on trends)
+    Returns dict of arrays: last, level, slope, points, forecast (products x horizon)
+    """
+    alpha = alpha or FORECAST_SETTINGS["alpha"]
+    horizon = horizon or FORECAST_SETTINGS["horizon"]
+
+    t = month_axis(datas)
+    # points counts the raw observations (what the 'Versões' column reports)
+    intercept, slope, points = fit_linear_trend(matrix, t)
+    seasonal = seasonal_indices(matrix, t, datas, intercept, slope)
+
+    series = matrix
+    seasonal_used = not np.allclose(seasonal, 1.0)
+    if seasonal_used:
+        series = matrix / seasonal[:, datas.dt.month.to_numpy() - 1]
+        intercept, slope, _ = fit_linear_trend(series, t)
+
+    # Level at the newest version: smoothed residual around the trend line
+    level = smooth_level(series - slope[:, None] * t[None, :], alpha) + slope * t[-1]
+    forecast = level[:, None] + slope[:, None] * np.arange(1, horizon + 1)[None, :]
+
+    if seasonal_used:
+        meses = (datas.iloc[-1].month - 1 + np.arange(1, horizon + 1)) % 12
+        forecast = forecast * seasonal[:, meses]
+
+    # Last observed value per row
+    observed = ~np.isnan(matrix)
+    last_position = matrix.shape[1] - 1 - np.argmax(observed[:, ::-1], axis=1)
+    last = matrix[np.arange(matrix.shape[0]), last_position]
+
+    return {
+        'last': last,
+        'level': level,
+        'slope': slope,
+        'points': points,
+        'forecast': np.clip(forecast, 0, None)
+    }
+
+def forecast_consumption(empresa, table_type="ANALYTICS", horizon=None):
+    """
+    Consumption forecast of the full catalog of a company
+    Cached until the versions fingerprint changes (i.e. per uploaded version)
+    Returns DataFrame (one row per product) or None
+    """
+    fingerprint = version_fingerprint(empresa, table_type)
+    return _forecast_consumption_cached(empresa, table_type, horizon or FORECAST_SETTINGS["horizon"], fingerprint)
+
+@st.cache_data(show_spinner="🔮 Calculando previsões de consumo...", max_entries=8)
+def _forecast_consumption_cached(empresa, table_type, horizon, fingerprint):
+    """
+    Cached body of forecast_consumption - fingerprint only serves as cache key
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return None
+
+        try:
+            produtos, datas, matrix = load_consumption_matrix(conn, empresa, table_type)
+        except Exception:
+            # History table not created yet
+            return None
+
+    if matrix is None:
+        return None
+
+    result = forecast_matrix(matrix, datas, horizon=horizon)
+    df = pd.DataFrame({
+        'Produto': produtos,
+        'Versões': result['points'],
+        'Consumo Atual': result['last'],
+        'Nível Suavizado': result['level'],
+        'Tendência/Mês': result['slope']
+    })
+    for step in range(horizon):
+        df[f'Previsão Mês {step + 1}'] = result['forecast'][:, step]
+    df['Previsão Média'] = result['forecast'].mean(axis=1)
+    return df
+
+# Cache clearing through the public name (forecast_consumption.clear())
+forecast_consumption.clear = _forecast_consumption_cached.clear
@@ -0,0 +1,198 @@
+"""
+Snowflake Product History
+Materialized per-product time series (ESTOQUE.PRODUTO_HISTORICO) with one row
+per product and version, written at upload time with a single INSERT ... SELECT.
+The table is clustered by (empresa, produto), so single-product and batch
+lookups prune micro-partitions instead of scanning every version.
+"""
+
+import streamlit as st
+import pandas as pd
+from .snowflake_connection import pooled_connection
+from .snowflake_versions import VISIBLE_ROWS_SQL, version_fingerprint
+from .snowflake_data import fetch_dataframe, FINISHED_STATUSES
+
+# Source table and history columns of each table type
+# (produto is Modelo for TIMELINE - the product name the timeline shows)
+HISTORY_SOURCES = {
+    "TIMELINE": {
+        'table': "ESTOQUE.PRODUTOS",
+        'filter': "AND table_type = 'TIMELINE'",
+        'select': """COALESCE(modelo, ''), item, estoque_total, in_transit, vendas_medias, NULL,
+                     preco_unitario, moq, fornecedor"""
+    },
+    "ANALYTICS": {
+        'table': "ESTOQUE.ANALYTICS_DATA",
+        'filter': "",
+        'select': """COALESCE(produto, ''), NULL, estoque, NULL, media_6_meses, consumo_6_meses,
+                     NULL, moq, ultimo_fornecedor"""
+    }
+}
+
+# Display names of the history columns returned by get_product_history
+HISTORY_COLUMNS = {
+    'PRODUTO': 'Produto',
+    'TABLE_TYPE': 'Tipo',
+    'ITEM': 'Item',
+    'VERSION_ID': 'Versão',
+    'DATA_UPLOAD': 'Data',
+    'ESTOQUE': 'Estoque',
+    'IN_TRANSIT': 'Em Trânsito',
+    'CONSUMO_MENSAL': 'Consumo Mensal',
+    'CONSUMO_6_MESES': 'Consumo 6 Meses',
+    'PRECO_UNITARIO': 'Preço',
+    'MOQ': 'MOQ',
+    'FORNECEDOR': 'Fornecedor'
+}
+
+# Products per IN (...) list when querying a batch
+HISTORY_BATCH_SIZE = 1000
+
+def create_history_table(cursor):
+    """Create ESTOQUE.PRODUTO_HISTORICO (called from create_tables)"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ESTOQUE.PRODUTO_HISTORICO (
+        empresa VARCHAR(50) NOT NULL,
+        table_type VARCHAR(20) NOT NULL,
+        produto VARCHAR(200) NOT NULL,
+        item VARCHAR(100),
+        version_id INTEGER NOT NULL,
+        upload_version VARCHAR(50) NOT NULL,
+        data_upload TIMESTAMP_LTZ,
+        estoque INTEGER,
+        in_transit INTEGER,
+        consumo_mensal DECIMAL(12,2),
+        consumo_6_meses DECIMAL(12,2),
+        preco_unitario DECIMAL(10,2),
+        moq INTEGER,
+        fornecedor VARCHAR(200)
+    )
+    CLUSTER BY (empresa, produto)
+    """)
+
+def record_version_history(cursor, empresa, table_type, upload_version, version_id, first_version=None):
+    """
+    Append the products of one version to ESTOQUE.PRODUTO_HISTORICO
+    Set-based INSERT ... SELECT inside Snowflake (delta versions are recorded
+    with their full product state). Re-recording a version replaces its rows.
+    Caller commits. Returns number of history rows written.
+    """
+    source = HISTORY_SOURCES[table_type]
+    first_version = first_version or version_id
+
+    cursor.execute("""
+    DELETE FROM ESTOQUE.PRODUTO_HISTORICO
+    WHERE empresa = %s AND table_type = %s AND version_id = %s
+    """, (empresa, table_type, version_id))
+
+    cursor.execute(f"""
+    INSERT INTO ESTOQUE.PRODUTO_HISTORICO
+    (empresa, table_type, version_id, upload_version, data_upload,
+     produto, item, estoque, in_transit, consumo_mensal, consumo_6_meses,
+     preco_unitario, moq, fornecedor)
+    SELECT %s, %s, %s, %s,
+           (SELECT upload_date FROM CONFIG.VERSIONS
+            WHERE empresa = %s AND table_type = %s AND version_id = %s),
+           {source['select']}
+    FROM {source['table']}
+    WHERE empresa = %s {source['filter']}
+    AND {VISIBLE_ROWS_SQL}
+    """, (empresa, table_type, version_id, upload_version,
+          empresa, table_type, version_id,
+          empresa, first_version, version_id, version_id))
+    return cursor.rowcount or 0
+
+def backfill_product_history(empresa=None):
+    """
+    Record every finished version that is not in the history table yet
+    (versions uploaded before the history existed)
+    Returns number of versions recorded or None if failed
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return None
+
+        try:
+            cursor = conn.cursor()
+            create_history_table(cursor)
+
+            cursor.execute(f"""
+            SELECT v.empresa, v.table_type, v.upload_version, v.version_id,
+                   COALESCE(v.base_version_id, v.version_id)
+            FROM CONFIG.VERSIONS v
+            WHERE v.status IN ({', '.join(['%s'] * len(FINISHED_STATUSES))})
+            AND (%s IS NULL OR v.empresa = %s)
+            AND NOT EXISTS (
+                SELECT 1 FROM ESTOQUE.PRODUTO_HISTORICO h
+                WHERE h.empresa = v.empresa AND h.table_type = v.table_type AND h.version_id = v.version_id
+            )
+            ORDER BY v.empresa, v.table_type, v.version_id
+            """, FINISHED_STATUSES + (empresa, empresa))
+            missing = cursor.fetchall()
+
+            progress = st.progress(0.0, text="📈 Registrando histórico dos produtos...")
+            for position, (version_empresa, table_type, upload_version, version_id, first_version) in enumerate(missing, start=1):
+                if table_type in HISTORY_SOURCES:
+                    record_version_history(cursor, version_empresa, table_type, upload_version,
+                                           version_id, first_version)
+                progress.progress(position / len(missing),
+                                  text=f"📈 {version_empresa} - {table_type} v{version_id}")
+
+            conn.commit()
+            cursor.close()
+            get_product_history.clear()
+            return len(missing)
+
+        except Exception as e:
+            st.error(f"❌ Erro ao reconstruir histórico: {str(e)}")
+            return None
+
+def get_product_history(empresa, produtos, table_type=None):
+    """
+    Time series of one or more products across every recorded version
+    Cached per product batch until the versions fingerprint changes
+    Returns DataFrame (one row per product and version, oldest first) or None
+    """
+    if isinstance(produtos, str):
+        produtos = [produtos]
+    fingerprint = version_fingerprint(empresa, table_type)
+    return _get_product_history_cached(empresa, tuple(sorted(set(produtos))), table_type, fingerprint)
+
+@st.cache_data(show_spinner="📈 Carregando histórico...", max_entries=32)
+def _get_product_history_cached(empresa, produtos, table_type, fingerprint):
+    """
+    Cached body of get_product_history - fingerprint only serves as cache key
+    """
+    if not produtos:
+        return None
+
+    with pooled_connection() as conn:
+        if not conn:
+            return None
+
+        try:
+            frames = []
+            for start in range(0, len(produtos), HISTORY_BATCH_SIZE):
+                batch = list(produtos[start:start + HISTORY_BATCH_SIZE])
+                query = f"""
+                SELECT produto, table_type, item, version_id, data_upload, estoque, in_transit,
+                       consumo_mensal, consumo_6_meses, preco_unitario, moq, fornecedor
+                FROM ESTOQUE.PRODUTO_HISTORICO
+                WHERE empresa = %s
+                AND (%s IS NULL OR table_type = %s)
+                AND produto IN ({', '.join(['%s'] * len(batch))})
+                ORDER BY produto, table_type, version_id
+                """
+                frames.append(fetch_dataframe(conn, query, [empresa, table_type, table_type] + batch))
+
+            df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+            if df.empty:
+                return None
+            return df.rename(columns=lambda col: HISTORY_COLUMNS.get(str(col).upper(), col))
+
+        except Exception:
+            # History table not created yet
+            return None
+
+# Cache clearing through the public name (get_product_history.clear())
+get_product_history.clear = _get_product_history_cached.clear
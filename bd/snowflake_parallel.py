@@ -0,0 +1,75 @@
+"""
+Snowflake Concurrent Loading
+Runs independent cached loaders (companies x table types) on a thread pool,
+each worker on its own pooled connection, so a multi-company view waits for
+the slowest query instead of the sum of all of them.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from .snowflake_connection import POOL_SETTINGS
+from .snowflake_data import load_data_with_history, load_analytics_data
+from .snowflake_analyses import load_timeline_analyses
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:
+    add_script_run_ctx = get_script_run_ctx = None
+
+# Companies of the group
+COMPANIES = ["MINIPA", "MINIPA_INDUSTRIA"]
+
+# Dataset name -> loader(empresa) (active version of each company)
+PARALLEL_LOADERS = {
+    "TIMELINE": lambda empresa: load_data_with_history(empresa=empresa),
+    "ANALYTICS": lambda empresa: load_analytics_data(empresa=empresa),
+    "ANALISES": lambda empresa: load_timeline_analyses(empresa, None, 6)
+}
+
+def load_concurrently(requests, max_workers=None):
+    """
+    Run (empresa, dataset) loads on a thread pool
+
+    Args:
+        requests: Iterable of (empresa, dataset) with dataset in PARALLEL_LOADERS
+        max_workers: Threads (default: pool_size - one pooled connection each)
+
+    Returns dict {(empresa, dataset): DataFrame or None} and elapsed seconds
+    """
+    requests = list(dict.fromkeys(requests))
+    if not requests:
+        return {}, 0.0
+
+    # Workers inherit the session context so caches, spinners and messages still work
+    ctx = get_script_run_ctx() if get_script_run_ctx else None
+
+    def _run(empresa, dataset):
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return PARALLEL_LOADERS[dataset](empresa)
+
+    start = time.perf_counter()
+    results = {}
+    workers = min(len(requests), max_workers or POOL_SETTINGS["pool_size"])
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="snowflake-load") as executor:
+        futures = {executor.submit(_run, empresa, dataset): (empresa, dataset) for empresa, dataset in requests}
+        for future, key in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                st.warning(f"⚠️ Erro ao carregar {key[1]} de {key[0]}: {str(e)}")
+                results[key] = None
+
+    return results, time.perf_counter() - start
+
+def load_company_group(datasets=("TIMELINE", "ANALYTICS"), empresas=None):
+    """
+    Active data of every company of the group, all datasets loaded concurrently
+    Returns ({empresa: {dataset: DataFrame or None}}, elapsed seconds)
+    """
+    empresas = empresas or COMPANIES
+    results, elapsed = load_concurrently([(empresa, dataset) for empresa in empresas for dataset in datasets])
+    grouped = {empresa: {dataset: results[(empresa, dataset)] for dataset in datasets} for empresa in empresas}
+    return grouped, elapsed
@@ -4,324 +4,361 @@ Handles table creation, schema management, and database structure
 """
 
 import streamlit as st
-from .snowflake_connection import get_snowflake_connection
+from .snowflake_connection import pooled_connection
+from .snowflake_data import get_table_columns
+from .snowflake_versions import ensure_active_versions_table, ensure_version_columns
+from .snowflake_history import create_history_table
 
 def create_tables():
     """
     Create the multi-company, versioned table structure for MINIPA system
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return False
-        
-    try:
-        cursor = conn.cursor()
-        
-        # Create schemas first
-        cursor.execute("CREATE SCHEMA IF NOT EXISTS ESTOQUE")
-        cursor.execute("CREATE SCHEMA IF NOT EXISTS CONFIG")
-        cursor.execute("CREATE SCHEMA IF NOT EXISTS TIMELINE")
-        
-        # Create main inventory table with company and version support
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS ESTOQUE.PRODUTOS (
-            id INTEGER AUTOINCREMENT PRIMARY KEY,
-            empresa VARCHAR(50) NOT NULL,
-            upload_version VARCHAR(50) NOT NULL,
-            version_id INTEGER NOT NULL,
-            is_active BOOLEAN DEFAULT TRUE,
-            item VARCHAR(100),
-            modelo VARCHAR(200),
-            fornecedor VARCHAR(200),
-            qtd_atual INTEGER,
-            preco_unitario DECIMAL(10,2),
-            estoque_total INTEGER,
-            in_transit INTEGER,
-            vendas_medias DECIMAL(10,2),
-            cbm DECIMAL(8,4),
-            moq INTEGER,
-            data_upload TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP(),
-            usuario VARCHAR(50),
-            table_type VARCHAR(20) DEFAULT 'TIMELINE',
-            version_description TEXT,
-            created_by VARCHAR(50),
-            UNIQUE(empresa, upload_version, item, modelo)
-        )
-        """)
-        
-        # Create analytics data table with company and version support
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS ESTOQUE.ANALYTICS_DATA (
-            id INTEGER AUTOINCREMENT PRIMARY KEY,
-            empresa VARCHAR(50) NOT NULL,
-            upload_version VARCHAR(50) NOT NULL,
-            version_id INTEGER NOT NULL,
-            is_active BOOLEAN DEFAULT TRUE,
-            produto VARCHAR(200),
-            estoque INTEGER,
-            consumo_6_meses DECIMAL(10,2),
-            media_6_meses DECIMAL(10,2),
-            estoque_cobertura DECIMAL(8,2),
-            moq INTEGER DEFAULT 0,
-            ultimo_fornecedor VARCHAR(200) DEFAULT 'Brazil',
-            data_upload TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP(),
-            usuario VARCHAR(50),
-            table_type VARCHAR(20) DEFAULT 'ANALYTICS',
-            version_description TEXT,
-            created_by VARCHAR(50),
-            UNIQUE(empresa, upload_version, produto)
-        )
-        """)
-        
-        # Create timeline analysis table with company and version support
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS TIMELINE.ANALISES (
-            id INTEGER AUTOINCREMENT PRIMARY KEY,
-            empresa VARCHAR(50) NOT NULL,
-            upload_version VARCHAR(50) NOT NULL,
-            version_id INTEGER NOT NULL,
-            produto_id INTEGER,
-            dias_restantes INTEGER,
-            urgencia VARCHAR(20),
-            qtd_comprar INTEGER,
-            valor_pedido DECIMAL(12,2),
-            data_analise TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP(),
-            meta_meses INTEGER,
-            created_by VARCHAR(50)
-        )
-        """)
-        
-        # Create version control table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS CONFIG.VERSIONS (
-            id INTEGER AUTOINCREMENT PRIMARY KEY,
-            empresa VARCHAR(50) NOT NULL,
-            upload_version VARCHAR(50) NOT NULL,
-            version_id INTEGER NOT NULL,
-            table_type VARCHAR(20) NOT NULL,
-            is_active BOOLEAN DEFAULT TRUE,
-            upload_date TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP(),
-            created_by VARCHAR(50),
-            description TEXT,
-            arquivo_origem VARCHAR(255),
-            linhas_processadas INTEGER,
-            status VARCHAR(20) DEFAULT 'ACTIVE',
-            UNIQUE(empresa, upload_version, table_type)
-        )
-        """)
-        
-        # Create file upload log with enhanced tracking
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS CONFIG.UPLOAD_LOG (
-            id INTEGER AUTOINCREMENT PRIMARY KEY,
-            empresa VARCHAR(50) NOT NULL,
-            upload_version VARCHAR(50) NOT NULL,
-            version_id INTEGER NOT NULL,
-            nome_arquivo VARCHAR(255),
-            tamanho_arquivo INTEGER,
-            linhas_processadas INTEGER,
-            data_upload TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP(),
-            usuario VARCHAR(50),
-            status VARCHAR(20),
-            table_type VARCHAR(20),
-            error_details TEXT,
-            processing_time_seconds INTEGER
-        )
-        """)
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-        
-    except Exception as e:
-        st.error(f"❄️ Erro ao criar tabelas: {str(e)}")
-        return False
+    with pooled_connection() as conn:
+        if not conn:
+            return False
+        
+        try:
+            cursor = conn.cursor()
+        
+            # Create schemas first
+            cursor.execute("CREATE SCHEMA IF NOT EXISTS ESTOQUE")
+            cursor.execute("CREATE SCHEMA IF NOT EXISTS CONFIG")
+            cursor.execute("CREATE SCHEMA IF NOT EXISTS TIMELINE")
+        
+            # Create main inventory table with company and version support
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ESTOQUE.PRODUTOS (
+                id INTEGER AUTOINCREMENT PRIMARY KEY,
+                empresa VARCHAR(50) NOT NULL,
+                upload_version VARCHAR(50) NOT NULL,
+                version_id INTEGER NOT NULL,
+                is_active BOOLEAN DEFAULT TRUE,
+                item VARCHAR(100),
+                modelo VARCHAR(200),
+                fornecedor VARCHAR(200),
+                qtd_atual INTEGER,
+                preco_unitario DECIMAL(10,2),
+                estoque_total INTEGER,
+                in_transit INTEGER,
+                vendas_medias DECIMAL(10,2),
+                cbm DECIMAL(8,4),
+                moq INTEGER,
+                data_upload TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP(),
+                usuario VARCHAR(50),
+                table_type VARCHAR(20) DEFAULT 'TIMELINE',
+                version_description TEXT,
+                created_by VARCHAR(50),
+                valid_to_version INTEGER,
+                UNIQUE(empresa, upload_version, item, modelo)
+            )
+            """)
+        
+            # Create analytics data table with company and version support
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ESTOQUE.ANALYTICS_DATA (
+                id INTEGER AUTOINCREMENT PRIMARY KEY,
+                empresa VARCHAR(50) NOT NULL,
+                upload_version VARCHAR(50) NOT NULL,
+                version_id INTEGER NOT NULL,
+                is_active BOOLEAN DEFAULT TRUE,
+                produto VARCHAR(200),
+                estoque INTEGER,
+                consumo_6_meses DECIMAL(10,2),
+                media_6_meses DECIMAL(10,2),
+                estoque_cobertura DECIMAL(8,2),
+                moq INTEGER DEFAULT 0,
+                ultimo_fornecedor VARCHAR(200) DEFAULT 'Brazil',
+                data_upload TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP(),
+                usuario VARCHAR(50),
+                table_type VARCHAR(20) DEFAULT 'ANALYTICS',
+                version_description TEXT,
+                created_by VARCHAR(50),
+                valid_to_version INTEGER,
+                UNIQUE(empresa, upload_version, produto)
+            )
+            """)
+        
+            # Create timeline analysis table with company and version support
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS TIMELINE.ANALISES (
+                id INTEGER AUTOINCREMENT PRIMARY KEY,
+                empresa VARCHAR(50) NOT NULL,
+                upload_version VARCHAR(50) NOT NULL,
+                version_id INTEGER NOT NULL,
+                produto_id INTEGER,
+                dias_restantes INTEGER,
+                urgencia VARCHAR(20),
+                qtd_comprar INTEGER,
+                valor_pedido DECIMAL(12,2),
+                data_analise TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP(),
+                meta_meses INTEGER,
+                created_by VARCHAR(50),
+                produto VARCHAR(200),
+                fornecedor VARCHAR(200),
+                estoque_atual DECIMAL(12,2),
+                vendas_mensais DECIMAL(12,2),
+                moq INTEGER,
+                cbm_pedido DECIMAL(14,4),
+                ordem INTEGER,
+                total_linhas INTEGER
+            )
+            """)
+        
+            # Per-product history across versions (written at upload time)
+            create_history_table(cursor)
+        
+            # Create version control table
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS CONFIG.VERSIONS (
+                id INTEGER AUTOINCREMENT PRIMARY KEY,
+                empresa VARCHAR(50) NOT NULL,
+                upload_version VARCHAR(50) NOT NULL,
+                version_id INTEGER NOT NULL,
+                table_type VARCHAR(20) NOT NULL,
+                is_active BOOLEAN DEFAULT TRUE,
+                upload_date TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP(),
+                created_by VARCHAR(50),
+                description TEXT,
+                arquivo_origem VARCHAR(255),
+                linhas_processadas INTEGER,
+                status VARCHAR(20) DEFAULT 'ACTIVE',
+                content_hash VARCHAR(64),
+                data_hash VARCHAR(64),
+                load_mode VARCHAR(10) DEFAULT 'FULL',
+                base_version_id INTEGER,
+                UNIQUE(empresa, upload_version, table_type)
+            )
+            """)
+        
+            # Create file upload log with enhanced tracking
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS CONFIG.UPLOAD_LOG (
+                id INTEGER AUTOINCREMENT PRIMARY KEY,
+                empresa VARCHAR(50) NOT NULL,
+                upload_version VARCHAR(50) NOT NULL,
+                version_id INTEGER NOT NULL,
+                nome_arquivo VARCHAR(255),
+                tamanho_arquivo INTEGER,
+                linhas_processadas INTEGER,
+                data_upload TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP(),
+                usuario VARCHAR(50),
+                status VARCHAR(20),
+                table_type VARCHAR(20),
+                error_details TEXT,
+                processing_time_seconds INTEGER
+            )
+            """)
+        
+            conn.commit()
+            cursor.close()
+        
+            # Active-version pointer table - retried only if the cached check
+            # ran before the CONFIG schema existed
+            if not ensure_active_versions_table():
+                ensure_active_versions_table.clear()
+                ensure_active_versions_table()
+        
+            # Deduplication/delta columns for tables created by older releases
+            # (cached per process - re-run only if a table was missing last time;
+            # tables created above already have every column)
+            if not ensure_version_columns():
+                ensure_version_columns.clear()
+                ensure_version_columns()
+        
+            # Tables may have been created - refresh the cached structure lookup
+            get_table_columns.clear()
+            return True
+        
+        except Exception as e:
+            st.error(f"❄️ Erro ao criar tabelas: {str(e)}")
+            return False
 
 def check_database_structure():
     """
     Check current database structure and return detailed information
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return None
+    with pooled_connection() as conn:
+        if not conn:
+            return None
         
-    try:
-        cursor = conn.cursor()
+        try:
+            cursor = conn.cursor()
         
-        structure_info = {}
+            structure_info = {}
         
-        # Check each table
-        tables_to_check = [
-            ('ESTOQUE', 'PRODUTOS'),
-            ('ESTOQUE', 'ANALYTICS_DATA'), 
-            ('CONFIG', 'VERSIONS'),
-            ('CONFIG', 'UPLOAD_LOG')
-        ]
+            # Check each table
+            tables_to_check = [
+                ('ESTOQUE', 'PRODUTOS'),
+                ('ESTOQUE', 'ANALYTICS_DATA'), 
+                ('CONFIG', 'VERSIONS'),
+                ('CONFIG', 'UPLOAD_LOG')
+            ]
         
-        for schema, table in tables_to_check:
-            table_full_name = f"{schema}.{table}"
+            for schema, table in tables_to_check:
+                table_full_name = f"{schema}.{table}"
             
-            try:
-                # Check if table exists
-                cursor.execute(f"SELECT COUNT(*) FROM {table_full_name}")
-                count = cursor.fetchone()[0]
+                try:
+                    # Check if table exists
+                    cursor.execute(f"SELECT COUNT(*) FROM {table_full_name}")
+                    count = cursor.fetchone()[0]
                 
-                # Get column information
-                cursor.execute(f"DESCRIBE TABLE {table_full_name}")
-                columns = cursor.fetchall()
-                column_names = [col[0] for col in columns]
+                    # Get column information
+                    cursor.execute(f"DESCRIBE TABLE {table_full_name}")
+                    columns = cursor.fetchall()
+                    column_names = [col[0] for col in columns]
                 
-                structure_info[table_full_name] = {
-                    'exists': True,
-                    'count': count,
-                    'columns': column_names,
-                    'has_empresa': 'EMPRESA' in [col.upper() for col in column_names],
-                    'has_table_type': 'TABLE_TYPE' in [col.upper() for col in column_names],
-                    'has_upload_version': 'UPLOAD_VERSION' in [col.upper() for col in column_names],
-                    'has_moq': 'MOQ' in [col.upper() for col in column_names],
-                    'has_ultimo_fornecedor': 'ULTIMO_FORNECEDOR' in [col.upper() for col in column_names]
-                }
+                    structure_info[table_full_name] = {
+                        'exists': True,
+                        'count': count,
+                        'columns': column_names,
+                        'has_empresa': 'EMPRESA' in [col.upper() for col in column_names],
+                        'has_table_type': 'TABLE_TYPE' in [col.upper() for col in column_names],
+                        'has_upload_version': 'UPLOAD_VERSION' in [col.upper() for col in column_names],
+                        'has_moq': 'MOQ' in [col.upper() for col in column_names],
+                        'has_ultimo_fornecedor': 'ULTIMO_FORNECEDOR' in [col.upper() for col in column_names]
+                    }
                 
-            except Exception as e:
-                structure_info[table_full_name] = {
-                    'exists': False,
-                    'error': str(e),
-                    'count': 0,
-                    'columns': []
-                }
-        
-        cursor.close()
-        conn.close()
-        return structure_info
-        
-    except Exception as e:
-        st.error(f"❌ Erro ao verificar estrutura: {str(e)}")
-        return None
+                except Exception as e:
+                    structure_info[table_full_name] = {
+                        'exists': False,
+                        'error': str(e),
+                        'count': 0,
+                        'columns': []
+                    }
+        
+            cursor.close()
+            return structure_info
+        
+        except Exception as e:
+            st.error(f"❌ Erro ao verificar estrutura: {str(e)}")
+            return None
 
 def force_create_new_structure():
     """
     Force create the new multi-company structure from scratch
     This will drop existing tables and create new ones
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return False
-        
-    try:
-        cursor = conn.cursor()
-        
-        st.warning("⚠️ **ATENÇÃO**: Esta operação irá recriar todas as tabelas!")
-        st.info("🔄 Criando estrutura completamente nova...")
-        
-        # Step 1: Create schemas
-        st.info("🔧 Criando schemas...")
-        cursor.execute("CREATE SCHEMA IF NOT EXISTS ESTOQUE")
-        cursor.execute("CREATE SCHEMA IF NOT EXISTS CONFIG")
-        conn.commit()
-        
-        # Step 2: Drop existing tables (if they exist)
-        tables_to_drop = [
-            'ESTOQUE.PRODUTOS',
-            'ESTOQUE.ANALYTICS_DATA',
-            'CONFIG.VERSIONS', 
-            'CONFIG.UPLOAD_LOG'
-        ]
-        
-        for table in tables_to_drop:
-            try:
-                cursor.execute(f"DROP TABLE IF EXISTS {table}")
-                st.info(f"🗑️ Removida tabela antiga: {table}")
-            except:
-                pass  # Table might not exist
+    with pooled_connection() as conn:
+        if not conn:
+            return False
+        
+        try:
+            cursor = conn.cursor()
+        
+            st.warning("⚠️ **ATENÇÃO**: Esta operação irá recriar todas as tabelas!")
+            st.info("🔄 Criando estrutura completamente nova...")
+        
+            # Step 1: Create schemas
+            st.info("🔧 Criando schemas...")
+            cursor.execute("CREATE SCHEMA IF NOT EXISTS ESTOQUE")
+            cursor.execute("CREATE SCHEMA IF NOT EXISTS CONFIG")
+            conn.commit()
+        
+            # Step 2: Drop existing tables (if they exist)
+            tables_to_drop = [
+                'ESTOQUE.PRODUTOS',
+                'ESTOQUE.ANALYTICS_DATA',
+                'ESTOQUE.PRODUTO_HISTORICO',
+                'CONFIG.VERSIONS', 
+                'CONFIG.ACTIVE_VERSIONS',
+                'CONFIG.UPLOAD_LOG'
+            ]
+        
+            for table in tables_to_drop:
+                try:
+                    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+                    st.info(f"🗑️ Removida tabela antiga: {table}")
+                except:
+                    pass  # Table might not exist
         
-        conn.commit()
+            conn.commit()
         
-        # Step 3: Create new tables with complete structure
-        st.info("🔧 Criando tabelas com estrutura nova...")
+            # Step 3: Create new tables with complete structure
+            st.info("🔧 Criando tabelas com estrutura nova...")
         
-        # Use the create_tables function to create clean tables
-        cursor.close()
-        conn.close()
+            # Use the create_tables function to create clean tables
+            cursor.close()
         
-        success = create_tables()
+            # Pointer table was dropped - let create_tables recreate it
+            ensure_active_versions_table.clear()
+            success = create_tables()
         
-        if success:
-            st.success("🎉 Estrutura nova criada com sucesso!")
-            st.info("💡 Agora você pode fazer uploads normalmente")
+            if success:
+                st.success("🎉 Estrutura nova criada com sucesso!")
+                st.info("💡 Agora você pode fazer uploads normalmente")
         
-        return success
+            return success
         
-    except Exception as e:
-        st.error(f"❌ Erro ao criar estrutura nova: {str(e)}")
-        return False
+        except Exception as e:
+            st.error(f"❌ Erro ao criar estrutura nova: {str(e)}")
+            return False
 
 def add_analytics_columns():
     """
     Add MOQ and ultimo_fornecedor columns to existing ANALYTICS_DATA table
     This is a safe migration that won't lose existing data
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return False
-        
-    try:
-        cursor = conn.cursor()
-        
-        st.info("🔄 Verificando e adicionando colunas MOQ e UltimoFornecedor...")
-        
-        # Check if table exists
-        try:
-            cursor.execute("SELECT COUNT(*) FROM ESTOQUE.ANALYTICS_DATA LIMIT 1")
-            table_exists = True
-        except:
-            st.warning("⚠️ Tabela ANALYTICS_DATA não existe. Execute 'Criar Tabelas' primeiro.")
+    with pooled_connection() as conn:
+        if not conn:
             return False
         
-        # Check current columns
-        cursor.execute("DESCRIBE TABLE ESTOQUE.ANALYTICS_DATA")
-        columns = cursor.fetchall()
-        column_names = [col[0].upper() for col in columns]
+        try:
+            cursor = conn.cursor()
         
-        changes_made = False
+            st.info("🔄 Verificando e adicionando colunas MOQ e UltimoFornecedor...")
         
-        # Add MOQ column if missing
-        if 'MOQ' not in column_names:
-            try:
-                cursor.execute("ALTER TABLE ESTOQUE.ANALYTICS_DATA ADD COLUMN moq INTEGER DEFAULT 0")
-                st.success("✅ Coluna MOQ adicionada com sucesso!")
-                changes_made = True
-            except Exception as e:
-                st.error(f"❌ Erro ao adicionar coluna MOQ: {str(e)}")
-        else:
-            st.info("✅ Coluna MOQ já existe")
-        
-        # Add ultimo_fornecedor column if missing
-        if 'ULTIMO_FORNECEDOR' not in column_names:
+            # Check if table exists
             try:
-                cursor.execute("ALTER TABLE ESTOQUE.ANALYTICS_DATA ADD COLUMN ultimo_fornecedor VARCHAR(200) DEFAULT 'Brazil'")
-                st.success("✅ Coluna ultimo_fornecedor adicionada com sucesso!")
-                changes_made = True
-            except Exception as e:
-                st.error(f"❌ Erro ao adicionar coluna ultimo_fornecedor: {str(e)}")
-        else:
-            st.info("✅ Coluna ultimo_fornecedor já existe")
-        
-        if changes_made:
-            conn.commit()
-            st.success("🎉 Migração concluída! Estrutura da tabela ANALYTICS_DATA atualizada.")
-            
-            # Show updated structure
+                cursor.execute("SELECT COUNT(*) FROM ESTOQUE.ANALYTICS_DATA LIMIT 1")
+                table_exists = True
+            except:
+                st.warning("⚠️ Tabela ANALYTICS_DATA não existe. Execute 'Criar Tabelas' primeiro.")
+                return False
+        
+            # Check current columns
             cursor.execute("DESCRIBE TABLE ESTOQUE.ANALYTICS_DATA")
-            updated_columns = cursor.fetchall()
-            st.info(f"📊 Colunas atualizadas: {[col[0] for col in updated_columns]}")
-        else:
-            st.info("✅ Tabela já está atualizada - nenhuma alteração necessária")
-        
-        cursor.close()
-        conn.close()
-        return True
-        
-    except Exception as e:
-        st.error(f"❌ Erro na migração: {str(e)}")
-        return False 
\ No newline at end of file
+            columns = cursor.fetchall()
+            column_names = [col[0].upper() for col in columns]
+        
+            changes_made = False
+        
+            # Add MOQ column if missing
+            if 'MOQ' not in column_names:
+                try:
+                    cursor.execute("ALTER TABLE ESTOQUE.ANALYTICS_DATA ADD COLUMN moq INTEGER DEFAULT 0")
+                    st.success("✅ Coluna MOQ adicionada com sucesso!")
+                    changes_made = True
+                except Exception as e:
+                    st.error(f"❌ Erro ao adicionar coluna MOQ: {str(e)}")
+            else:
+                st.info("✅ Coluna MOQ já existe")
+        
+            # Add ultimo_fornecedor column if missing
+            if 'ULTIMO_FORNECEDOR' not in column_names:
+                try:
+                    cursor.execute("ALTER TABLE ESTOQUE.ANALYTICS_DATA ADD COLUMN ultimo_fornecedor VARCHAR(200) DEFAULT 'Brazil'")
+                    st.success("✅ Coluna ultimo_fornecedor adicionada com sucesso!")
+                    changes_made = True
+                except Exception as e:
+                    st.error(f"❌ Erro ao adicionar coluna ultimo_fornecedor: {str(e)}")
+            else:
+                st.info("✅ Coluna ultimo_fornecedor já existe")
+        
+            if changes_made:
+                conn.commit()
+                get_table_columns.clear()
+                st.success("🎉 Migração concluída! Estrutura da tabela ANALYTICS_DATA atualizada.")
+            
+                # Show updated structure
+                cursor.execute("DESCRIBE TABLE ESTOQUE.ANALYTICS_DATA")
+                updated_columns = cursor.fetchall()
+                st.info(f"📊 Colunas atualizadas: {[col[0] for col in updated_columns]}")
+            else:
+                st.info("✅ Tabela já está atualizada - nenhuma alteração necessária")
+        
+            cursor.close()
+            return True
+        
+        except Exception as e:
+            st.error(f"❌ Erro na migração: {str(e)}")
+            return False 
\ No newline at end of file
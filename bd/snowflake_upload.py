@@ -4,90 +4,91 @@ Handles Excel file upload and analysis
 """
 
 import streamlit as st
+import hashlib
 import pandas as pd
+import numpy as np
 from datetime import datetime
-from .snowflake_connection import get_snowflake_connection
-from .snowflake_versions import create_new_version
+from .snowflake_connection import pooled_connection
+from .snowflake_versions import create_new_version, get_versions_fingerprint, point_active_version
 from .snowflake_tables import create_tables
+from .snowflake_bulk import bulk_load_dataframe, batch_insert_records
+from .snowflake_delta import get_delta_base, load_version_rows, diff_upload_frame, close_rows
+from .snowflake_history import record_version_history
+from .snowflake_analyses import precompute_timeline_analyses
+from .excel_headers import HEADER_CANDIDATES, load_workbook_sheets, score_header_row
+
+# Rows per executemany round trip when the bulk (stage) path is unavailable
+INSERT_CHUNK_SIZE = 5000
+
+# Insert column order for each data table (versioning columns first)
+TIMELINE_COLUMNS = [
+    'empresa', 'upload_version', 'version_id', 'is_active', 'item', 'modelo', 'fornecedor',
+    'qtd_atual', 'preco_unitario', 'estoque_total', 'in_transit', 'vendas_medias',
+    'cbm', 'moq', 'usuario', 'table_type', 'version_description', 'created_by'
+]
+
+ANALYTICS_COLUMNS = [
+    'empresa', 'upload_version', 'version_id', 'is_active', 'produto', 'estoque',
+    'consumo_6_meses', 'media_6_meses', 'estoque_cobertura', 'moq', 'ultimo_fornecedor',
+    'usuario', 'table_type', 'version_description', 'created_by'
+]
 
 def analyze_excel_structure(uploaded_file):
     """
     Analyze Excel file structure and suggest best processing approach
     """
     try:
-        # Try to read Excel file and detect structure
-        xl_file = pd.ExcelFile(uploaded_file)
-        sheets = xl_file.sheet_names
+        # Parse each sheet once; every header position is checked in memory
+        sheets, raw_sheets = load_workbook_sheets(uploaded_file, max_sheets=5)
         
         st.info(f"📋 Planilhas encontradas: {sheets}")
         
         # Try different starting rows to find headers - expanded range
-        for sheet in sheets[:5]:  # Check first 5 sheets
+        for sheet, raw in raw_sheets.items():  # First 5 sheets
             st.subheader(f"📊 Análise da planilha: {sheet}")
             
             # Try more header positions, especially around row 8-9 where the user's data is
-            for header_row in [0, 8, 9, 10, 7, 6, 11, 12]:
-                try:
-                    df_sample = pd.read_excel(uploaded_file, sheet_name=sheet, header=header_row, nrows=5)
-                    
-                    # Check if we found real headers (not None or Unnamed)
-                    valid_columns = 0
-                    real_headers = []
+            for header_row in HEADER_CANDIDATES:
+                result = score_header_row(raw, header_row, nrows=5)
+                if result is None:
+                    continue
+                
+                df_sample = result['sample']
+                real_headers = result['real_headers']
+                
+                # We need at least 3 valid columns with meaningful names
+                # and at least one row with data (not all None)
+                if (result['valid_columns'] >= 3 and len(df_sample) > 0 and
+                        (df_sample.notna().sum(axis=1) >= 3).any()):
+                    st.success(f"✅ Estrutura detectada em linha {header_row + 1}")
+                    st.info(f"🔍 Colunas válidas encontradas: {real_headers}")
+                    st.dataframe(df_sample)
                     
-                    for col in df_sample.columns:
-                        col_str = str(col).strip()
-                        if (col_str != 'None' and 
-                            not col_str.startswith('Unnamed') and 
-                            col_str != 'nan' and
-                            len(col_str) > 0):
-                            valid_columns += 1
-                            real_headers.append(col_str)
+                    # Show column info
+                    st.write("**Mapeamento de colunas:**")
+                    for i, col in enumerate(df_sample.columns):
+                        col_type = df_sample[col].dtype
+                        sample_val = df_sample[col].iloc[0] if len(df_sample) > 0 else "N/A"
+                        st.write(f"{i+1}. `{col}` - Tipo: {col_type} - Exemplo: {sample_val}")
                     
-                    # We need at least 3 valid columns with meaningful names
-                    if valid_columns >= 3 and len(df_sample) > 0:
-                        # Check if we have data in the rows (not all None)
-                        data_found = False
-                        for _, row in df_sample.iterrows():
-                            non_null_values = row.count()
-                            if non_null_values >= 3:
-                                data_found = True
-                                break
-                        
-                        if data_found:
-                            st.success(f"✅ Estrutura detectada em linha {header_row + 1}")
-                            st.info(f"🔍 Colunas válidas encontradas: {real_headers}")
-                            st.dataframe(df_sample)
-                            
-                            # Show column info
-                            st.write("**Mapeamento de colunas:**")
-                            for i, col in enumerate(df_sample.columns):
-                                col_type = df_sample[col].dtype
-                                sample_val = df_sample[col].iloc[0] if len(df_sample) > 0 else "N/A"
-                                st.write(f"{i+1}. `{col}` - Tipo: {col_type} - Exemplo: {sample_val}")
-                            
-                            return sheet, header_row
-                except Exception as e:
-                    continue
+                    return sheet, header_row
         
         # If no automatic detection worked, show manual options
         st.warning("⚠️ Detecção automática não funcionou. Mostrando opções manuais...")
         
         # Show raw data for manual inspection
-        for sheet in sheets[:2]:
+        for sheet in list(raw_sheets)[:2]:
             st.write(f"**Dados brutos da planilha '{sheet}':**")
-            try:
-                df_raw = pd.read_excel(uploaded_file, sheet_name=sheet, header=None, nrows=15)
-                st.dataframe(df_raw)
-                
-                # Suggest header row based on where we see most text
-                for row_idx in range(min(15, len(df_raw))):
-                    row_data = df_raw.iloc[row_idx]
-                    text_count = sum(1 for val in row_data if isinstance(val, str) and len(str(val)) > 2)
-                    if text_count >= 3:
-                        st.info(f"💡 Possível cabeçalho na linha {row_idx + 1}: {list(row_data[:5])}")
-                        return sheet, row_idx
-            except:
-                continue
+            df_raw = raw_sheets[sheet].head(15)
+            st.dataframe(df_raw)
+            
+            # Suggest header row based on where we see most text
+            for row_idx in range(min(15, len(df_raw))):
+                row_data = df_raw.iloc[row_idx]
+                text_count = sum(1 for val in row_data if isinstance(val, str) and len(str(val)) > 2)
+                if text_count >= 3:
+                    st.info(f"💡 Possível cabeçalho na linha {row_idx + 1}: {list(row_data[:5])}")
+                    return sheet, row_idx
         
         return None, 0
                         
@@ -95,294 +96,401 @@ def analyze_excel_structure(uploaded_file):
         st.error(f"❌ Erro ao analisar Excel: {str(e)}")
         return None, 0
 
-def upload_excel_to_snowflake(df, arquivo_nome, empresa="MINIPA", usuario="minipa", table_type="TIMELINE", description=""):
+def _numeric_column(df, column, as_int=False):
+    """
+    Coerce one source column to numbers in a single pass
+    Missing columns become 0; unparseable and infinite cells become 0 and are flagged
+    Returns (values, invalid_mask, infinite_mask)
+    """
+    if column not in df.columns:
+        no_flags = pd.Series(False, index=df.index)
+        return pd.Series(0 if as_int else 0.0, index=df.index), no_flags, no_flags
+
+    raw = df[column]
+    values = pd.to_numeric(raw, errors='coerce')
+    infinite = values.isin([np.inf, -np.inf])
+    values = values.where(~infinite)
+    blank = raw.isna() | (raw.astype(str).str.strip().str.lower().isin(['', 'nan']))
+    invalid = values.isna() & ~blank & ~infinite
+    values = values.fillna(0)
+
+    if as_int:
+        values = np.trunc(values).astype('int64')
+    else:
+        values = values.astype('float64')
+    return values, invalid, infinite
+
+def _text_column(df, column):
+    """String version of a source column with missing values as ''"""
+    if column not in df.columns:
+        return pd.Series('', index=df.index)
+    return df[column].fillna('').astype(str)
+
+def normalize_upload_frame(df, table_type="TIMELINE"):
+    """
+    Turn a raw Excel frame into the typed business columns of ESTOQUE.PRODUTOS
+    (TIMELINE) or ESTOQUE.ANALYTICS_DATA (ANALYTICS) without per-row Python
+
+    Returns (insert_df, rejected_df) where rejected_df lists skipped empty rows
+    and rows whose numeric cells could not be parsed or were infinite (stored as 0)
+
+    Differences from the former row-by-row loop (all listed in rejected_df
+    except the first):
+        - blank text cells are stored as '' (the loop stored the text 'nan')
+        - infinite numbers are stored as 0 (the loop kept inf in float columns,
+          which the DECIMAL columns reject)
+        - a row without product/item/model/supplier text and with zero
+          quantities is skipped even if its text cells were blank (NaN)
+    """
+    if table_type == "TIMELINE":
+        numeric_spec = [
+            ('qtd_atual', 'QTD', True),
+            ('preco_unitario', 'Preco_Unitario', False),
+            ('estoque_total', 'Estoque_Total', True),
+            ('in_transit', 'In_Transit', True),
+            ('vendas_medias', 'Vendas_Medias', False),
+            ('cbm', 'CBM', False),
+            ('moq', 'MOQ', True)
+        ]
+        frame = pd.DataFrame({
+            'item': _text_column(df, 'Item'),
+            'modelo': _text_column(df, 'Modelo'),
+            'fornecedor': _text_column(df, 'Fornecedor')
+        }, index=df.index)
+    else:  # ANALYTICS
+        numeric_spec = [
+            ('estoque', 'Estoque', True),
+            ('consumo_6_meses', 'Consumo 6 Meses', False),
+            ('media_6_meses', 'Média 6 Meses', False),
+            ('estoque_cobertura', 'Estoque Cobertura', False),
+            ('moq', 'MOQ', True)
+        ]
+        # Produto, falling back to Item and then Modelo
+        produto = _text_column(df, 'Produto')
+        item = _text_column(df, 'Item')
+        modelo = _text_column(df, 'Modelo')
+        produto = produto.where(produto != '', item.where(item != '', modelo))
+
+        # UltimoFor / UltimoFornecedor, defaulting to Brazil
+        fornecedor = _text_column(df, 'UltimoFor')
+        fornecedor = fornecedor.where(fornecedor != '', _text_column(df, 'UltimoFornecedor'))
+        sem_fornecedor = fornecedor.str.strip().str.lower().isin(['', 'nan', 'none'])
+
+        frame = pd.DataFrame({
+            'produto': produto,
+            'ultimo_fornecedor': np.where(sem_fornecedor, 'Brazil', fornecedor)
+        }, index=df.index)
+
+    invalid_columns = pd.Series('', index=df.index)
+    infinite_columns = pd.Series('', index=df.index)
+    for target, source, as_int in numeric_spec:
+        frame[target], invalid, infinite = _numeric_column(df, source, as_int)
+        invalid_columns = invalid_columns.where(~invalid, invalid_columns + source + '; ')
+        infinite_columns = infinite_columns.where(~infinite, infinite_columns + source + '; ')
+
+    # Skip completely empty rows
+    if table_type == "TIMELINE":
+        empty = ((frame[['item', 'modelo', 'fornecedor']] == '').all(axis=1) &
+                 (frame['qtd_atual'] == 0) & (frame['estoque_total'] == 0))
+        business_columns = TIMELINE_COLUMNS
+    else:
+        empty = ((frame['produto'] == '') & (frame['estoque'] == 0) &
+                 (frame['consumo_6_meses'] == 0) & (frame['media_6_meses'] == 0))
+        business_columns = ANALYTICS_COLUMNS
+
+    coerced = (invalid_columns != '') & ~empty
+    infinite_rows = (infinite_columns != '') & ~empty
+    rejected = pd.concat([
+        pd.DataFrame({'Linha': df.index[empty] + 1,
+                      'Motivo': 'Linha sem produto e com quantidades zeradas - ignorada'}),
+        pd.DataFrame({'Linha': df.index[coerced] + 1,
+                      'Motivo': 'Valor não numérico convertido para 0: ' + invalid_columns[coerced].str.rstrip('; ')}),
+        pd.DataFrame({'Linha': df.index[infinite_rows] + 1,
+                      'Motivo': 'Valor infinito convertido para 0: ' + infinite_columns[infinite_rows].str.rstrip('; ')})
+    ], ignore_index=True).sort_values('Linha', kind='stable').reset_index(drop=True)
+
+    columns = [col for col in business_columns if col in frame.columns]
+    return frame.loc[~empty, columns].reset_index(drop=True), rejected
+
+def frame_hash(df_insert):
+    """
+    SHA-256 of a normalized frame (column names + row hashes, order preserved)
+    Stable for identical data regardless of file name or workbook formatting
+    """
+    digest = hashlib.sha256("|".join(map(str, df_insert.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df_insert, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def upload_data_hash(df, table_type="TIMELINE"):
+    """
+    Hash of the rows an upload of df would store (same cleaning as the upload)
+    """
+    df_insert, _ = normalize_upload_frame(df.dropna(how='all'), table_type)
+    return frame_hash(df_insert)
+
+def upload_excel_to_snowflake(df, arquivo_nome, empresa="MINIPA", usuario="minipa", table_type="TIMELINE",
+                              description="", content_hash=None, load_mode="FULL"):
     """
     Upload Excel data to Snowflake with multi-company versioning support
+    content_hash is the SHA-256 of the uploaded file (stored for deduplication)
+    load_mode="DELTA" stores only the products that changed since the active
+    version (falls back to a full upload when a delta is not possible)
     Returns True if successful, False otherwise
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return False
-        
-    start_time = datetime.now()
-    
-    try:
-        cursor = conn.cursor()
-        
-        # Create new version for this upload
-        st.info(f"🔄 Criando nova versão para {empresa} - {table_type}...")
-        version_info = create_new_version(
-            empresa=empresa, 
-            table_type=table_type, 
-            description=description, 
-            created_by=usuario, 
-            arquivo_origem=arquivo_nome
-        )
-        
-        if not version_info:
-            st.error("❌ Erro ao criar nova versão")
+    with pooled_connection() as conn:
+        if not conn:
             return False
         
-        upload_version = version_info['upload_version']
-        version_id = version_info['version_id']
-        
-        st.success(f"✅ Nova versão criada: v{version_id} ({upload_version})")
-        
-        # IMPORTANT: Deactivate all previous versions for this company and table type
-        st.info(f"🔄 Desativando versões anteriores para {empresa} - {table_type}...")
-        
-        # Deactivate in data tables
-        if table_type == "TIMELINE":
-            cursor.execute("""
-            UPDATE ESTOQUE.PRODUTOS 
-            SET is_active = FALSE 
-            WHERE empresa = %s AND table_type = %s
-            """, (empresa, table_type))
-        elif table_type == "ANALYTICS":
-            cursor.execute("""
-            UPDATE ESTOQUE.ANALYTICS_DATA 
-            SET is_active = FALSE 
-            WHERE empresa = %s
-            """, (empresa,))
-        
-        # Deactivate in version control table
-        cursor.execute("""
-        UPDATE CONFIG.VERSIONS 
-        SET is_active = FALSE 
-        WHERE empresa = %s AND table_type = %s
-        """, (empresa, table_type))
-        
-        # Set the new version as active in version control
-        cursor.execute("""
-        UPDATE CONFIG.VERSIONS 
-        SET is_active = TRUE 
-        WHERE empresa = %s AND upload_version = %s AND table_type = %s
-        """, (empresa, upload_version, table_type))
-        
-        conn.commit()
-        st.success(f"✅ Versão v{version_id} definida como ativa para {empresa}")
-        
-        # Ensure tables exist
-        st.info(f"🔧 Verificando estrutura das tabelas...")
-        if not create_tables():
-            st.warning("⚠️ Erro ao verificar/criar tabelas - continuando...")
-        
-        # For ANALYTICS uploads, ensure MOQ and ultimo_fornecedor columns exist
-        if table_type == "ANALYTICS":
-            try:
-                # Test if columns exist by trying a simple query
-                cursor.execute("SELECT moq, ultimo_fornecedor FROM ESTOQUE.ANALYTICS_DATA LIMIT 1")
-            except Exception as column_error:
-                if "invalid identifier" in str(column_error).lower():
-                    st.warning("⚠️ Colunas MOQ/UltimoFornecedor não encontradas. Tentando adicionar...")
-                    try:
-                        # Try to add missing columns
-                        cursor.execute("ALTER TABLE ESTOQUE.ANALYTICS_DATA ADD COLUMN moq INTEGER DEFAULT 0")
-                        st.info("✅ Coluna MOQ adicionada")
-                    except:
-                        pass  # Column might already exist
+        start_time = datetime.now()
+    
+        try:
+            cursor = conn.cursor()
+        
+            # Clean the dataframe - remove NaN and empty rows
+            df_clean = df.copy()
+            df_clean = df_clean.dropna(how='all')
+        
+            # Get actual column names from the dataframe
+            available_columns = list(df_clean.columns)
+            st.info(f"📊 Colunas encontradas: {available_columns}")
+        
+            success_count = 0
+            error_count = 0
+        
+            # Vectorized cleaning: typed, insert-ready frame + report of skipped rows
+            st.info(f"📋 Processando {len(df_clean)} linhas para {table_type} de {empresa}...")
+            df_insert, rejected_rows = normalize_upload_frame(df_clean, table_type)
+        
+            if len(rejected_rows) > 0:
+                with st.expander(f"⚠️ {len(rejected_rows)} linhas ignoradas ou com valores corrigidos"):
+                    st.dataframe(rejected_rows, use_container_width=True)
+        
+            # Delta mode: diff against the active version by product key
+            delta = None
+            delta_base = None
+            if load_mode == "DELTA":
+                delta_base = get_delta_base(cursor, empresa, table_type)
+                if delta_base is None:
+                    st.warning("⚠️ Upload incremental requer que a versão ativa seja a mais recente. Enviando versão completa...")
+                else:
+                    base_rows = load_version_rows(conn, empresa, table_type, delta_base['base_version_id'],
+                                                  delta_base['version_id'], list(df_insert.columns))
+                    delta = diff_upload_frame(df_insert, base_rows, table_type)
+                    if delta is None:
+                        st.warning("⚠️ Produtos repetidos no arquivo ou na versão ativa - upload incremental indisponível. Enviando versão completa...")
+                    else:
+                        st.info(f"🔀 Incremental sobre v{delta_base['version_id']}: {delta['inserted']} novos, "
+                                f"{delta['changed']} alterados, {delta['deleted']} removidos, "
+                                f"{delta['unchanged']} sem alteração")
+        
+            # Create new version for this upload
+            st.info(f"🔄 Criando nova versão para {empresa} - {table_type}...")
+            version_info = create_new_version(
+                empresa=empresa, 
+                table_type=table_type, 
+                description=description, 
+                created_by=usuario, 
+                arquivo_origem=arquivo_nome,
+                content_hash=content_hash,
+                data_hash=frame_hash(df_insert),
+                load_mode="DELTA" if delta else "FULL",
+                base_version_id=delta_base['base_version_id'] if delta else None
+            )
+        
+            if not version_info:
+                st.error("❌ Erro ao criar nova versão")
+                return False
+        
+            upload_version = version_info['upload_version']
+            version_id = version_info['version_id']
+        
+            st.success(f"✅ Nova versão criada: v{version_id} ({upload_version})")
+        
+            # Ensure tables exist
+            st.info(f"🔧 Verificando estrutura das tabelas...")
+            if not create_tables():
+                st.warning("⚠️ Erro ao verificar/criar tabelas - continuando...")
+        
+            # For ANALYTICS uploads, ensure MOQ and ultimo_fornecedor columns exist
+            if table_type == "ANALYTICS":
+                try:
+                    # Test if columns exist by trying a simple query
+                    cursor.execute("SELECT moq, ultimo_fornecedor FROM ESTOQUE.ANALYTICS_DATA LIMIT 1")
+                except Exception as column_error:
+                    if "invalid identifier" in str(column_error).lower():
+                        st.warning("⚠️ Colunas MOQ/UltimoFornecedor não encontradas. Tentando adicionar...")
+                        try:
+                            # Try to add missing columns
+                            cursor.execute("ALTER TABLE ESTOQUE.ANALYTICS_DATA ADD COLUMN moq INTEGER DEFAULT 0")
+                            st.info("✅ Coluna MOQ adicionada")
+                        except:
+                            pass  # Column might already exist
                     
-                    try:
-                        cursor.execute("ALTER TABLE ESTOQUE.ANALYTICS_DATA ADD COLUMN ultimo_fornecedor VARCHAR(200) DEFAULT 'Brazil'")
-                        st.info("✅ Coluna ultimo_fornecedor adicionada")
-                    except:
-                        pass  # Column might already exist
+                        try:
+                            cursor.execute("ALTER TABLE ESTOQUE.ANALYTICS_DATA ADD COLUMN ultimo_fornecedor VARCHAR(200) DEFAULT 'Brazil'")
+                            st.info("✅ Coluna ultimo_fornecedor adicionada")
+                        except:
+                            pass  # Column might already exist
                     
-                    conn.commit()
-                    st.success("🔧 Estrutura da tabela atualizada automaticamente!")
-        
-        # Clean the dataframe - remove NaN and empty rows
-        df_clean = df.copy()
-        df_clean = df_clean.dropna(how='all')
-        
-        # Get actual column names from the dataframe
-        available_columns = list(df_clean.columns)
-        st.info(f"📊 Colunas encontradas: {available_columns}")
-        
-        success_count = 0
-        error_count = 0
+                        conn.commit()
+                        st.success("🔧 Estrutura da tabela atualizada automaticamente!")
+        
+            if table_type == "TIMELINE":
+                table_name, columns = "PRODUTOS", TIMELINE_COLUMNS
+            else:  # ANALYTICS
+                table_name, columns = "ANALYTICS_DATA", ANALYTICS_COLUMNS
+        
+            # Delta uploads write only new/changed products
+            rows_to_write = delta['rows'] if delta else df_insert
+        
+            df_insert = rows_to_write.assign(
+                empresa=empresa,
+                upload_version=upload_version,
+                version_id=version_id,
+                is_active=True,
+                usuario=usuario,
+                table_type=table_type,
+                version_description=description,
+                created_by=usuario
+            )[columns]
+        
+            # Bulk path: one Parquet stage + COPY INTO for the whole version
+            bulk_result = None
+            if len(df_insert) > 0:
+                bulk_result = bulk_load_dataframe(conn, df_insert, table_name)
+            
+            if bulk_result is not None:
+                success_count = bulk_result['loaded']
+                error_count = bulk_result['rejected']
+                if error_count > 0 and bulk_result['first_error']:
+                    st.warning(f"⚠️ {error_count} linhas rejeitadas. Primeiro erro: {bulk_result['first_error']}")
+            elif len(df_insert) > 0:
+                # Fallback: chunked executemany inserts (stage not available)
+                records = list(df_insert.itertuples(index=False, name=None))
+                batch_result = batch_insert_records(conn, table_name, columns, records,
+                                                    chunk_size=INSERT_CHUNK_SIZE)
+                success_count = batch_result['loaded']
+                error_count = batch_result['rejected']
+        
+            # Delta: close the replaced/removed rows of the chain; the version holds
+            # the unchanged rows it inherits plus the rows just written. With rejected
+            # rows the chain is left untouched - closing their old rows would drop
+            # those products from the version - and the version is not activated.
+            delta_incomplete = bool(delta) and error_count > 0
+            if delta_incomplete:
+                st.error(f"❌ {error_count} linhas do upload incremental rejeitadas - versão gravada como PARTIAL e não ativada")
+            elif delta:
+                closed_count = close_rows(cursor, empresa, table_type, delta['close_ids'], version_id)
+                st.info(f"🔀 {success_count} linhas gravadas, {closed_count} linhas encerradas")
+                success_count += delta['unchanged']
+        
+            complete = success_count > 0 and not delta_incomplete
+            status = 'SUCCESS' if complete else 'PARTIAL'
+        
+            # Calculate processing time
+            end_time = datetime.now()
+            processing_time = int((end_time - start_time).total_seconds())
         
-        # Helper functions for safe data conversion
-        def safe_numeric(val, default=0):
-            if pd.isna(val) or val == '' or str(val).lower() == 'nan':
-                return default
+            # Update version record with processing results
             try:
-                return int(float(str(val)))
-            except:
-                return default
-        
-        def safe_float(val, default=0.0):
-            if pd.isna(val) or val == '' or str(val).lower() == 'nan':
-                return default
+                cursor.execute("""
+                UPDATE CONFIG.VERSIONS 
+                SET linhas_processadas = %s, status = %s
+                WHERE empresa = %s AND upload_version = %s AND table_type = %s
+                """, (success_count, status, empresa, upload_version, table_type))
+            except Exception as version_update_error:
+                st.warning(f"⚠️ Erro ao atualizar registro de versão: {str(version_update_error)}")
+        
+            # Product history rows for this version (one set-based INSERT ... SELECT)
+            if complete:
+                try:
+                    record_version_history(cursor, empresa, table_type, upload_version, version_id,
+                                           delta_base['base_version_id'] if delta else version_id)
+                except Exception as history_error:
+                    st.warning(f"⚠️ Erro ao registrar histórico dos produtos: {str(history_error)}")
+        
+            # Activate the new version only once its rows are loaded - one pointer row,
+            # no is_active rewrite of older versions
+            if complete:
+                point_active_version(cursor, empresa, table_type, upload_version, version_id, usuario)
+                st.success(f"✅ Versão v{version_id} definida como ativa para {empresa}")
+        
+            # Log the upload
             try:
-                return float(val)
-            except:
-                return default
+                cursor.execute("""
+                INSERT INTO CONFIG.UPLOAD_LOG 
+                (empresa, upload_version, version_id, nome_arquivo, linhas_processadas, 
+                 usuario, status, table_type, processing_time_seconds)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (empresa, upload_version, version_id, arquivo_nome, success_count, usuario, 
+                      status, table_type, processing_time))
+            except Exception as log_error:
+                st.warning(f"⚠️ Erro ao registrar log: {str(log_error)}")
         
-        # Insert new data row by row based on table type
-        if table_type == "TIMELINE":
-            st.info(f"📋 Processando {len(df_clean)} linhas para Timeline de {empresa}...")
-            
-            for idx, row in df_clean.iterrows():
-                try:
-                    # Extract values for timeline table
-                    item = str(row.get('Item', '')) if 'Item' in row.index else ''
-                    modelo = str(row.get('Modelo', '')) if 'Modelo' in row.index else ''
-                    fornecedor = str(row.get('Fornecedor', '')) if 'Fornecedor' in row.index else ''
-                    
-                    qtd_atual = safe_numeric(row.get('QTD', 0))
-                    preco_unitario = safe_float(row.get('Preco_Unitario', 0.0))
-                    estoque_total = safe_numeric(row.get('Estoque_Total', 0)) 
-                    in_transit = safe_numeric(row.get('In_Transit', 0))
-                    vendas_medias = safe_float(row.get('Vendas_Medias', 0.0))
-                    cbm = safe_float(row.get('CBM', 0.0))
-                    moq = safe_numeric(row.get('MOQ', 0))
-                    
-                    # Skip completely empty rows
-                    if not any([item, modelo, fornecedor]) and all(v == 0 for v in [qtd_atual, estoque_total]):
-                        continue
-                    
-                    # Insert timeline data with versioning
-                    cursor.execute("""
-                    INSERT INTO ESTOQUE.PRODUTOS 
-                    (empresa, upload_version, version_id, is_active, item, modelo, fornecedor, 
-                     qtd_atual, preco_unitario, estoque_total, in_transit, vendas_medias, 
-                     cbm, moq, usuario, table_type, version_description, created_by)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (empresa, upload_version, version_id, True, item, modelo, fornecedor, 
-                          qtd_atual, preco_unitario, estoque_total, in_transit, vendas_medias, 
-                          cbm, moq, usuario, table_type, description, usuario))
-                    
-                    success_count += 1
-                    
-                except Exception as row_error:
-                    error_count += 1
-                    if error_count <= 5:  # Show only first 5 errors
-                        st.warning(f"⚠️ Erro na linha {idx + 1}: {str(row_error)}")
-                    continue
-                    
-        else:  # ANALYTICS
-            st.info(f"📊 Processando {len(df_clean)} linhas para Analytics de {empresa}...")
-            
-            for idx, row in df_clean.iterrows():
-                try:
-                    # Extract values for analytics table
-                    produto = str(row.get('Produto', ''))
-                    if not produto:  # Try alternative column names
-                        produto = str(row.get('Item', '') or row.get('Modelo', ''))
-                    
-                    estoque = safe_numeric(row.get('Estoque', 0))
-                    consumo_6_meses = safe_float(row.get('Consumo 6 Meses', 0.0))
-                    media_6_meses = safe_float(row.get('Média 6 Meses', 0.0))
-                    estoque_cobertura = safe_float(row.get('Estoque Cobertura', 0.0))
-                    
-                    # NEW: Handle MOQ and UltimoFornecedor columns
-                    moq = safe_numeric(row.get('MOQ', 0))
-                    ultimo_fornecedor = str(row.get('UltimoFor', '') or row.get('UltimoFornecedor', ''))
-                    if not ultimo_fornecedor or ultimo_fornecedor.lower() in ['nan', 'none', '']:
-                        ultimo_fornecedor = 'Brazil'  # Default value
-                    
-                    # Skip completely empty rows
-                    if not produto and all(v == 0 for v in [estoque, consumo_6_meses, media_6_meses]):
-                        continue
-                    
-                    # Insert analytics data with versioning - UPDATED WITH NEW COLUMNS
-                    cursor.execute("""
-                    INSERT INTO ESTOQUE.ANALYTICS_DATA 
-                    (empresa, upload_version, version_id, is_active, produto, estoque, 
-                     consumo_6_meses, media_6_meses, estoque_cobertura, moq, ultimo_fornecedor,
-                     usuario, table_type, version_description, created_by)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (empresa, upload_version, version_id, True, produto, estoque, 
-                          consumo_6_meses, media_6_meses, estoque_cobertura, moq, ultimo_fornecedor,
-                          usuario, table_type, description, usuario))
-                    
-                    success_count += 1
-                    
-                except Exception as row_error:
-                    error_count += 1
-                    if error_count <= 5:  # Show only first 5 errors
-                        st.warning(f"⚠️ Erro na linha {idx + 1}: {str(row_error)}")
-                    continue
+            conn.commit()
+            cursor.close()
         
-        # Calculate processing time
-        end_time = datetime.now()
-        processing_time = int((end_time - start_time).total_seconds())
+            # New version changes the fingerprint - pages reload it on next render
+            get_versions_fingerprint.clear()
         
-        # Update version record with processing results
-        try:
-            cursor.execute("""
-            UPDATE CONFIG.VERSIONS 
-            SET linhas_processadas = %s, status = %s
-            WHERE empresa = %s AND upload_version = %s AND table_type = %s
-            """, (success_count, 'SUCCESS' if success_count > 0 else 'PARTIAL', empresa, upload_version, table_type))
-        except Exception as version_update_error:
-            st.warning(f"⚠️ Erro ao atualizar registro de versão: {str(version_update_error)}")
-        
-        # Log the upload
-        try:
-            cursor.execute("""
-            INSERT INTO CONFIG.UPLOAD_LOG 
-            (empresa, upload_version, version_id, nome_arquivo, linhas_processadas, 
-             usuario, status, table_type, processing_time_seconds)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (empresa, upload_version, version_id, arquivo_nome, success_count, usuario, 
-                  'SUCCESS' if success_count > 0 else 'PARTIAL', table_type, processing_time))
-        except Exception as log_error:
-            st.warning(f"⚠️ Erro ao registrar log: {str(log_error)}")
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        # Show results
-        if success_count > 0:
-            st.success(f"✅ {success_count} linhas processadas com sucesso para {empresa}!")
-            if error_count > 0:
-                st.warning(f"⚠️ {error_count} linhas com erro foram ignoradas")
+            # Post-upload stage: timeline analyses for every meta_meses of the page
+            if table_type == "TIMELINE" and complete:
+                try:
+                    analyses_count = precompute_timeline_analyses(empresa, upload_version, version_id, usuario)
+                    if analyses_count:
+                        st.info(f"🧮 {analyses_count} análises de timeline pré-calculadas")
+                except Exception as analyses_error:
+                    st.warning(f"⚠️ Erro ao pré-calcular análises: {str(analyses_error)}")
+        
+            # Show results
+            if complete:
+                st.success(f"✅ {success_count} linhas processadas com sucesso para {empresa}!")
+                if error_count > 0:
+                    st.warning(f"⚠️ {error_count} linhas com erro foram ignoradas")
             
-            st.info(f"""
-            🎯 **Resumo do Upload:**
-            - 🏢 Empresa: {empresa}
-            - 📊 Tipo: {table_type}
-            - 📦 Versão: v{version_id}
-            - ✅ Sucesso: {success_count} linhas
-            - ⚠️ Erros: {error_count} linhas
-            - ⏱️ Tempo: {processing_time}s
-            """)
-            return True
-        else:
-            st.error("❌ Nenhuma linha foi processada com sucesso")
-            return False
-        
-    except Exception as e:
-        st.error(f"❄️ Erro ao fazer upload: {str(e)}")
-        st.error(f"📊 Detalhes do erro: {type(e).__name__}")
-        
-        # Log the error
-        try:
-            end_time = datetime.now()
-            processing_time = int((end_time - start_time).total_seconds())
+                st.info(f"""
+                🎯 **Resumo do Upload:**
+                - 🏢 Empresa: {empresa}
+                - 📊 Tipo: {table_type}
+                - 📦 Versão: v{version_id}{" (incremental)" if delta else ""}
+                - ✅ Sucesso: {success_count} linhas
+                - ⚠️ Erros: {error_count} linhas
+                - ⏱️ Tempo: {processing_time}s
+                """)
+                return True
+            else:
+                if not delta_incomplete:
+                    st.error("❌ Nenhuma linha foi processada com sucesso")
+                return False
+        
+        except Exception as e:
+            st.error(f"❄️ Erro ao fazer upload: {str(e)}")
+            st.error(f"📊 Detalhes do erro: {type(e).__name__}")
+        
+            # Log the error
+            try:
+                end_time = datetime.now()
+                processing_time = int((end_time - start_time).total_seconds())
             
-            cursor.execute("""
-            INSERT INTO CONFIG.UPLOAD_LOG 
-            (empresa, upload_version, version_id, nome_arquivo, linhas_processadas, 
-             usuario, status, table_type, error_details, processing_time_seconds)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (empresa, version_info['upload_version'] if 'version_info' in locals() else 'ERROR', 
-                  version_info['version_id'] if 'version_info' in locals() else 0, 
-                  arquivo_nome, 0, usuario, 'ERROR', table_type, str(e), processing_time))
-            conn.commit()
-        except:
-            pass  # Don't fail if logging fails
-        
-        # Show more helpful error message
-        error_str = str(e)
-        if "does not exist" in error_str:
-            st.error("🔧 **Problema**: As tabelas não existem no Snowflake")
-            st.info("💡 **Solução**: Vá para a página 'Snowflake' e clique em 'Criar Tabelas'")
-        elif "UNIQUE constraint" in error_str:
-            st.error("🔧 **Problema**: Dados duplicados detectados")
-            st.info("💡 **Solução**: Verifique se os dados já foram importados para esta versão")
-        
-        return False 
\ No newline at end of file
+                cursor.execute("""
+                INSERT INTO CONFIG.UPLOAD_LOG 
+                (empresa, upload_version, version_id, nome_arquivo, linhas_processadas, 
+                 usuario, status, table_type, error_details, processing_time_seconds)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (empresa, version_info['upload_version'] if 'version_info' in locals() else 'ERROR', 
+                      version_info['version_id'] if 'version_info' in locals() else 0, 
+                      arquivo_nome, 0, usuario, 'ERROR', table_type, str(e), processing_time))
+                conn.commit()
+            except:
+                pass  # Don't fail if logging fails
+        
+            # Show more helpful error message
+            error_str = str(e)
+            if "does not exist" in error_str:
+                st.error("🔧 **Problema**: As tabelas não existem no Snowflake")
+                st.info("💡 **Solução**: Vá para a página 'Snowflake' e clique em 'Criar Tabelas'")
+            elif "UNIQUE constraint" in error_str:
+                st.error("🔧 **Problema**: Dados duplicados detectados")
+                st.info("💡 **Solução**: Verifique se os dados já foram importados para esta versão")
+        
+            return False 
\ No newline at end of file
@@ -5,8 +5,16 @@ Handles data versioning, version control, and version history
 
 import streamlit as st
 import uuid
+import numpy as np
+import pandas as pd
 from datetime import datetime
-from .snowflake_connection import get_snowflake_connection
+from .snowflake_connection import pooled_connection
+from .snowflake_cache import evict_cached_version
+
+# Rows visible in a version: rows written from the chain base up to the version
+# that were not closed by a later delta upload of the chain (SCD validity range)
+# Params: (first_version, last_version, last_version)
+VISIBLE_ROWS_SQL = "version_id BETWEEN %s AND %s AND (valid_to_version IS NULL OR valid_to_version > %s)"
 
 def generate_version_id(empresa, table_type):
     """
@@ -21,435 +29,745 @@ def generate_version_id(empresa, table_type):
         st.error(f"❌ Erro ao gerar ID de versão: {str(e)}")
         return f"ERROR_{uuid.uuid4().hex[:8]}"
 
-def create_new_version(empresa, table_type, description="", created_by="minipa", arquivo_origem=""):
+@st.cache_resource(show_spinner=False)
+def ensure_active_versions_table():
+    """
+    Create CONFIG.ACTIVE_VERSIONS (checked once per process)
+    Only when the table is created is it seeded from the legacy
+    CONFIG.VERSIONS.is_active flags, so existing deployments keep their
+    active versions. is_active is not maintained after the migration, so
+    re-seeding later would point companies back to stale versions.
+    Returns True if the pointer table is available
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return False
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+            SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES 
+            WHERE TABLE_SCHEMA = 'CONFIG' AND TABLE_NAME = 'ACTIVE_VERSIONS'
+            """)
+            table_exists = cursor.fetchone()[0] > 0
+            if table_exists:
+                cursor.close()
+                return True
+        
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS CONFIG.ACTIVE_VERSIONS (
+                empresa VARCHAR(50) NOT NULL,
+                table_type VARCHAR(20) NOT NULL,
+                upload_version VARCHAR(50) NOT NULL,
+                version_id INTEGER NOT NULL,
+                updated_at TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP(),
+                updated_by VARCHAR(50),
+                PRIMARY KEY (empresa, table_type)
+            )
+            """)
+            cursor.execute("""
+            MERGE INTO CONFIG.ACTIVE_VERSIONS a
+            USING (
+                SELECT empresa, table_type, upload_version, version_id
+                FROM CONFIG.VERSIONS 
+                WHERE is_active = TRUE
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY empresa, table_type ORDER BY version_id DESC) = 1
+            ) v
+            ON a.empresa = v.empresa AND a.table_type = v.table_type
+            WHEN NOT MATCHED THEN INSERT (empresa, table_type, upload_version, version_id, updated_by)
+            VALUES (v.empresa, v.table_type, v.upload_version, v.version_id, 'migration')
+            """)
+            conn.commit()
+            cursor.close()
+            return True
+        
+        except Exception:
+            # CONFIG schema not created yet - create_tables retries after creating it
+            return False
+
+@st.cache_resource(show_spinner=False)
+def ensure_version_columns():
+    """
+    Add the deduplication, delta-upload and precomputed-analysis columns to
+    tables created before they existed (once per process - create_tables
+    reruns it only when a table was missing on the first run)
+    Returns True if every column is in place
+    """
+    statements = [
+        "ALTER TABLE CONFIG.VERSIONS ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+        "ALTER TABLE CONFIG.VERSIONS ADD COLUMN IF NOT EXISTS data_hash VARCHAR(64)",
+        "ALTER TABLE CONFIG.VERSIONS ADD COLUMN IF NOT EXISTS load_mode VARCHAR(10) DEFAULT 'FULL'",
+        "ALTER TABLE CONFIG.VERSIONS ADD COLUMN IF NOT EXISTS base_version_id INTEGER",
+        "ALTER TABLE ESTOQUE.PRODUTOS ADD COLUMN IF NOT EXISTS valid_to_version INTEGER",
+        "ALTER TABLE ESTOQUE.ANALYTICS_DATA ADD COLUMN IF NOT EXISTS valid_to_version INTEGER",
+        "ALTER TABLE TIMELINE.ANALISES ADD COLUMN IF NOT EXISTS produto VARCHAR(200)",
+        "ALTER TABLE TIMELINE.ANALISES ADD COLUMN IF NOT EXISTS fornecedor VARCHAR(200)",
+        "ALTER TABLE TIMELINE.ANALISES ADD COLUMN IF NOT EXISTS estoque_atual DECIMAL(12,2)",
+        "ALTER TABLE TIMELINE.ANALISES ADD COLUMN IF NOT EXISTS vendas_mensais DECIMAL(12,2)",
+        "ALTER TABLE TIMELINE.ANALISES ADD COLUMN IF NOT EXISTS moq INTEGER",
+        "ALTER TABLE TIMELINE.ANALISES ADD COLUMN IF NOT EXISTS cbm_pedido DECIMAL(14,4)",
+        "ALTER TABLE TIMELINE.ANALISES ADD COLUMN IF NOT EXISTS ordem INTEGER",
+        "ALTER TABLE TIMELINE.ANALISES ADD COLUMN IF NOT EXISTS total_linhas INTEGER"
+    ]
+    
+    with pooled_connection() as conn:
+        if not conn:
+            return False
+        
+        cursor = conn.cursor()
+        complete = True
+        for statement in statements:
+            try:
+                cursor.execute(statement)
+            except Exception:
+                complete = False  # Table not created yet
+        cursor.close()
+        return complete
+
+def point_active_version(cursor, empresa, table_type, upload_version, version_id, updated_by="minipa"):
+    """
+    Make upload_version the active version of (empresa, table_type)
+    Single-row MERGE into CONFIG.ACTIVE_VERSIONS - constant cost regardless
+    of how many versions/rows are stored. Caller commits.
+    """
+    cursor.execute("""
+    MERGE INTO CONFIG.ACTIVE_VERSIONS a
+    USING (SELECT %s AS empresa, %s AS table_type, %s AS upload_version,
+                  %s AS version_id, %s AS updated_by) s
+    ON a.empresa = s.empresa AND a.table_type = s.table_type
+    WHEN MATCHED THEN UPDATE SET upload_version = s.upload_version, version_id = s.version_id,
+                                 updated_at = CURRENT_TIMESTAMP(), updated_by = s.updated_by
+    WHEN NOT MATCHED THEN INSERT (empresa, table_type, upload_version, version_id, updated_by)
+    VALUES (s.empresa, s.table_type, s.upload_version, s.version_id, s.updated_by)
+    """, (empresa, table_type, upload_version, version_id, updated_by))
+
+def create_new_version(empresa, table_type, description="", created_by="minipa", arquivo_origem="",
+                       content_hash=None, data_hash=None, load_mode="FULL", base_version_id=None):
     """
     Create a new version entry in the version control system
+    content_hash/data_hash identify the uploaded file and its normalized rows
+    (used by find_duplicate_version); DELTA versions store only changed rows on
+    top of the chain that starts at base_version_id
     Returns version info or None if failed
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return None
+    with pooled_connection() as conn:
+        if not conn:
+            return None
         
-    try:
-        cursor = conn.cursor()
+        try:
+            cursor = conn.cursor()
         
-        # Generate unique upload version
-        upload_version = str(uuid.uuid4())
+            # Generate unique upload version
+            upload_version = str(uuid.uuid4())
         
-        # Generate sequential version ID
-        cursor.execute("""
-        SELECT COALESCE(MAX(version_id), 0) + 1 
-        FROM CONFIG.VERSIONS 
-        WHERE empresa = %s AND table_type = %s
-        """, (empresa, table_type))
+            # Generate sequential version ID
+            cursor.execute("""
+            SELECT COALESCE(MAX(version_id), 0) + 1 
+            FROM CONFIG.VERSIONS 
+            WHERE empresa = %s AND table_type = %s
+            """, (empresa, table_type))
         
-        version_id = cursor.fetchone()[0]
+            version_id = cursor.fetchone()[0]
         
-        # Create version record
-        cursor.execute("""
-        INSERT INTO CONFIG.VERSIONS 
-        (empresa, upload_version, version_id, table_type, created_by, description, arquivo_origem)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (empresa, upload_version, version_id, table_type, created_by, description, arquivo_origem))
+            # Create version record (activation goes through CONFIG.ACTIVE_VERSIONS)
+            cursor.execute("""
+            INSERT INTO CONFIG.VERSIONS 
+            (empresa, upload_version, version_id, table_type, created_by, description, arquivo_origem,
+             content_hash, data_hash, load_mode, base_version_id, is_active)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, FALSE)
+            """, (empresa, upload_version, version_id, table_type, created_by, description, arquivo_origem,
+                  content_hash, data_hash, load_mode, base_version_id))
+        
+            conn.commit()
+            cursor.close()
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+            return {
+                'upload_version': upload_version,
+                'version_id': version_id,
+                'empresa': empresa,
+                'table_type': table_type,
+                'load_mode': load_mode,
+                'base_version_id': base_version_id
+            }
         
-        return {
-            'upload_version': upload_version,
-            'version_id': version_id,
-            'empresa': empresa,
-            'table_type': table_type
-        }
+        except Exception as e:
+            st.error(f"❌ Erro ao criar versão: {str(e)}")
+            return None
+
+@st.cache_data(ttl=10, show_spinner=False)  # One tiny metadata query per render
+def get_versions_fingerprint(empresa):
+    """
+    Cheap summary of CONFIG.VERSIONS per table type, used in every data cache key
+    Changes whenever a version is uploaded, finished, activated or deleted
+    Returns dict {table_type: fingerprint} or empty dict if failed
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return {}
+        
+        try:
+            ensure_active_versions_table()
+            ensure_version_columns()
+            cursor = conn.cursor()
+            cursor.execute("""
+            SELECT v.table_type, COUNT(*), MAX(v.version_id),
+                   MAX(CASE WHEN a.upload_version IS NOT NULL THEN v.version_id END),
+                   COUNT_IF(v.status IN ('SUCCESS', 'PARTIAL')),
+                   SUM(COALESCE(v.linhas_processadas, 0))
+            FROM CONFIG.VERSIONS v
+            LEFT JOIN CONFIG.ACTIVE_VERSIONS a
+              ON a.empresa = v.empresa AND a.table_type = v.table_type AND a.upload_version = v.upload_version
+            WHERE v.empresa = %s
+            GROUP BY v.table_type
+            """, (empresa,))
+            fingerprints = {row[0]: "|".join(str(value) for value in row[1:]) for row in cursor.fetchall()}
+            cursor.close()
+            return fingerprints
         
-    except Exception as e:
-        st.error(f"❌ Erro ao criar versão: {str(e)}")
-        return None
+        except Exception:
+            return {}
+
+def version_fingerprint(empresa, table_type=None):
+    """
+    Fingerprint of one table type (or all of them) for use as a cache key
+    """
+    fingerprints = get_versions_fingerprint(empresa)
+    if table_type:
+        return fingerprints.get(table_type)
+    return tuple(sorted(fingerprints.items()))
 
-@st.cache_data(ttl=604800, show_spinner="🔄 Carregando versões...")  # 1 week cache
 def get_upload_versions(empresa, table_type=None, limit=50):
     """
     Get list of upload versions for a company
+    Cached until the versions fingerprint changes
     Returns list of version info or empty list if failed
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return []
+    return _get_upload_versions_cached(empresa, table_type, limit, version_fingerprint(empresa, table_type))
+
+@st.cache_data(show_spinner="🔄 Carregando versões...", max_entries=32)
+def _get_upload_versions_cached(empresa, table_type, limit, fingerprint):
+    """
+    Cached body of get_upload_versions - fingerprint only serves as cache key
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return []
+        
+        try:
+            ensure_active_versions_table()
+            cursor = conn.cursor()
+        
+            # is_active comes from the CONFIG.ACTIVE_VERSIONS pointer
+            if table_type:
+                query = """
+                SELECT v.upload_version, v.version_id, v.table_type, v.upload_date, 
+                       v.description, v.arquivo_origem, v.linhas_processadas, v.status, v.created_by,
+                       a.upload_version IS NOT NULL AS is_active, v.load_mode, v.base_version_id
+                FROM CONFIG.VERSIONS v
+                LEFT JOIN CONFIG.ACTIVE_VERSIONS a
+                  ON a.empresa = v.empresa AND a.table_type = v.table_type AND a.upload_version = v.upload_version
+                WHERE v.empresa = %s AND v.table_type = %s
+                ORDER BY v.upload_date DESC
+                LIMIT %s
+                """
+                params = (empresa, table_type, limit)
+            else:
+                query = """
+                SELECT v.upload_version, v.version_id, v.table_type, v.upload_date, 
+                       v.description, v.arquivo_origem, v.linhas_processadas, v.status, v.created_by,
+                       a.upload_version IS NOT NULL AS is_active, v.load_mode, v.base_version_id
+                FROM CONFIG.VERSIONS v
+                LEFT JOIN CONFIG.ACTIVE_VERSIONS a
+                  ON a.empresa = v.empresa AND a.table_type = v.table_type AND a.upload_version = v.upload_version
+                WHERE v.empresa = %s
+                ORDER BY v.upload_date DESC
+                LIMIT %s
+                """
+                params = (empresa, limit)
+        
+            cursor.execute(query, params)
+            results = cursor.fetchall()
+        
+            versions = []
+            for row in results:
+                versions.append({
+                    'upload_version': row[0],
+                    'version_id': row[1],
+                    'table_type': row[2],
+                    'upload_date': row[3],
+                    'description': row[4] or "",
+                    'arquivo_origem': row[5] or "",
+                    'linhas_processadas': row[6] or 0,
+                    'status': row[7] or "UNKNOWN",
+                    'created_by': row[8] or "",
+                    'is_active': row[9] or False,
+                    'load_mode': row[10] or "FULL",
+                    'base_version_id': row[11]
+                })
         
-    try:
-        cursor = conn.cursor()
+            cursor.close()
+            return versions
         
-        if table_type:
-            query = """
-            SELECT upload_version, version_id, table_type, upload_date, 
-                   description, arquivo_origem, linhas_processadas, status, created_by, is_active
-            FROM CONFIG.VERSIONS 
-            WHERE empresa = %s AND table_type = %s
-            ORDER BY upload_date DESC
-            LIMIT %s
-            """
-            params = (empresa, table_type, limit)
-        else:
-            query = """
-            SELECT upload_version, version_id, table_type, upload_date, 
-                   description, arquivo_origem, linhas_processadas, status, created_by, is_active
+        except Exception as e:
+            st.error(f"❌ Erro ao carregar versões: {str(e)}")
+            return []
+
+# Backward compatible cache clearing (get_upload_versions.clear())
+get_upload_versions.clear = _get_upload_versions_cached.clear
+
+def find_duplicate_version(empresa, table_type, content_hash=None, data_hash=None):
+    """
+    Find a finished version with the same file bytes or the same normalized data
+    A renamed copy matches by content_hash; a re-saved workbook with identical
+    rows matches by data_hash. Lookup is a dict hit on the cached hash map.
+    Returns version info (with 'match': 'content' or 'data') or None
+    """
+    hashes = _get_version_hashes_cached(empresa, table_type, version_fingerprint(empresa, table_type))
+    
+    if content_hash and content_hash in hashes['content']:
+        return dict(hashes['content'][content_hash], match='content')
+    if data_hash and data_hash in hashes['data']:
+        return dict(hashes['data'][data_hash], match='data')
+    return None
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _get_version_hashes_cached(empresa, table_type, fingerprint):
+    """
+    Hash -> version maps of one company/table type - fingerprint only serves as cache key
+    Returns {'content': {hash: version}, 'data': {hash: version}}
+    """
+    hashes = {'content': {}, 'data': {}}
+    
+    with pooled_connection() as conn:
+        if not conn:
+            return hashes
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+            SELECT content_hash, data_hash, version_id, upload_version, upload_date, arquivo_origem
             FROM CONFIG.VERSIONS 
-            WHERE empresa = %s
-            ORDER BY upload_date DESC
-            LIMIT %s
-            """
-            params = (empresa, limit)
-        
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        
-        versions = []
-        for row in results:
-            versions.append({
-                'upload_version': row[0],
-                'version_id': row[1],
-                'table_type': row[2],
-                'upload_date': row[3],
-                'description': row[4] or "",
-                'arquivo_origem': row[5] or "",
-                'linhas_processadas': row[6] or 0,
-                'status': row[7] or "UNKNOWN",
-                'created_by': row[8] or "",
-                'is_active': row[9] or False
-            })
-        
-        cursor.close()
-        conn.close()
-        return versions
+            WHERE empresa = %s AND table_type = %s AND status IN ('SUCCESS', 'PARTIAL')
+              AND (content_hash IS NOT NULL OR data_hash IS NOT NULL)
+            ORDER BY version_id
+            """, (empresa, table_type))
+            
+            # Ascending order - the latest version wins when a hash repeats
+            for content, data, version_id, upload_version, upload_date, arquivo_origem in cursor.fetchall():
+                version = {
+                    'version_id': version_id,
+                    'upload_version': upload_version,
+                    'upload_date': upload_date,
+                    'arquivo_origem': arquivo_origem or ""
+                }
+                if content:
+                    hashes['content'][content] = version
+                if data:
+                    hashes['data'][data] = version
+            
+            cursor.close()
+            return hashes
         
-    except Exception as e:
-        st.error(f"❌ Erro ao carregar versões: {str(e)}")
-        return []
+        except Exception:
+            # Hash columns not migrated yet - no duplicate detection
+            return hashes
 
-def set_active_version(empresa, upload_version, table_type):
+def set_active_version(empresa, upload_version, table_type, updated_by="minipa"):
     """
-    Set a specific version as active (deactivate others)
+    Set a specific version as active
+    Only the CONFIG.ACTIVE_VERSIONS pointer row is written - data rows are untouched
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return False
-        
-    try:
-        cursor = conn.cursor()
+    with pooled_connection() as conn:
+        if not conn:
+            return False
         
-        # First, deactivate all versions for this company and table type
-        if table_type == "TIMELINE":
-            cursor.execute("""
-            UPDATE ESTOQUE.PRODUTOS 
-            SET is_active = FALSE 
-            WHERE empresa = %s AND table_type = %s
-            """, (empresa, table_type))
-        elif table_type == "ANALYTICS":
-            cursor.execute("""
-            UPDATE ESTOQUE.ANALYTICS_DATA 
-            SET is_active = FALSE 
-            WHERE empresa = %s
-            """, (empresa,))
+        try:
+            ensure_active_versions_table()
+            cursor = conn.cursor()
         
-        # Then activate the selected version
-        if table_type == "TIMELINE":
             cursor.execute("""
-            UPDATE ESTOQUE.PRODUTOS 
-            SET is_active = TRUE 
+            SELECT version_id FROM CONFIG.VERSIONS 
             WHERE empresa = %s AND upload_version = %s AND table_type = %s
             """, (empresa, upload_version, table_type))
-        elif table_type == "ANALYTICS":
-            cursor.execute("""
-            UPDATE ESTOQUE.ANALYTICS_DATA 
-            SET is_active = TRUE 
-            WHERE empresa = %s AND upload_version = %s
-            """, (empresa, upload_version))
-        
-        # Update version control
-        cursor.execute("""
-        UPDATE CONFIG.VERSIONS 
-        SET is_active = FALSE 
-        WHERE empresa = %s AND table_type = %s
-        """, (empresa, table_type))
-        
-        cursor.execute("""
-        UPDATE CONFIG.VERSIONS 
-        SET is_active = TRUE 
-        WHERE empresa = %s AND upload_version = %s AND table_type = %s
-        """, (empresa, upload_version, table_type))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
         
-        st.success(f"✅ Versão ativada para {empresa} - {table_type}")
-        return True
+            result = cursor.fetchone()
+            if not result:
+                st.error("❌ Versão não encontrada")
+                cursor.close()
+                return False
         
-    except Exception as e:
-        st.error(f"❌ Erro ao ativar versão: {str(e)}")
-        return False
+            point_active_version(cursor, empresa, table_type, upload_version, result[0], updated_by)
+        
+            conn.commit()
+            cursor.close()
+        
+            # New fingerprint makes every page pick up the activated version
+            get_versions_fingerprint.clear()
+        
+            st.success(f"✅ Versão ativada para {empresa} - {table_type}")
+            return True
+        
+        except Exception as e:
+            st.error(f"❌ Erro ao ativar versão: {str(e)}")
+            return False
 
 def get_version_by_id(empresa, version_id, table_type):
     """
     Get specific version information by version ID
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return None
+    with pooled_connection() as conn:
+        if not conn:
+            return None
         
-    try:
-        cursor = conn.cursor()
+        try:
+            ensure_active_versions_table()
+            cursor = conn.cursor()
         
-        cursor.execute("""
-        SELECT upload_version, version_id, table_type, upload_date, 
-               description, arquivo_origem, linhas_processadas, status, created_by, is_active
-        FROM CONFIG.VERSIONS 
-        WHERE empresa = %s AND version_id = %s AND table_type = %s
-        """, (empresa, version_id, table_type))
-        
-        result = cursor.fetchone()
-        
-        if result:
-            version_info = {
-                'upload_version': result[0],
-                'version_id': result[1],
-                'table_type': result[2],
-                'upload_date': result[3],
-                'description': result[4] or "",
-                'arquivo_origem': result[5] or "",
-                'linhas_processadas': result[6] or 0,
-                'status': result[7] or "UNKNOWN",
-                'created_by': result[8] or "",
-                'is_active': result[9] or False
-            }
+            cursor.execute("""
+            SELECT v.upload_version, v.version_id, v.table_type, v.upload_date, 
+                   v.description, v.arquivo_origem, v.linhas_processadas, v.status, v.created_by,
+                   a.upload_version IS NOT NULL AS is_active
+            FROM CONFIG.VERSIONS v
+            LEFT JOIN CONFIG.ACTIVE_VERSIONS a
+              ON a.empresa = v.empresa AND a.table_type = v.table_type AND a.upload_version = v.upload_version
+            WHERE v.empresa = %s AND v.version_id = %s AND v.table_type = %s
+            """, (empresa, version_id, table_type))
+        
+            result = cursor.fetchone()
+        
+            if result:
+                version_info = {
+                    'upload_version': result[0],
+                    'version_id': result[1],
+                    'table_type': result[2],
+                    'upload_date': result[3],
+                    'description': result[4] or "",
+                    'arquivo_origem': result[5] or "",
+                    'linhas_processadas': result[6] or 0,
+                    'status': result[7] or "UNKNOWN",
+                    'created_by': result[8] or "",
+                    'is_active': result[9] or False
+                }
             
-            cursor.close()
-            conn.close()
-            return version_info
-        else:
-            cursor.close()
-            conn.close()
-            return None
+                cursor.close()
+                return version_info
+            else:
+                cursor.close()
+                return None
             
-    except Exception as e:
-        st.error(f"❌ Erro ao buscar versão: {str(e)}")
-        return None
+        except Exception as e:
+            st.error(f"❌ Erro ao buscar versão: {str(e)}")
+            return None
 
 def get_active_version(empresa, table_type):
     """
     Get the currently active version for a company and table type
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return None
+    with pooled_connection() as conn:
+        if not conn:
+            return None
         
-    try:
-        cursor = conn.cursor()
+        try:
+            ensure_active_versions_table()
+            cursor = conn.cursor()
         
-        cursor.execute("""
-        SELECT upload_version, version_id, upload_date, description, 
-               arquivo_origem, linhas_processadas, created_by
-        FROM CONFIG.VERSIONS 
-        WHERE empresa = %s AND table_type = %s AND is_active = TRUE
-        ORDER BY upload_date DESC
-        LIMIT 1
-        """, (empresa, table_type))
-        
-        result = cursor.fetchone()
-        
-        if result:
-            version_info = {
-                'upload_version': result[0],
-                'version_id': result[1],
-                'upload_date': result[2],
-                'description': result[3] or "",
-                'arquivo_origem': result[4] or "",
-                'linhas_processadas': result[5] or 0,
-                'created_by': result[6] or ""
-            }
+            cursor.execute("""
+            SELECT v.upload_version, v.version_id, v.upload_date, v.description, 
+                   v.arquivo_origem, v.linhas_processadas, v.created_by
+            FROM CONFIG.ACTIVE_VERSIONS a
+            JOIN CONFIG.VERSIONS v
+              ON v.empresa = a.empresa AND v.table_type = a.table_type AND v.upload_version = a.upload_version
+            WHERE a.empresa = %s AND a.table_type = %s
+            """, (empresa, table_type))
+        
+            result = cursor.fetchone()
+        
+            if result:
+                version_info = {
+                    'upload_version': result[0],
+                    'version_id': result[1],
+                    'upload_date': result[2],
+                    'description': result[3] or "",
+                    'arquivo_origem': result[4] or "",
+                    'linhas_processadas': result[5] or 0,
+                    'created_by': result[6] or ""
+                }
             
-            cursor.close()
-            conn.close()
-            return version_info
-        else:
-            cursor.close()
-            conn.close()
-            return None
+                cursor.close()
+                return version_info
+            else:
+                cursor.close()
+                return None
             
-    except Exception as e:
-        st.error(f"❌ Erro ao buscar versão ativa: {str(e)}")
-        return None
+        except Exception as e:
+            st.error(f"❌ Erro ao buscar versão ativa: {str(e)}")
+            return None
 
 def delete_version(empresa, version_id, table_type):
     """
     Delete a specific version (cannot delete active version)
     Returns True if successful, False otherwise
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return False
-        
-    try:
-        cursor = conn.cursor()
-        
-        # First check if this version is active
-        cursor.execute("""
-        SELECT is_active FROM CONFIG.VERSIONS 
-        WHERE empresa = %s AND version_id = %s AND table_type = %s
-        """, (empresa, version_id, table_type))
-        
-        result = cursor.fetchone()
-        if not result:
-            st.error("❌ Versão não encontrada")
-            cursor.close()
-            conn.close()
-            return False
-            
-        if result[0]:  # is_active = True
-            st.error("❌ Não é possível deletar a versão ativa")
-            cursor.close()
-            conn.close()
+    with pooled_connection() as conn:
+        if not conn:
             return False
         
-        # Get upload_version for data deletion
-        cursor.execute("""
-        SELECT upload_version FROM CONFIG.VERSIONS 
-        WHERE empresa = %s AND version_id = %s AND table_type = %s
-        """, (empresa, version_id, table_type))
+        try:
+            ensure_active_versions_table()
+            cursor = conn.cursor()
         
-        upload_version_result = cursor.fetchone()
-        if not upload_version_result:
-            st.error("❌ Upload version não encontrada")
-            cursor.close()
-            conn.close()
-            return False
+            # First check if this version is active (and get upload_version for data deletion)
+            cursor.execute("""
+            SELECT v.upload_version, a.upload_version IS NOT NULL AS is_active,
+                   v.load_mode, COALESCE(v.base_version_id, v.version_id)
+            FROM CONFIG.VERSIONS v
+            LEFT JOIN CONFIG.ACTIVE_VERSIONS a
+              ON a.empresa = v.empresa AND a.table_type = v.table_type AND a.upload_version = v.upload_version
+            WHERE v.empresa = %s AND v.version_id = %s AND v.table_type = %s
+            """, (empresa, version_id, table_type))
+        
+            result = cursor.fetchone()
+            if not result:
+                st.error("❌ Versão não encontrada")
+                cursor.close()
+                return False
             
-        upload_version = upload_version_result[0]
+            if result[1]:  # Pointed to by CONFIG.ACTIVE_VERSIONS
+                st.error("❌ Não é possível deletar a versão ativa")
+                cursor.close()
+                return False
         
-        # Delete data from appropriate table
-        if table_type == "TIMELINE":
-            cursor.execute("""
-            DELETE FROM ESTOQUE.PRODUTOS 
-            WHERE empresa = %s AND upload_version = %s AND table_type = %s
-            """, (empresa, upload_version, table_type))
-        elif table_type == "ANALYTICS":
+            upload_version, _, load_mode, chain_base = result
+        
+            # Later delta uploads of the same chain are rebuilt from this version's rows
             cursor.execute("""
-            DELETE FROM ESTOQUE.ANALYTICS_DATA 
-            WHERE empresa = %s AND upload_version = %s
-            """, (empresa, upload_version))
+            SELECT COUNT(*) FROM CONFIG.VERSIONS 
+            WHERE empresa = %s AND table_type = %s AND load_mode = 'DELTA'
+              AND base_version_id = %s AND version_id > %s
+            """, (empresa, table_type, chain_base, version_id))
+            if cursor.fetchone()[0] > 0:
+                st.error("❌ Existem uploads incrementais baseados nesta versão - delete-os primeiro")
+                cursor.close()
+                return False
+        
+            # Delete data from appropriate table
+            if table_type == "TIMELINE":
+                cursor.execute("""
+                DELETE FROM ESTOQUE.PRODUTOS 
+                WHERE empresa = %s AND upload_version = %s AND table_type = %s
+                """, (empresa, upload_version, table_type))
+            elif table_type == "ANALYTICS":
+                cursor.execute("""
+                DELETE FROM ESTOQUE.ANALYTICS_DATA 
+                WHERE empresa = %s AND upload_version = %s
+                """, (empresa, upload_version))
+        
+            # A delta closed rows of its base chain - make them valid again
+            if load_mode == "DELTA":
+                if table_type == "TIMELINE":
+                    cursor.execute("""
+                    UPDATE ESTOQUE.PRODUTOS SET valid_to_version = NULL
+                    WHERE empresa = %s AND table_type = %s AND valid_to_version = %s
+                    """, (empresa, table_type, version_id))
+                elif table_type == "ANALYTICS":
+                    cursor.execute("""
+                    UPDATE ESTOQUE.ANALYTICS_DATA SET valid_to_version = NULL
+                    WHERE empresa = %s AND valid_to_version = %s
+                    """, (empresa, version_id))
         
-        # Delete version record
-        cursor.execute("""
-        DELETE FROM CONFIG.VERSIONS 
-        WHERE empresa = %s AND version_id = %s AND table_type = %s
-        """, (empresa, version_id, table_type))
+            # Product history rows of the version
+            try:
+                cursor.execute("""
+                DELETE FROM ESTOQUE.PRODUTO_HISTORICO 
+                WHERE empresa = %s AND version_id = %s AND table_type = %s
+                """, (empresa, version_id, table_type))
+            except Exception:
+                pass  # History table not created yet
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+            # Precomputed timeline analyses of the version
+            if table_type == "TIMELINE":
+                try:
+                    cursor.execute("""
+                    DELETE FROM TIMELINE.ANALISES WHERE empresa = %s AND version_id = %s
+                    """, (empresa, version_id))
+                except Exception:
+                    pass  # Analyses table not created yet
         
-        # Clear cache to refresh data
-        get_upload_versions.clear()
+            # Delete version record
+            cursor.execute("""
+            DELETE FROM CONFIG.VERSIONS 
+            WHERE empresa = %s AND version_id = %s AND table_type = %s
+            """, (empresa, version_id, table_type))
         
-        return True
+            conn.commit()
+            cursor.close()
         
-    except Exception as e:
-        st.error(f"❌ Erro ao deletar versão: {str(e)}")
-        return False
+            # Clear cache to refresh data
+            get_upload_versions.clear()
+            get_versions_fingerprint.clear()
+            evict_cached_version(empresa, table_type, upload_version)
+        
+            return True
+        
+        except Exception as e:
+            st.error(f"❌ Erro ao deletar versão: {str(e)}")
+            return False
 
 def fix_active_versions():
     """
-    Fix the is_active status to ensure only the latest version per company/table_type is active
+    Point every company/table_type at its latest version in CONFIG.ACTIVE_VERSIONS
     This is a repair function for existing data
     """
-    conn = get_snowflake_connection()
-    if not conn:
-        return False
-        
-    try:
-        cursor = conn.cursor()
-        
-        # Get all companies and table types
-        cursor.execute("""
-        SELECT DISTINCT empresa, table_type 
-        FROM CONFIG.VERSIONS 
-        ORDER BY empresa, table_type
-        """)
+    with pooled_connection() as conn:
+        if not conn:
+            return False
         
-        combinations = cursor.fetchall()
-        fixed_count = 0
+        try:
+            ensure_active_versions_table()
+            cursor = conn.cursor()
         
-        for empresa, table_type in combinations:
-            # First, deactivate all versions for this combination
-            cursor.execute("""
-            UPDATE CONFIG.VERSIONS 
-            SET is_active = FALSE 
-            WHERE empresa = %s AND table_type = %s
-            """, (empresa, table_type))
-            
-            # Deactivate in data tables
-            if table_type == "TIMELINE":
-                cursor.execute("""
-                UPDATE ESTOQUE.PRODUTOS 
-                SET is_active = FALSE 
-                WHERE empresa = %s AND table_type = %s
-                """, (empresa, table_type))
-            elif table_type == "ANALYTICS":
-                cursor.execute("""
-                UPDATE ESTOQUE.ANALYTICS_DATA 
-                SET is_active = FALSE 
-                WHERE empresa = %s
-                """, (empresa,))
-            
-            # Find the latest version (highest version_id)
+            # Latest version (highest version_id) of every company and table type
             cursor.execute("""
-            SELECT upload_version, version_id 
+            SELECT empresa, table_type, upload_version, version_id 
             FROM CONFIG.VERSIONS 
-            WHERE empresa = %s AND table_type = %s 
-            ORDER BY version_id DESC 
-            LIMIT 1
-            """, (empresa, table_type))
-            
-            latest_version = cursor.fetchone()
-            if latest_version:
-                upload_version, version_id = latest_version
-                
-                # Set the latest version as active in version control
-                cursor.execute("""
-                UPDATE CONFIG.VERSIONS 
-                SET is_active = TRUE 
-                WHERE empresa = %s AND upload_version = %s AND table_type = %s
-                """, (empresa, upload_version, table_type))
-                
-                # Set the latest version as active in data tables
-                if table_type == "TIMELINE":
-                    cursor.execute("""
-                    UPDATE ESTOQUE.PRODUTOS 
-                    SET is_active = TRUE 
-                    WHERE empresa = %s AND upload_version = %s AND table_type = %s
-                    """, (empresa, upload_version, table_type))
-                elif table_type == "ANALYTICS":
-                    cursor.execute("""
-                    UPDATE ESTOQUE.ANALYTICS_DATA 
-                    SET is_active = TRUE 
-                    WHERE empresa = %s AND upload_version = %s
-                    """, (empresa, upload_version))
-                
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY empresa, table_type ORDER BY version_id DESC) = 1
+            ORDER BY empresa, table_type
+            """)
+        
+            latest_versions = cursor.fetchall()
+            fixed_count = 0
+        
+            for empresa, table_type, upload_version, version_id in latest_versions:
+                point_active_version(cursor, empresa, table_type, upload_version, version_id, "repair")
                 fixed_count += 1
                 st.info(f"✅ {empresa} - {table_type}: v{version_id} definida como ativa")
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+            conn.commit()
+            cursor.close()
         
-        st.success(f"🔧 Reparação concluída! {fixed_count} combinações empresa/tipo corrigidas.")
+            st.success(f"🔧 Reparação concluída! {fixed_count} combinações empresa/tipo corrigidas.")
         
-        # Clear cache to refresh data
-        get_upload_versions.clear()
+            # Clear cache to refresh data
+            get_upload_versions.clear()
+            get_versions_fingerprint.clear()
         
-        return True
+            return True
         
-    except Exception as e:
-        st.error(f"❌ Erro ao reparar versões ativas: {str(e)}")
-        return False 
\ No newline at end of file
+        except Exception as e:
+            st.error(f"❌ Erro ao reparar versões ativas: {str(e)}")
+            return False 
+
+# Product key and compared columns of each table type (loader column names)
+VERSION_DIFF_COLUMNS = {
+    "TIMELINE": {
+        'keys': ['Item', 'Modelo'],
+        'numeric': ['Estoque_Total', 'QTD', 'In_Transit', 'Vendas_Medias', 'Preco_Unitario', 'MOQ'],
+        'text': ['Fornecedor']
+    },
+    "ANALYTICS": {
+        'keys': ['Produto'],
+        'numeric': ['Estoque', 'Consumo 6 Meses', 'Média 6 Meses', 'Estoque Cobertura', 'MOQ'],
+        'text': ['UltimoFornecedor']
+    }
+}
+
+def _diff_frame(df, keys, numeric, text):
+    """Key + compared columns with NULLs filled (first row wins on repeated keys)"""
+    frame = pd.DataFrame(index=df.index)
+    for column in keys + text:
+        frame[column] = df[column].fillna('').astype(str)
+    for column in numeric:
+        frame[column] = pd.to_numeric(df[column], errors='coerce').fillna(0).astype('float64')
+    return frame.drop_duplicates(keys, keep='first')
+
+def compare_version_frames(df_from, df_to, table_type):
+    """
+    Vectorized diff of two loaded versions (one outer merge on the product key)
+
+    Returns dict with:
+        added / removed: products only in df_to / only in df_from
+        changed: products in both with before/after/delta per compared column
+                 and an 'Alterações' list of the columns that changed
+        summary: counts plus per-column changed count and total delta
+    """
+    spec = VERSION_DIFF_COLUMNS[table_type]
+    keys = spec['keys']
+    numeric = [col for col in spec['numeric'] if col in df_from.columns and col in df_to.columns]
+    text = [col for col in spec['text'] if col in df_from.columns and col in df_to.columns]
+    compared = numeric + text
+
+    before = _diff_frame(df_from, keys, numeric, text)
+    after = _diff_frame(df_to, keys, numeric, text)
+    merged = before.merge(after, on=keys, how='outer', suffixes=(' (antes)', ' (depois)'), indicator=True)
+
+    both = merged['_merge'] == 'both'
+    alteracoes = pd.Series('', index=merged.index)
+    per_column = {}
+    any_change = pd.Series(False, index=merged.index)
+
+    for column in compared:
+        old, new = merged[f"{column} (antes)"], merged[f"{column} (depois)"]
+        if column in numeric:
+            differs = both & ~np.isclose(old.fillna(0), new.fillna(0), rtol=0, atol=1e-6)
+            merged[f"Δ {column}"] = new - old
+        else:
+            differs = both & (old != new)
+        any_change |= differs
+        alteracoes = alteracoes.where(~differs, alteracoes + column + ', ')
+        per_column[column] = {
+            'changed': int(differs.sum()),
+            'delta_total': float(merged.loc[differs, f"Δ {column}"].sum()) if column in numeric else None
+        }
+
+    merged['Alterações'] = alteracoes.str.rstrip(', ')
+
+    changed_columns = keys + ['Alterações'] + [
+        name for column in compared
+        for name in (f"{column} (antes)", f"{column} (depois)", f"Δ {column}")
+        if name in merged.columns
+    ]
+    changed = merged.loc[any_change, changed_columns].reset_index(drop=True)
+
+    added = merged.loc[merged['_merge'] == 'right_only', keys + [f"{col} (depois)" for col in compared]]
+    added = added.rename(columns=lambda col: col.replace(' (depois)', '')).reset_index(drop=True)
+    removed = merged.loc[merged['_merge'] == 'left_only', keys + [f"{col} (antes)" for col in compared]]
+    removed = removed.rename(columns=lambda col: col.replace(' (antes)', '')).reset_index(drop=True)
+
+    return {
+        'added': added,
+        'removed': removed,
+        'changed': changed,
+        'summary': {
+            'added': len(added),
+            'removed': len(removed),
+            'changed': len(changed),
+            'unchanged': int((both & ~any_change).sum()),
+            'per_column': per_column
+        }
+    }
+
+def diff_versions(empresa, table_type, version_from, version_to):
+    """
+    Products added, removed and changed between two versions of a company
+    version_from/version_to are version ids (None = active version)
+    Cached per version pair until the versions fingerprint changes
+    Returns compare_version_frames result or None if a version has no data
+    """
+    fingerprint = version_fingerprint(empresa, table_type)
+    return _diff_versions_cached(empresa, table_type, version_from, version_to, fingerprint)
+
+@st.cache_data(show_spinner="🔀 Comparando versões...", max_entries=8)
+def _diff_versions_cached(empresa, table_type, version_from, version_to, fingerprint):
+    """
+    Cached body of diff_versions - both versions come from the cached loaders
+    (memory, then local disk cache), so no extra warehouse query is needed
+    """
+    from .snowflake_data import load_data_with_history, load_analytics_data  # snowflake_data imports this module
+
+    loader = load_data_with_history if table_type == "TIMELINE" else load_analytics_data
+    df_from = loader(empresa=empresa, version_id=version_from)
+    df_to = loader(empresa=empresa, version_id=version_to)
+
+    if df_from is None or df_to is None:
+        return None
+    return compare_version_frames(df_from, df_to, table_type)
@@ -0,0 +1,80 @@
+"""
+Table Export
+Builds Excel (streaming write-only), CSV and Parquet downloads of a table
+and caches each generated file by (empresa, version, filters, format)
+"""
+
+import io
+import tempfile
+import streamlit as st
+import pandas as pd
+
+# Format -> (label, file extension, mime type)
+EXPORT_FORMATS = {
+    "xlsx": ("Excel (.xlsx)", "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("CSV (.csv)", "csv", "text/csv"),
+    "parquet": ("Parquet (.parquet)", "parquet", "application/octet-stream")
+}
+
+EXPORT_CHUNK_ROWS = 10000
+
+def _excel_chunk(chunk):
+    """Cell values of a chunk as Excel accepts them (no NaN/NaT, no timezones)"""
+    for column in chunk.columns:
+        if isinstance(chunk[column].dtype, pd.DatetimeTZDtype):
+            chunk[column] = chunk[column].dt.tz_localize(None)
+    return chunk.astype(object).where(chunk.notna(), None)
+
+def write_xlsx_streaming(df, sheet_name="Dados"):
+    """
+    Write an xlsx with openpyxl write-only mode
+    Rows are streamed in chunks to a temp file, so the workbook is never
+    held in memory as a cell DOM. Returns file bytes.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title=sheet_name[:31])  # Excel sheet names: max 31 chars
+    worksheet.append([str(col) for col in df.columns])
+
+    for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+        chunk = _excel_chunk(df.iloc[start:start + EXPORT_CHUNK_ROWS].copy())
+        for row in chunk.itertuples(index=False, name=None):
+            worksheet.append(row)
+
+    with tempfile.TemporaryFile() as tmp:
+        workbook.save(tmp)
+        tmp.seek(0)
+        return tmp.read()
+
+def write_csv(df):
+    """
+    CSV with UTF-8 BOM so Excel opens accents correctly
+    Rows are encoded in chunks straight into a temp file, so no full-size
+    text copy is built before encoding. Returns file bytes.
+    """
+    with tempfile.TemporaryFile() as tmp:
+        df.to_csv(tmp, index=False, encoding="utf-8-sig", chunksize=EXPORT_CHUNK_ROWS)
+        tmp.seek(0)
+        return tmp.read()
+
+def write_parquet(df):
+    """Compressed Parquet (pyarrow). Returns bytes."""
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False, compression="zstd")
+    return buffer.getvalue()
+
+@st.cache_data(show_spinner="📦 Gerando arquivo para download...", max_entries=8)
+def export_table(empresa, versao, filtros, formato, _df, sheet_name="Dados"):
+    """
+    Generate (or reuse) the export file of a table
+    empresa/versao/filtros/formato form the cache key; _df is not hashed
+    Returns file bytes or None for unknown formats
+    """
+    if formato == "xlsx":
+        return write_xlsx_streaming(_df, sheet_name)
+    if formato == "csv":
+        return write_csv(_df)
+    if formato == "parquet":
+        return write_parquet(_df)
+    return None
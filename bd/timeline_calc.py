@@ -0,0 +1,147 @@
+"""
+Purchase Timeline Calculation
+Columnar timeline (depletion dates, MOQ-optimized quantities, urgency) shared
+by the timeline page and the upload-time precompute of TIMELINE.ANALISES
+"""
+
+import streamlit as st
+import pandas as pd
+import numpy as np
+from datetime import datetime
+
+# Urgency buckets by months of stock left (upper bound inclusive)
+URGENCIAS = [
+    (1, 'CRÍTICO', '#FF0000'),
+    (3, 'MÉDIO', '#FF8C00'),
+    (6, 'ATENÇÃO', '#FFD700'),
+]
+URGENCIA_OK = ('OK', '#32CD32')
+URGENCIA_MONITORAR = ('MONITORAR', '#87CEEB')  # Light blue
+
+TIMELINE_COLUMNS = ['Produto', 'Fornecedor', 'Dias_Restantes', 'Estoque_Atual', 'Vendas_Mensais',
+                    'MOQ', 'Qtd_Otimizada', 'Valor_Pedido', 'CBM_Pedido', 'Cor', 'Urgencia',
+                    'Data_Esgotamento', 'Data_Pedido']
+
+def _coluna_numerica(df, coluna):
+    """Numeric column as float array - missing column or invalid values become 0"""
+    if coluna not in df.columns:
+        return np.zeros(len(df))
+    return pd.to_numeric(df[coluna], errors='coerce').fillna(0).to_numpy(dtype=float)
+
+def _coluna_texto(df, coluna, padrao):
+    """Text column as strings - missing values replaced by padrao (Series aligned to df)"""
+    if coluna not in df.columns:
+        return pd.Series(padrao, index=df.index, dtype=object)
+    valores = df[coluna]
+    return valores.astype(str).where(valores.notna(), padrao)
+
+def otimizar_quantidade_moq_vetorizado(vendas_mensais, moq, meta_meses=6):
+    """
+    Order quantity per product (element-wise): meta_meses of sales rounded up
+    to a multiple of the MOQ - the MOQ alone when it exceeds that or there are
+    no sales, the truncated sales target when there is no MOQ
+    """
+    qtd_ideal = vendas_mensais * meta_meses
+    moq_seguro = np.where(moq > 0, moq, 1)
+    multiplos = np.maximum(1, np.ceil(qtd_ideal / moq_seguro))
+    return np.select(
+        [vendas_mensais <= 0, moq > qtd_ideal, moq <= 0],
+        [np.where(moq > 0, moq, 0), moq, np.trunc(qtd_ideal)],
+        default=multiplos * moq
+    )
+
+def _calcular_datas(dias_restantes, com_vendas, hoje):
+    """Depletion and order dates - order 45 days before depletion, never in the past"""
+    hoje_ts = pd.Timestamp(hoje)
+    # Capped to keep dates representable
+    dias_data = pd.to_timedelta(np.clip(dias_restantes, -36500, 36500), unit='D')
+    data_esgotamento = pd.Series(hoje_ts + dias_data).where(com_vendas)
+    data_pedido = (data_esgotamento - pd.Timedelta(days=45)).clip(lower=hoje_ts)
+    return data_esgotamento, data_pedido
+
+def calcular_timeline(df, meta_meses=6):
+    """
+    Calculate timeline data for products (columnar, one pass over NumPy arrays)
+    Returns DataFrame with TIMELINE_COLUMNS sorted by Dias_Restantes
+    """
+    hoje = datetime.now()
+    
+    # Check if we have any data
+    if df.empty:
+        st.warning("⚠️ DataFrame vazio - nenhum dado para calcular timeline")
+        return pd.DataFrame(columns=TIMELINE_COLUMNS)
+    
+    # Handle missing columns and NaN values - numeric gaps count as 0
+    produto = _coluna_texto(df, 'Modelo', None)
+    produto = produto.where(produto.notna(), 'Produto_' + df.index.astype(str).to_series(index=df.index))
+    fornecedor = _coluna_texto(df, 'Fornecedor', 'Fornecedor Desconhecido')
+    
+    estoque_atual = _coluna_numerica(df, 'Estoque_Total') + _coluna_numerica(df, 'In_Transit')
+    vendas_mensais = _coluna_numerica(df, 'Vendas_Medias')
+    moq = _coluna_numerica(df, 'MOQ')
+    preco = _coluna_numerica(df, 'Preco_Unitario')
+    cbm = _coluna_numerica(df, 'CBM')
+    
+    # Products with sales get a depletion date; without sales but with stock/MOQ are monitored
+    com_vendas = vendas_mensais > 0
+    monitorar = ~com_vendas & ((estoque_atual > 0) | (moq > 0)) & (produto.to_numpy() != 'nan')
+    incluir = com_vendas | monitorar
+    
+    meses_ate_zerar = np.divide(estoque_atual, vendas_mensais,
+                                out=np.zeros_like(estoque_atual), where=com_vendas)
+    dias_restantes = np.where(com_vendas, np.trunc(meses_ate_zerar * 30), 999).astype(int)
+    
+    qtd_otimizada = np.where(
+        com_vendas,
+        otimizar_quantidade_moq_vetorizado(vendas_mensais, moq, meta_meses),
+        np.where(moq > 0, np.maximum(moq, 50), 50)
+    )
+    
+    condicoes = [monitorar] + [com_vendas & (meses_ate_zerar <= limite) for limite, _, _ in URGENCIAS]
+    urgencia = np.select(condicoes, [URGENCIA_MONITORAR[0]] + [nome for _, nome, _ in URGENCIAS],
+                         default=URGENCIA_OK[0])
+    cor = np.select(condicoes, [URGENCIA_MONITORAR[1]] + [cor for _, _, cor in URGENCIAS],
+                    default=URGENCIA_OK[1])
+    
+    data_esgotamento, data_pedido = _calcular_datas(dias_restantes, com_vendas, hoje)
+    
+    timeline = pd.DataFrame({
+        'Produto': produto.to_numpy(),
+        'Fornecedor': fornecedor.to_numpy(),
+        'Dias_Restantes': dias_restantes,
+        'Estoque_Atual': estoque_atual,
+        'Vendas_Mensais': vendas_mensais,
+        'MOQ': moq,
+        'Qtd_Otimizada': qtd_otimizada,
+        'Valor_Pedido': qtd_otimizada * preco,
+        'CBM_Pedido': qtd_otimizada * cbm,
+        'Cor': cor,
+        'Urgencia': urgencia,
+        'Data_Esgotamento': data_esgotamento.to_numpy(),
+        'Data_Pedido': data_pedido.to_numpy()
+    })[incluir]
+    
+    return timeline.sort_values('Dias_Restantes', kind='stable').reset_index(drop=True)
+
+def timeline_de_analises(analises):
+    """
+    Timeline from the rows precomputed at upload time (TIMELINE.ANALISES)
+    Colors and dates depend on today, so they are derived here
+    Returns DataFrame with TIMELINE_COLUMNS in the stored order
+    """
+    timeline = analises.copy()
+    for coluna in ['Dias_Restantes', 'Estoque_Atual', 'Vendas_Mensais', 'MOQ', 'Qtd_Otimizada',
+                   'Valor_Pedido', 'CBM_Pedido']:
+        timeline[coluna] = _coluna_numerica(timeline, coluna)
+    timeline['Dias_Restantes'] = timeline['Dias_Restantes'].astype(int)
+    
+    cores = {nome: cor for _, nome, cor in URGENCIAS}
+    cores.update([URGENCIA_OK, URGENCIA_MONITORAR])
+    timeline['Cor'] = timeline['Urgencia'].map(cores).fillna(URGENCIA_OK[1])
+    
+    com_vendas = (timeline['Vendas_Mensais'] > 0).to_numpy()
+    data_esgotamento, data_pedido = _calcular_datas(timeline['Dias_Restantes'].to_numpy(), com_vendas, datetime.now())
+    timeline['Data_Esgotamento'] = data_esgotamento.to_numpy()
+    timeline['Data_Pedido'] = data_pedido.to_numpy()
+    
+    return timeline[TIMELINE_COLUMNS].reset_index(drop=True)
@@ -0,0 +1,84 @@
+"""
+Excel reader benchmark
+Compares pd.read_excel (default engine) with the bd/excel_reader engines on
+synthetic MINIPA-like workbooks (header on row 10, 10 columns)
+
+Usage:
+    python benchmarks/excel_readers.py            # 10k and 100k rows
+    python benchmarks/excel_readers.py 5000 50000
+"""
+
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bd.excel_reader import available_engines, iter_excel_chunks, read_excel_fast  # noqa: E402
+
+HEADER_ROW = 9
+COLUMNS = ['Item', 'Modelo', 'Fornecedor', 'QTD', 'Preço FOB\nUnitário', 'Estoque\nTotal ',
+           'In Transit\nShipt', 'Avg Sales\n', 'CBM', 'MOQ']
+MAPPED = ['Item', 'Modelo', 'Estoque\nTotal ', 'Avg Sales\n', 'MOQ']
+
+def build_workbook(rows):
+    """Synthetic export written with openpyxl write-only mode"""
+    rng = np.random.default_rng(42)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Planilha1')
+    ws.append(['Relatório de Compras'])
+    for _ in range(HEADER_ROW - 1):
+        ws.append([])
+    ws.append(COLUMNS)
+
+    qtd = rng.integers(0, 500, rows)
+    preco = rng.uniform(1, 3000, rows).round(2)
+    estoque = rng.integers(0, 2000, rows)
+    transit = rng.integers(0, 300, rows)
+    vendas = rng.uniform(0, 100, rows).round(1)
+    cbm = rng.uniform(0.01, 0.5, rows).round(3)
+    moq = rng.choice([0, 5, 10, 25, 50, 100], rows)
+    for i in range(rows):
+        ws.append([f'ITEM{i:06d}', f'Modelo {i}', f'Fornecedor {i % 40}', int(qtd[i]), float(preco[i]),
+                   int(estoque[i]), int(transit[i]), float(vendas[i]), float(cbm[i]), int(moq[i])])
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+def timed(label, func, repeat=3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<45} {best:8.3f}s")
+    return result
+
+def run(rows):
+    data = build_workbook(rows)
+    print(f"\n{rows:,} rows ({len(data) / 1024 / 1024:.1f} MB)")
+
+    timed("pd.read_excel (default engine)",
+          lambda: pd.read_excel(io.BytesIO(data), header=HEADER_ROW))
+
+    for engine in available_engines():
+        timed(f"read_excel_fast engine={engine}",
+              lambda: read_excel_fast(data, header=HEADER_ROW, engine=engine))
+        timed(f"read_excel_fast engine={engine} usecols",
+              lambda: read_excel_fast(data, header=HEADER_ROW, usecols=MAPPED, engine=engine))
+        timed(f"iter_excel_chunks engine={engine} (10k chunks)",
+              lambda: sum(len(chunk) for chunk in iter_excel_chunks(
+                  data, header_row=HEADER_ROW, chunk_size=10000, engine=engine)))
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    print(f"Engines available: {available_engines()}")
+    for size in sizes:
+        run(size)
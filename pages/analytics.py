@@ -1,8 +1,60 @@
 import streamlit as st
+import hashlib
 import pandas as pd
 import numpy as np
 import plotly.express as px
 
+# Columns read from the 'Export' sheet on local uploads
+EXPORT_COLUMNS = [
+    'Produto', 'Estoque', 'Consumo 6 Meses', 'Média 6 Meses', 'Estoque Cobertura',
+    'Qtde Tot Compras', 'MOQ', 'UltimoFor', 'UltimoFornecedor'
+]
+
+def show_version_comparison(empresa, versions):
+    """Compare two analytics versions: added, removed and changed products"""
+    from bd.snowflake_config import diff_versions
+    
+    with st.expander("🔀 Comparar versões"):
+        labels = {v['version_id']: f"v{v['version_id']} - {v.get('description') or v['upload_date']}" for v in versions}
+        version_ids = list(labels)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            version_from = st.selectbox("De:", version_ids, index=1, format_func=labels.get, key="analytics_diff_from")
+        with col2:
+            version_to = st.selectbox("Para:", version_ids, index=0, format_func=labels.get, key="analytics_diff_to")
+        
+        if version_from == version_to:
+            st.info("💡 Selecione duas versões diferentes")
+            return
+        if not st.checkbox("Mostrar diferenças", key="analytics_diff_show"):
+            return
+        
+        diff = diff_versions(empresa, "ANALYTICS", version_from, version_to)
+        if diff is None:
+            st.warning("⚠️ Não foi possível carregar as duas versões")
+            return
+        
+        summary = diff['summary']
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("🆕 Novos", summary['added'])
+        col2.metric("🗑️ Removidos", summary['removed'])
+        col3.metric("✏️ Alterados", summary['changed'])
+        col4.metric("✅ Sem alteração", summary['unchanged'])
+        
+        st.dataframe(pd.DataFrame([
+            {'Coluna': column, 'Produtos alterados': info['changed'], 'Variação total': info['delta_total']}
+            for column, info in summary['per_column'].items()
+        ]), use_container_width=True, hide_index=True)
+        
+        tab1, tab2, tab3 = st.tabs([f"✏️ Alterados ({summary['changed']})", f"🆕 Novos ({summary['added']})",
+                                    f"🗑️ Removidos ({summary['removed']})"])
+        for tab, key in [(tab1, 'changed'), (tab2, 'added'), (tab3, 'removed')]:
+            with tab:
+                st.dataframe(diff[key].head(1000), use_container_width=True, hide_index=True)
+                if len(diff[key]) > 1000:
+                    st.caption("Exibindo os primeiros 1000 produtos")
+
 def load_page():
     """Análise avançada de dados Excel - Sistema Multi-Empresa de Gestão de Estoque"""
     
@@ -27,7 +79,7 @@ def load_page():
     
     with col3:
         if st.button("🔄 Atualizar Dados", 
-                    help="Atualizar dados do Snowflake (normalmente cache por 7 dias)",
+                    help="Atualizar dados do Snowflake (novas versões aparecem automaticamente)",
                     use_container_width=True,
                     key="analytics_refresh"):
             from bd.snowflake_config import load_analytics_data
@@ -35,9 +87,12 @@ def load_page():
             st.success("✅ Cache de análise limpo! Dados atualizados.")
             st.rerun()
     
+    # Identifies the loaded data (version + fingerprint or file hash) for memoized calculations
+    versao_dados = None
+    
     # Try to load data from Snowflake first
     try:
-        from bd.snowflake_config import load_analytics_data, get_upload_versions
+        from bd.snowflake_config import load_analytics_data, get_upload_versions, version_fingerprint
         
         # Get available versions for the selected company
         versions = get_upload_versions(empresa_code, "ANALYTICS", limit=20)
@@ -81,6 +136,9 @@ def load_page():
                 st.metric("📊 Versões Disponíveis", len(versions))
                 active_versions = len([v for v in versions if v['is_active']])
                 st.metric("🟢 Versão Ativa", f"{active_versions}/1")
+            
+            if len(versions) > 1:
+                show_version_comparison(empresa_code, versions)
         else:
             selected_version_id = None
             st.info(f"💡 Nenhuma versão de análise encontrada para {empresa_selecionada}")
@@ -91,6 +149,7 @@ def load_page():
         if df is not None and len(df) > 0:
             version_text = f"v{selected_version_id}" if selected_version_id else "ativa"
             st.success(f"✅ {empresa_selecionada} - Análise {version_text}: {len(df)} produtos carregados")
+            versao_dados = (selected_version_id, version_fingerprint(empresa_code, "ANALYTICS"))
             
             # Check if data_upload column exists before accessing it
             if 'data_upload' in df.columns:
@@ -124,8 +183,11 @@ def load_page():
         
         if uploaded_file is not None:
             try:
-                # Read the Excel file
-                df = pd.read_excel(uploaded_file, sheet_name='Export')
+                # Read the Excel file (fastest engine, only the mapped columns)
+                from bd.excel_reader import read_excel_fast
+                df = read_excel_fast(uploaded_file, sheet_name='Export',
+                                     usecols=lambda col: str(col).strip() in EXPORT_COLUMNS)
+                df.columns = [str(col).strip() for col in df.columns]
                 
                 # Clean data
                 df = df.dropna(subset=['Produto'])
@@ -144,6 +206,7 @@ def load_page():
                     df.loc[df['UltimoFornecedor'].str.strip() == '', 'UltimoFornecedor'] = 'Brazil'
                 
                 st.success(f"✅ Dados carregados: {len(df)} produtos")
+                versao_dados = ('local', hashlib.md5(uploaded_file.getvalue()).hexdigest())
                 
             except Exception as e:
                 st.error(f"❌ Erro ao processar arquivo: {str(e)}")
@@ -201,32 +264,40 @@ def load_page():
         produtos_novos = df[(df.get('Estoque', 0) == 0) & (df.get('Média 6 Meses', 0) == 0) & (df.get('Qtde Tot Compras', 0) > 0)]
         produtos_existentes = df[(df.get('Estoque', 0) > 0) | (df.get('Média 6 Meses', 0) > 0)]
         
+        # Suggestions computed once per company/version and shared by all tabs
+        suggestions_df = get_purchase_suggestions(produtos_existentes, empresa_code, versao_dados)
+        
         # Show company context
         st.info(f"📊 **Análise para {empresa_selecionada}** | Versão: {f'v{selected_version_id}' if 'selected_version_id' in locals() and selected_version_id else 'Ativa'}")
         
         # Show analytics tabs with company context
-        tab1, tab2, tab3, tab4, tab5 = st.tabs([
+        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
             f"📋 Resumo - {empresa_selecionada}", 
             f"🚨 Lista de Compras - {empresa_selecionada}", 
             f"📊 Dashboards - {empresa_selecionada}", 
             f"📞 Contatos Urgentes - {empresa_selecionada}",
-            f"📋 Tabela Geral - {empresa_selecionada}"
+            f"📋 Tabela Geral - {empresa_selecionada}",
+            f"📈 Histórico - {empresa_selecionada}"
         ])
         
         with tab1:
             show_executive_summary(df, produtos_novos, produtos_existentes, empresa_selecionada)
         
         with tab2:
-            show_purchase_list(produtos_existentes, empresa_selecionada)
+            show_purchase_list(produtos_existentes, suggestions_df, empresa_selecionada)
         
         with tab3:
-            show_analytics_dashboard(produtos_existentes, produtos_novos, empresa_selecionada)
+            show_analytics_dashboard(produtos_existentes, produtos_novos, suggestions_df, empresa_selecionada)
         
         with tab4:
             show_urgent_contacts(produtos_existentes, empresa_selecionada)
         
         with tab5:
-            show_tabela_geral(df, empresa_selecionada)
+            show_tabela_geral(df, empresa_selecionada, versao_dados)
+        
+        with tab6:
+            show_consumption_forecast(empresa_code, versao_dados)
+            show_product_history(df, empresa_code, versao_dados)
 
 def show_executive_summary(df, produtos_novos, produtos_existentes, empresa="MINIPA"):
     """Resumo executivo dos dados por empresa"""
@@ -318,70 +389,87 @@ def show_executive_summary(df, produtos_novos, produtos_existentes, empresa="MIN
         if criticos == 0 and alerta == 0:
             st.success("✅ Situação de estoque sob controle!")
 
-def calculate_purchase_suggestions(produtos_existentes):
-    """Calculate purchase suggestions for products"""
-    
-    def calcular_quando_vai_acabar(estoque, consumo_mensal):
-        if consumo_mensal <= 0:
-            return "Sem consumo", 999
-        
-        meses_restantes = estoque / consumo_mensal
-        
-        if meses_restantes <= 0:
-            return "JÁ ACABOU", 0
-        elif meses_restantes < 0.5:
-            dias = int(meses_restantes * 30)
-            return f"{dias} dias", meses_restantes
-        else:
-            return f"{meses_restantes:.1f} meses", meses_restantes
-    
-    def quanto_comprar(consumo_mensal, estoque_atual, moq=0, meses_desejados=6):
-        if consumo_mensal <= 0:
-            return moq if moq > 0 else 0
-        
-        estoque_ideal = consumo_mensal * meses_desejados
-        falta = max(0, estoque_ideal - estoque_atual)
-        
-        if falta <= 0:
-            return 0
-        
-        # Use MOQ if available, otherwise round to 50s
-        if moq > 0:
-            # Calculate multiples of MOQ needed
-            multiplos = max(1, int(np.ceil(falta / moq)))
-            return multiplos * moq
-        else:
-            # Round for easier purchasing
-            return int(np.ceil(falta / 50) * 50)
-    
-    # Calculate for each product
-    suggestions = []
-    
-    for _, row in produtos_existentes.iterrows():
-        produto = str(row['Produto'])
-        estoque = row['Estoque']
-        consumo = row['Média 6 Meses']
-        moq = row.get('MOQ', 0) if 'MOQ' in row.index else 0
-        fornecedor = row.get('UltimoFornecedor', 'Brazil') if 'UltimoFornecedor' in row.index else 'Brazil'
-        
-        quando_acaba, meses_num = calcular_quando_vai_acabar(estoque, consumo)
-        qtd_comprar = quanto_comprar(consumo, estoque, moq)
-        
-        suggestions.append({
-            'Produto': produto,
-            'Estoque_Atual': estoque,
-            'Consumo_Mensal': consumo,
-            'MOQ': moq,
-            'Fornecedor': fornecedor,
-            'Quando_Acaba': quando_acaba,
-            'Meses_Restantes': meses_num,
-            'Qtd_Comprar': qtd_comprar,
-            'Investimento_Estimado': qtd_comprar * 15  # R$ 15 per unit estimate
-        })
-    
-    return pd.DataFrame(suggestions)
+def _formatar_quando_acaba(meses_restantes, sem_consumo):
+    """Text for 'Quando_Acaba' (Sem consumo / JÁ ACABOU / N dias / N.N meses)"""
+    quando_acaba = np.full(len(meses_restantes), "", dtype=object)
+    acabou = ~sem_consumo & (meses_restantes <= 0)
+    em_dias = ~sem_consumo & ~acabou & (meses_restantes < 0.5)
+    em_meses = ~(sem_consumo | acabou | em_dias)
+    
+    quando_acaba[sem_consumo] = "Sem consumo"
+    quando_acaba[acabou] = "JÁ ACABOU"
+    quando_acaba[em_dias] = [f"{int(m * 30)} dias" for m in meses_restantes[em_dias]]
+    quando_acaba[em_meses] = [f"{m:.1f} meses" for m in meses_restantes[em_meses]]
+    return quando_acaba
+
+def calculate_purchase_suggestions(produtos_existentes, meses_desejados=6):
+    """
+    Calculate purchase suggestions for products (vectorized over all rows)
+    Returns DataFrame with one suggestion per product
+    """
+    if len(produtos_existentes) == 0:
+        return pd.DataFrame(columns=['Produto', 'Estoque_Atual', 'Consumo_Mensal', 'MOQ', 'Fornecedor',
+                                     'Quando_Acaba', 'Meses_Restantes', 'Qtd_Comprar', 'Investimento_Estimado'])
+    
+    estoque = pd.to_numeric(produtos_existentes['Estoque'], errors='coerce').to_numpy(dtype=float)
+    consumo = pd.to_numeric(produtos_existentes['Média 6 Meses'], errors='coerce').to_numpy(dtype=float)
+    if 'MOQ' in produtos_existentes.columns:
+        moq_original = produtos_existentes['MOQ']
+        moq = pd.to_numeric(moq_original, errors='coerce').to_numpy(dtype=float)
+    else:
+        moq_original = pd.Series(0, index=produtos_existentes.index)
+        moq = np.zeros(len(produtos_existentes))
+    
+    # When will the stock run out (months); no consumption = 999, already out = 0
+    sem_consumo = consumo <= 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        meses = estoque / np.where(sem_consumo, 1, consumo)
+    meses_restantes = np.select([sem_consumo, meses <= 0], [999, 0], default=meses)
+    
+    # How much to buy: cover meses_desejados, in MOQ multiples (or rounded to 50s)
+    falta = consumo * meses_desejados - estoque
+    falta = np.where(falta > 0, falta, 0)  # NaN counts as nothing missing
+    tem_moq = moq > 0
+    qtd_comprar = np.select(
+        [sem_consumo, falta <= 0, tem_moq],
+        [np.where(tem_moq, moq, 0),
+         0,
+         np.maximum(1, np.ceil(falta / np.where(tem_moq, moq, 1))) * moq],
+        default=np.ceil(falta / 50) * 50
+    )
+    if pd.api.types.is_integer_dtype(moq_original):
+        qtd_comprar = qtd_comprar.astype(np.int64)
+    
+    if 'UltimoFornecedor' in produtos_existentes.columns:
+        fornecedor = produtos_existentes['UltimoFornecedor'].to_numpy()
+    else:
+        fornecedor = 'Brazil'
+    
+    return pd.DataFrame({
+        'Produto': produtos_existentes['Produto'].map(str).to_numpy(),
+        'Estoque_Atual': produtos_existentes['Estoque'].to_numpy(),
+        'Consumo_Mensal': produtos_existentes['Média 6 Meses'].to_numpy(),
+        'MOQ': moq_original.to_numpy(),
+        'Fornecedor': fornecedor,
+        'Quando_Acaba': _formatar_quando_acaba(meses_restantes, sem_consumo),
+        'Meses_Restantes': meses_restantes,
+        'Qtd_Comprar': qtd_comprar,
+        'Investimento_Estimado': qtd_comprar * 15  # R$ 15 per unit estimate
+    })
+
+def get_purchase_suggestions(produtos_existentes, empresa, versao, meses_desejados=6):
+    """
+    Purchase suggestions computed once per (empresa, versão, parâmetros)
+    Memoized in the session so every analytics tab reads the same frame
+    """
+    chave = (empresa, versao, meses_desejados)
+    memo = st.session_state.get('purchase_suggestions')
+    if memo is None or memo[0] != chave:
+        memo = (chave, calculate_purchase_suggestions(produtos_existentes, meses_desejados))
+        st.session_state.purchase_suggestions = memo
+    return memo[1]
 
-def show_purchase_list(produtos_existentes, empresa="MINIPA"):
+def show_purchase_list(produtos_existentes, suggestions_df, empresa="MINIPA"):
     """Show practical purchase list by company"""
     
     st.subheader(f"🛒 Lista Prática de Compras - {empresa}")
@@ -390,9 +478,6 @@ def show_purchase_list(produtos_existentes, empresa="MINIPA"):
         st.info("Nenhum produto existente para análise")
         return
     
-    # Calculate suggestions
-    suggestions_df = calculate_purchase_suggestions(produtos_existentes)
-    
     # Filter products that need action (increased range due to new categories)
     precisa_acao = suggestions_df[
         (suggestions_df['Meses_Restantes'] <= 6) & 
@@ -452,7 +537,7 @@ def show_purchase_list(produtos_existentes, empresa="MINIPA"):
     with col4:
         st.metric("💰 Investimento", f"R$ {investimento_total:,.0f}")
 
-def show_analytics_dashboard(produtos_existentes, produtos_novos, empresa="MINIPA"):
+def show_analytics_dashboard(produtos_existentes, produtos_novos, suggestions_df, empresa="MINIPA"):
     """Show visual analytics dashboard by company"""
     
     st.subheader(f"📊 Dashboard Visual - {empresa}")
@@ -461,9 +546,6 @@ def show_analytics_dashboard(produtos_existentes, produtos_novos, empresa="MINIP
         st.info("Nenhum produto para análise visual")
         return
     
-    # Calculate data for charts
-    suggestions_df = calculate_purchase_suggestions(produtos_existentes)
-    
     # Urgency categorization
     muito_critico = len(suggestions_df[suggestions_df['Meses_Restantes'] <= 1])
     critico = len(suggestions_df[(suggestions_df['Meses_Restantes'] > 1) & (suggestions_df['Meses_Restantes'] <= 3)])
@@ -679,7 +761,55 @@ def show_urgent_contacts(produtos_existentes, empresa="MINIPA"):
         if st.button("📊 Exportar Lista", use_container_width=True):
             st.info("Lista de produtos críticos exportada")
 
-def show_tabela_geral(df, empresa="MINIPA"):
+def normalizar_busca(valores):
+    """Lower-case, accent-stripped text used for product search (Series in, Series out)"""
+    return (valores.astype(str).str.normalize('NFKD')
+            .str.encode('ascii', 'ignore').str.decode('ascii').str.lower())
+
+def _trigramas(texto):
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def construir_indice_busca(empresa, versao, _produtos):
+    """
+    Trigram search index over normalized product names, built once per (empresa, versão)
+    Returns (normalized names array, {trigram: sorted row positions})
+    """
+    textos = normalizar_busca(_produtos).to_numpy(dtype=object)
+    postings = {}
+    for posicao, texto in enumerate(textos):
+        for trigrama in _trigramas(texto):
+            postings.setdefault(trigrama, []).append(posicao)
+    return textos, {trigrama: np.array(posicoes) for trigrama, posicoes in postings.items()}
+
+def buscar_produtos(indice, termo):
+    """
+    Row positions whose product contains termo (case/accent-insensitive)
+    Terms of 3+ characters intersect trigram posting lists before verifying
+    """
+    textos, postings = indice
+    termo = normalizar_busca(pd.Series([termo])).iloc[0].strip()
+    if not termo:
+        return np.arange(len(textos))
+    
+    if len(termo) < 3:
+        candidatos = np.arange(len(textos))
+    else:
+        listas = []
+        for trigrama in _trigramas(termo):
+            if trigrama not in postings:
+                return np.array([], dtype=int)
+            listas.append(postings[trigrama])
+        listas.sort(key=len)  # Intersect starting from the rarest trigram
+        candidatos = listas[0]
+        for lista in listas[1:]:
+            candidatos = np.intersect1d(candidatos, lista, assume_unique=True)
+        if len(termo) == 3:
+            return candidatos
+    
+    return np.array([p for p in candidatos if termo in textos[p]], dtype=int)
+
+def show_tabela_geral(df, empresa="MINIPA", versao=None):
     """Show complete data table with search, filter and export functionality"""
     
     st.subheader(f"📋 Tabela Geral - {empresa}")
@@ -688,23 +818,13 @@ def show_tabela_geral(df, empresa="MINIPA"):
         st.info("Nenhum dado disponível para exibir")
         return
     
-    # Remove metadata columns from display - FORCE REMOVAL
+    # Remove metadata columns from display (single drop, no intermediate copies)
     metadata_columns = ['data_upload', 'upload_version', 'version_id', 'upload_date', 'created_by', 'is_active']
-    clean_df = df.copy()
-    
-    # Remove metadata columns if they exist - more comprehensive
-    for col in metadata_columns:
-        if col in clean_df.columns:
-            clean_df = clean_df.drop(columns=[col])
-    
-    # Also remove any columns that start with these patterns
-    columns_to_remove = []
-    for col in clean_df.columns:
-        if any(pattern in col.lower() for pattern in ['upload', 'version', 'created', 'active']):
-            columns_to_remove.append(col)
-    
-    for col in columns_to_remove:
-        clean_df = clean_df.drop(columns=[col])
+    clean_df = df.drop(columns=[
+        col for col in df.columns
+        if col in metadata_columns or
+        any(pattern in str(col).lower() for pattern in ['upload', 'version', 'created', 'active'])
+    ])
     
     # Search and filter controls
     col1, col2, col3 = st.columns([2, 1, 1])
@@ -723,83 +843,80 @@ def show_tabela_geral(df, empresa="MINIPA"):
             coverage_filter = "Todos"
     
     with col3:
-        # Export button
-        if st.button("📥 Exportar Excel", use_container_width=True):
-            # Create Excel export
-            try:
-                import io
-                from datetime import datetime
-                
-                # Prepare clean data for export (no metadata columns)
-                export_df = clean_df.copy()
-                
-                # Create a BytesIO buffer
-                buffer = io.BytesIO()
-                
-                # Write to Excel using openpyxl (built into pandas)
-                with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                    export_df.to_excel(writer, sheet_name=f'{empresa}_Dados_Completos', index=False)
-                
-                # Get the data
-                buffer.seek(0)
-                
-                # Download button
-                st.download_button(
-                    label="⬇️ Download Excel",
-                    data=buffer.getvalue(),
-                    file_name=f"{empresa}_dados_completos_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-                st.success("✅ Arquivo Excel preparado para download!")
-                
-            except Exception as e:
-                st.error(f"❌ Erro ao gerar Excel: {str(e)}")
-                st.info("💡 Tentando método alternativo...")
-                
-                # Fallback method using CSV
-                try:
-                    csv_data = export_df.to_csv(index=False)
-                    st.download_button(
-                        label="⬇️ Download CSV (alternativo)",
-                        data=csv_data,
-                        file_name=f"{empresa}_dados_completos_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                        mime="text/csv"
-                    )
-                    st.success("✅ Arquivo CSV preparado para download!")
-                except Exception as e2:
-                    st.error(f"❌ Erro no método alternativo: {str(e2)}")
-    
-    # Apply filters
-    filtered_df = clean_df.copy()
-    
-    # Search filter
-    if search_term:
-        if 'Produto' in filtered_df.columns:
-            mask = filtered_df['Produto'].astype(str).str.contains(search_term, case=False, na=False)
-            filtered_df = filtered_df[mask]
+        # Export format (file is generated from the filtered table below)
+        from bd.table_export import EXPORT_FORMATS
+        formato_export = st.selectbox("📥 Formato de exportação:", list(EXPORT_FORMATS),
+                                      format_func=lambda f: EXPORT_FORMATS[f][0],
+                                      key="tabela_geral_formato")
+    
+    # Apply filters on row positions - only the visible page is materialized
+    posicoes = np.arange(len(clean_df))
+    
+    # Search filter (precomputed normalized index)
+    if search_term and 'Produto' in clean_df.columns:
+        if versao is None:
+            versao = int(pd.util.hash_pandas_object(clean_df['Produto'], index=False).sum())
+        indice = construir_indice_busca(empresa, versao, clean_df['Produto'])
+        posicoes = buscar_produtos(indice, search_term)
     
     # Coverage filter
-    if coverage_filter != "Todos" and 'Estoque Cobertura' in filtered_df.columns:
+    if coverage_filter != "Todos" and 'Estoque Cobertura' in clean_df.columns:
+        cobertura = clean_df['Estoque Cobertura'].to_numpy()[posicoes]
         if coverage_filter == "Críticos (≤1 mês)":
-            filtered_df = filtered_df[filtered_df['Estoque Cobertura'] <= 1]
+            posicoes = posicoes[cobertura <= 1]
         elif coverage_filter == "Alerta (1-3 meses)":
-            filtered_df = filtered_df[(filtered_df['Estoque Cobertura'] > 1) & (filtered_df['Estoque Cobertura'] <= 3)]
+            posicoes = posicoes[(cobertura > 1) & (cobertura <= 3)]
         elif coverage_filter == "Saudáveis (>3 meses)":
-            filtered_df = filtered_df[filtered_df['Estoque Cobertura'] > 3]
+            posicoes = posicoes[cobertura > 3]
+    
+    filtered_df = clean_df.iloc[posicoes]
     
     # Show results count
     st.info(f"📊 Exibindo {len(filtered_df)} de {len(clean_df)} produtos")
     
+    # Export the filtered table (cached per empresa/version/filters/format)
+    if st.button("📥 Exportar", key="tabela_geral_exportar"):
+        try:
+            from datetime import datetime
+            from bd.table_export import EXPORT_FORMATS, export_table
+            
+            if versao is None:
+                versao = int(pd.util.hash_pandas_object(clean_df, index=False).sum())
+            label, extensao, mime = EXPORT_FORMATS[formato_export]
+            data = export_table(empresa, versao, (search_term, coverage_filter), formato_export,
+                                filtered_df, sheet_name=f'{empresa}_Dados_Completos')
+            
+            st.download_button(
+                label=f"⬇️ Download {label}",
+                data=data,
+                file_name=f"{empresa}_dados_completos_{datetime.now().strftime('%Y%m%d_%H%M')}.{extensao}",
+                mime=mime
+            )
+            st.success(f"✅ Arquivo {label} preparado para download!")
+        except Exception as e:
+            st.error(f"❌ Erro ao gerar arquivo: {str(e)}")
+    
     # Display the table
     if len(filtered_df) > 0:
-        # Format numeric columns for better display
-        display_df = filtered_df.copy()
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            por_pagina = st.selectbox("📄 Linhas por página", [50, 100, 250, 500], index=1,
+                                      key="tabela_geral_por_pagina")
+        total_paginas = max(1, -(-len(filtered_df) // por_pagina))
+        if st.session_state.get("tabela_geral_pagina", 1) > total_paginas:
+            st.session_state.tabela_geral_pagina = 1  # Filter shrank the result
+        with col2:
+            pagina = st.number_input(f"📑 Página (de {total_paginas})", min_value=1, max_value=total_paginas,
+                                     step=1, key="tabela_geral_pagina")
+        
+        inicio = (pagina - 1) * por_pagina
+        display_df = filtered_df.iloc[inicio:inicio + por_pagina].copy()
         
-        # Round numeric columns
+        # Round numeric columns (visible page only)
         numeric_columns = display_df.select_dtypes(include=[np.number]).columns
         for col in numeric_columns:
             if col in ['Estoque', 'Consumo 6 Meses', 'Média 6 Meses']:
-                display_df[col] = display_df[col].round(0).astype(int)
+                display_df[col] = display_df[col].fillna(0).round(0).astype(int)
             elif col in ['Estoque Cobertura']:
                 display_df[col] = display_df[col].round(2)
             else:
@@ -822,13 +939,14 @@ def show_tabela_geral(df, empresa="MINIPA"):
         if "UltimoFornecedor" in display_df.columns:
             column_config["UltimoFornecedor"] = st.column_config.TextColumn("Último Fornecedor", width="medium")
         
-        # Show the dataframe with pagination
+        # Only the current page is sent to the browser
         st.dataframe(
             display_df,
             use_container_width=True,
-            height=600,
+            height=min(600, 38 + 35 * len(display_df)),
             column_config=column_config
         )
+        st.caption(f"Linhas {inicio + 1}-{inicio + len(display_df)} de {len(filtered_df)}")
         
         # Summary statistics
         st.subheader("📈 Estatísticas Resumidas")
@@ -873,4 +991,75 @@ def show_tabela_geral(df, empresa="MINIPA"):
                 )
     
     else:
-        st.warning("🔍 Nenhum produto encontrado com os filtros aplicados") 
\ No newline at end of file
+        st.warning("🔍 Nenhum produto encontrado com os filtros aplicados") 
+
+def show_product_history(df, empresa="MINIPA", versao=None):
+    """Stock and consumption trajectory of selected products across all uploaded versions"""
+    
+    st.subheader("📈 Histórico por Produto")
+    
+    if versao is not None and versao[0] == 'local':
+        st.info("💡 O histórico está disponível apenas para dados carregados do Snowflake")
+        return
+    if 'Produto' not in df.columns:
+        st.info("Nenhum produto disponível para exibir")
+        return
+    
+    produtos = st.multiselect("🔍 Produtos (até 10):", sorted(df['Produto'].dropna().astype(str).unique()),
+                              max_selections=10, key="historico_produtos")
+    if not produtos:
+        st.info("💡 Selecione um ou mais produtos para ver a evolução entre as versões")
+        return
+    
+    from bd.snowflake_config import get_product_history
+    historico = get_product_history(empresa, produtos, "ANALYTICS")
+    if historico is None:
+        st.warning("⚠️ Nenhum histórico encontrado para os produtos selecionados")
+        return
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        fig = px.line(historico, x='Data', y='Estoque', color='Produto', markers=True,
+                      title="📦 Estoque por Versão")
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        fig = px.line(historico, x='Data', y='Consumo Mensal', color='Produto', markers=True,
+                      title="📊 Consumo Médio Mensal por Versão")
+        st.plotly_chart(fig, use_container_width=True)
+    
+    st.dataframe(
+        historico[['Produto', 'Versão', 'Data', 'Estoque', 'Consumo Mensal', 'Consumo 6 Meses', 'MOQ', 'Fornecedor']],
+        use_container_width=True,
+        hide_index=True
+    )
+
+def show_consumption_forecast(empresa="MINIPA", versao=None):
+    """Catalog-wide consumption forecast fitted on the history of all versions"""
+    
+    st.subheader("🔮 Previsão de Consumo")
+    
+    if versao is not None and versao[0] == 'local':
+        st.info("💡 A previsão está disponível apenas para dados carregados do Snowflake")
+        return
+    
+    from bd.snowflake_config import forecast_consumption
+    previsao = forecast_consumption(empresa, "ANALYTICS")
+    if previsao is None:
+        st.info("💡 Nenhum histórico de versões disponível para calcular previsões")
+        return
+    
+    # Trend relative to the current level (% per month)
+    base = previsao['Nível Suavizado'].where(previsao['Nível Suavizado'] > 0)
+    previsao['Tendência %/Mês'] = (previsao['Tendência/Mês'] / base * 100).round(1)
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("📦 Produtos com previsão", len(previsao))
+    col2.metric("📈 Consumo em alta (>5%/mês)", int((previsao['Tendência %/Mês'] > 5).sum()))
+    col3.metric("📉 Consumo em queda (<-5%/mês)", int((previsao['Tendência %/Mês'] < -5).sum()))
+    
+    display_df = previsao.reindex(previsao['Tendência %/Mês'].abs().sort_values(ascending=False).index).head(1000)
+    st.dataframe(display_df.round(1), use_container_width=True, hide_index=True)
+    st.caption("Produtos ordenados pela variação de consumo (primeiros 1000) - "
+               "tendência por mínimos quadrados, nível por suavização exponencial")
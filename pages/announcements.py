@@ -1,62 +1,193 @@
 import streamlit as st
 import json
 import os
+import sqlite3
+from contextlib import closing
 from datetime import date, timedelta
 
+# Local announcements database (announcements.json is migrated into it once)
+ANNOUNCEMENTS_DB = "announcements.db"
+ANNOUNCEMENTS_FILE = "announcements.json"
+ANNOUNCEMENTS_PER_PAGE = 20
+
+ANNOUNCEMENT_FIELDS = ["title", "content", "type", "priority", "department", "author", "date", "active"]
+
+def _connect():
+    """New SQLite connection (WAL lets readers run while a write is in progress)"""
+    conn = sqlite3.connect(ANNOUNCEMENTS_DB, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+@st.cache_resource(show_spinner=False)
+def init_announcements_db():
+    """
+    Create the announcements table and its indexes (once per process)
+    Imports announcements.json once per database - PRAGMA user_version records
+    the migration so announcements deleted later are not imported again
+    """
+    with closing(_connect()) as conn:
+        with conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS announcements (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                content TEXT NOT NULL,
+                type TEXT NOT NULL,
+                priority TEXT NOT NULL,
+                department TEXT NOT NULL,
+                author TEXT,
+                date TEXT NOT NULL,
+                active INTEGER NOT NULL DEFAULT 1
+            )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_announcements_type ON announcements (type, active, date DESC, id DESC)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_announcements_priority ON announcements (priority, active, date DESC, id DESC)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_announcements_department ON announcements (department, active, date DESC, id DESC)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_announcements_date ON announcements (active, date DESC, id DESC)")
+
+        if conn.execute("PRAGMA user_version").fetchone()[0] == 0:
+            empty = conn.execute("SELECT 1 FROM announcements LIMIT 1").fetchone() is None
+            if empty and os.path.exists(ANNOUNCEMENTS_FILE):
+                try:
+                    with conn:  # All or nothing
+                        with open(ANNOUNCEMENTS_FILE, 'r', encoding='utf-8') as f:
+                            legacy = json.load(f)
+                        _insert_announcements(conn, legacy, keep_ids=True)
+                except (OSError, ValueError, KeyError, TypeError, sqlite3.IntegrityError):
+                    pass  # Unreadable, malformed or duplicate-id legacy file - start empty
+            conn.execute("PRAGMA user_version = 1")
+    return True
+
+def _insert_announcements(conn, announcements, keep_ids=False):
+    """Insert announcement dicts (caller commits)"""
+    columns = (["id"] if keep_ids else []) + ANNOUNCEMENT_FIELDS
+    conn.executemany(
+        f"INSERT INTO announcements ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})",
+        [tuple([a.get("id")] if keep_ids else []) +
+         (a["title"], a["content"], a["type"], a["priority"], a["department"], a.get("author"),
+          str(a.get("date") or date.today().isoformat()), int(bool(a.get("active", True))))
+         for a in announcements]
+    )
+
+def _clear_announcement_caches():
+    get_filter_options.clear()
+    get_announcement_stats.clear()
+
+def add_announcement(announcement):
+    """Insert one announcement. Returns True if saved."""
+    try:
+        with closing(_connect()) as conn, conn:
+            _insert_announcements(conn, [announcement])
+        _clear_announcement_caches()
+        return True
+    except sqlite3.Error:
+        return False
+
+def delete_announcement(announcement_id):
+    """Delete one announcement by id. Returns True if deleted."""
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute("DELETE FROM announcements WHERE id = ?", (announcement_id,))
+        _clear_announcement_caches()
+        return True
+    except sqlite3.Error:
+        return False
+
+def replace_announcements(announcements):
+    """Replace every announcement (sample data). Returns True if saved."""
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute("DELETE FROM announcements")
+            _insert_announcements(conn, announcements, keep_ids=True)
+        _clear_announcement_caches()
+        return True
+    except sqlite3.Error:
+        return False
+
+@st.cache_data(show_spinner=False)
+def get_filter_options():
+    """Distinct types, priorities and departments for the filter selectboxes"""
+    with closing(_connect()) as conn:
+        return {
+            column: [row[0] for row in conn.execute(f"SELECT DISTINCT {column} FROM announcements ORDER BY {column}")]
+            for column in ["type", "priority", "department"]
+        }
+
+@st.cache_data(show_spinner=False)
+def get_announcement_stats(week_start):
+    """Total, active, critical and recent counts (one aggregate query)"""
+    with closing(_connect()) as conn:
+        row = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(active), 0),
+               COALESCE(SUM(priority = 'Crítica'), 0), COALESCE(SUM(date >= ?), 0)
+        FROM announcements
+        """, (week_start,)).fetchone()
+    return {"total": row[0], "active": row[1], "critical": row[2], "recent": row[3]}
+
+def _filter_clause(filters):
+    """WHERE clause and params for active announcements matching the filters (None = any)"""
+    conditions = ["active = 1"]
+    params = []
+    for column, value in filters.items():
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    return " AND ".join(conditions), params
+
+def count_announcements(filters):
+    """Number of active announcements matching the filters"""
+    where, params = _filter_clause(filters)
+    with closing(_connect()) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM announcements WHERE {where}", params).fetchone()[0]
+
+def query_announcements(filters, page=1, per_page=ANNOUNCEMENTS_PER_PAGE):
+    """
+    One page of active announcements matching the filters (newest first)
+    Returns list of dicts
+    """
+    where, params = _filter_clause(filters)
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            f"SELECT * FROM announcements WHERE {where} ORDER BY date DESC, id DESC LIMIT ? OFFSET ?",
+            params + [per_page, (page - 1) * per_page]
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def create_sample_announcements():
+    """Create sample announcements"""
+    return [
+        {
+            "id": 1,
+            "title": "🎉 Nova Política de Home Office",
+            "content": "A partir de segunda-feira, implementaremos nossa nova política de trabalho híbrido.",
+            "type": "Política",
+            "priority": "Alta",
+            "department": "Todos",
+            "author": "Recursos Humanos",
+            "date": "2024-01-15",
+            "active": True
+        },
+        {
+            "id": 2,
+            "title": "📈 Resultados Q4 2023",
+            "content": "Excelentes resultados no último trimestre! Aumentamos nossa receita em 15%.",
+            "type": "Resultado",
+            "priority": "Média",
+            "department": "Todos",
+            "author": "Diretoria",
+            "date": "2024-01-10",
+            "active": True
+        }
+    ]
+
 def show_announcements():
     """Simplified announcements page"""
     st.title("📢 DASHBOARD DE ANÚNCIOS")
     st.markdown("### 🏢 Central de Comunicação Corporativa")
     
-    # Data file path
-    ANNOUNCEMENTS_FILE = "announcements.json"
-
-    def load_announcements():
-        """Load announcements from JSON file"""
-        if os.path.exists(ANNOUNCEMENTS_FILE):
-            try:
-                with open(ANNOUNCEMENTS_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return []
-        return []
-
-    def save_announcements(announcements):
-        """Save announcements to JSON file"""
-        try:
-            with open(ANNOUNCEMENTS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(announcements, f, ensure_ascii=False, indent=2, default=str)
-            return True
-        except:
-            return False
-
-    def create_sample_announcements():
-        """Create sample announcements"""
-        return [
-            {
-                "id": 1,
-                "title": "🎉 Nova Política de Home Office",
-                "content": "A partir de segunda-feira, implementaremos nossa nova política de trabalho híbrido.",
-                "type": "Política",
-                "priority": "Alta",
-                "department": "Todos",
-                "author": "Recursos Humanos",
-                "date": "2024-01-15",
-                "active": True
-            },
-            {
-                "id": 2,
-                "title": "📈 Resultados Q4 2023",
-                "content": "Excelentes resultados no último trimestre! Aumentamos nossa receita em 15%.",
-                "type": "Resultado",
-                "priority": "Média",
-                "department": "Todos",
-                "author": "Diretoria",
-                "date": "2024-01-10",
-                "active": True
-            }
-        ]
-
+    init_announcements_db()
+    
     # Get current user
     try:
         import auth
@@ -66,8 +197,8 @@ def show_announcements():
         current_user = {"name": "User"}
         is_admin = True  # Default to admin for demo
     
-    # Load announcements
-    announcements = load_announcements()
+    # Aggregates only - announcements themselves are read one page at a time
+    stats = get_announcement_stats((date.today() - timedelta(days=7)).isoformat())
     
     # Sidebar controls
     st.sidebar.header("🎛️ Controles")
@@ -78,10 +209,8 @@ def show_announcements():
         
         # Sample data button
         if st.sidebar.button("📊 Carregar Dados de Exemplo"):
-            sample_announcements = create_sample_announcements()
-            if save_announcements(sample_announcements):
+            if replace_announcements(create_sample_announcements()):
                 st.success("✅ Dados de exemplo carregados!")
-                announcements = sample_announcements
                 st.rerun()
         
         # Create new announcement
@@ -104,9 +233,7 @@ def show_announcements():
                 
                 if st.form_submit_button("📝 Criar Anúncio"):
                     if title and content:
-                        new_id = max([a.get('id', 0) for a in announcements] + [0]) + 1
                         new_announcement = {
-                            "id": new_id,
                             "title": f"📢 {title}",
                             "content": content,
                             "type": announcement_type,
@@ -116,9 +243,7 @@ def show_announcements():
                             "date": date.today().isoformat(),
                             "active": True
                         }
-                        announcements.append(new_announcement)
-                        
-                        if save_announcements(announcements):
+                        if add_announcement(new_announcement):
                             st.success("✅ Anúncio criado com sucesso!")
                             st.rerun()
                         else:
@@ -127,26 +252,34 @@ def show_announcements():
                         st.error("⚠️ Preencha todos os campos obrigatórios")
     
     # Display announcements
-    if announcements:
+    if stats["total"]:
         st.subheader("📋 Anúncios Ativos")
         
-        # Filter controls
+        # Filter controls (options cached until the next create/delete)
+        options = get_filter_options()
         col1, col2, col3 = st.columns(3)
         with col1:
-            filter_type = st.selectbox("Filtrar por tipo:", ["Todos"] + list(set(a['type'] for a in announcements)))
+            filter_type = st.selectbox("Filtrar por tipo:", ["Todos"] + options["type"])
         with col2:
-            filter_priority = st.selectbox("Filtrar por prioridade:", ["Todas"] + list(set(a['priority'] for a in announcements)))
+            filter_priority = st.selectbox("Filtrar por prioridade:", ["Todas"] + options["priority"])
         with col3:
-            filter_dept = st.selectbox("Filtrar por departamento:", ["Todos"] + list(set(a['department'] for a in announcements)))
+            filter_dept = st.selectbox("Filtrar por departamento:", ["Todos"] + options["department"])
         
-        # Apply filters
-        filtered_announcements = announcements
-        if filter_type != "Todos":
-            filtered_announcements = [a for a in filtered_announcements if a['type'] == filter_type]
-        if filter_priority != "Todas":
-            filtered_announcements = [a for a in filtered_announcements if a['priority'] == filter_priority]
-        if filter_dept != "Todos":
-            filtered_announcements = [a for a in filtered_announcements if a['department'] == filter_dept]
+        # Filters run in SQLite (indexed) - only the current page is fetched
+        filters = {
+            "type": None if filter_type == "Todos" else filter_type,
+            "priority": None if filter_priority == "Todas" else filter_priority,
+            "department": None if filter_dept == "Todos" else filter_dept
+        }
+        total_filtered = count_announcements(filters)
+        total_pages = max(1, -(-total_filtered // ANNOUNCEMENTS_PER_PAGE))
+        if st.session_state.get("anuncios_pagina", 1) > total_pages:
+            st.session_state.anuncios_pagina = 1  # Filter shrank the result
+        page = 1
+        if total_pages > 1:
+            page = st.number_input(f"📑 Página (de {total_pages})", min_value=1, max_value=total_pages,
+                                   step=1, key="anuncios_pagina")
+        filtered_announcements = query_announcements(filters, page)
         
         # Display filtered announcements
         for announcement in filtered_announcements:
@@ -178,35 +311,34 @@ def show_announcements():
                     # Admin delete button
                     if is_admin:
                         if st.button(f"🗑️ Deletar", key=f"delete_{announcement['id']}"):
-                            announcements = [a for a in announcements if a['id'] != announcement['id']]
-                            save_announcements(announcements)
+                            delete_announcement(announcement['id'])
                             st.rerun()
                     
                     st.divider()
         
         if not filtered_announcements:
             st.info("💡 Nenhum anúncio corresponde aos filtros selecionados")
+        elif total_pages > 1:
+            st.caption(f"Anúncios {(page - 1) * ANNOUNCEMENTS_PER_PAGE + 1}-"
+                       f"{(page - 1) * ANNOUNCEMENTS_PER_PAGE + len(filtered_announcements)} de {total_filtered}")
     else:
         st.info("💡 Nenhum anúncio encontrado")
         if is_admin:
             st.info("👉 Use 'Carregar Dados de Exemplo' ou crie um novo anúncio")
     
     # Statistics
-    if announcements:
+    if stats["total"]:
         st.subheader("📊 Estatísticas")
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("📢 Total", len(announcements))
+            st.metric("📢 Total", stats["total"])
         with col2:
-            active_count = len([a for a in announcements if a.get('active', True)])
-            st.metric("✅ Ativos", active_count)
+            st.metric("✅ Ativos", stats["active"])
         with col3:
-            critical_count = len([a for a in announcements if a.get('priority') == 'Crítica'])
-            st.metric("🔴 Críticos", critical_count)
+            st.metric("🔴 Críticos", stats["critical"])
         with col4:
-            recent_count = len([a for a in announcements if a.get('date', '') >= (date.today() - timedelta(days=7)).isoformat()])
-            st.metric("🆕 Esta semana", recent_count)
+            st.metric("🆕 Esta semana", stats["recent"])
     
     # Help section
     with st.expander("💡 Como usar"):
@@ -0,0 +1,144 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+
+# Display names of the group companies
+EMPRESAS_GRUPO = {
+    "MINIPA": "MINIPA",
+    "MINIPA_INDUSTRIA": "MINIPA INDUSTRIA"
+}
+
+def resumir_empresa(analytics, analises):
+    """Stock, coverage and purchase-need figures of one company"""
+    from pages.analytics import calculate_purchase_suggestions
+
+    resumo = {'Produtos': 0, 'Estoque Total': 0.0, 'Cobertura Mediana (meses)': np.nan,
+              'Críticos (≤1 mês)': 0, 'Qtd a Comprar (6M)': 0.0, 'Investimento Timeline (R$)': np.nan}
+
+    if analytics is not None and len(analytics) > 0:
+        estoque = pd.to_numeric(analytics['Estoque'], errors='coerce').fillna(0)
+        consumo = pd.to_numeric(analytics['Média 6 Meses'], errors='coerce').fillna(0)
+        existentes = analytics[(estoque > 0) | (consumo > 0)]
+        sugestoes = calculate_purchase_suggestions(existentes)
+        cobertura = sugestoes['Meses_Restantes'][sugestoes['Meses_Restantes'] < 999]
+
+        resumo.update({
+            'Produtos': len(analytics),
+            'Estoque Total': float(estoque.sum()),
+            'Cobertura Mediana (meses)': float(cobertura.median()) if len(cobertura) else np.nan,
+            'Críticos (≤1 mês)': int((cobertura <= 1).sum()),
+            'Qtd a Comprar (6M)': float(pd.to_numeric(sugestoes['Qtd_Comprar'], errors='coerce').sum())
+        })
+
+    if analises is not None and len(analises) > 0:
+        resumo['Investimento Timeline (R$)'] = float(pd.to_numeric(analises['Valor_Pedido'], errors='coerce').sum())
+
+    return resumo
+
+def consolidar_produtos(dados):
+    """
+    Group-level view per product: stock and consumption summed across companies
+    Returns DataFrame sorted by group coverage (most urgent first)
+    """
+    frames = []
+    for empresa, datasets in dados.items():
+        analytics = datasets.get("ANALYTICS")
+        if analytics is None or len(analytics) == 0:
+            continue
+        frames.append(pd.DataFrame({
+            'Produto': analytics['Produto'].astype(str).to_numpy(),
+            'Empresa': EMPRESAS_GRUPO.get(empresa, empresa),
+            'Estoque': pd.to_numeric(analytics['Estoque'], errors='coerce').fillna(0).to_numpy(dtype=float),
+            'Consumo Mensal': pd.to_numeric(analytics['Média 6 Meses'], errors='coerce').fillna(0).to_numpy(dtype=float)
+        }))
+
+    if not frames:
+        return None
+
+    produtos = pd.concat(frames, ignore_index=True)
+    estoque_empresa = produtos.pivot_table(index='Produto', columns='Empresa', values='Estoque',
+                                           aggfunc='sum', fill_value=0)
+    estoque_empresa.columns = [f"Estoque {empresa}" for empresa in estoque_empresa.columns]
+
+    grupo = produtos.groupby('Produto').agg(
+        Empresas=('Empresa', 'nunique'),
+        Estoque_Grupo=('Estoque', 'sum'),
+        Consumo_Grupo=('Consumo Mensal', 'sum')
+    )
+    grupo['Cobertura Grupo (meses)'] = np.divide(
+        grupo['Estoque_Grupo'].to_numpy(), grupo['Consumo_Grupo'].to_numpy(),
+        out=np.full(len(grupo), 999.0), where=grupo['Consumo_Grupo'].to_numpy() > 0
+    )
+    grupo['Falta p/ 6 Meses'] = np.maximum(grupo['Consumo_Grupo'] * 6 - grupo['Estoque_Grupo'], 0)
+
+    consolidado = grupo.join(estoque_empresa).rename(columns={
+        'Estoque_Grupo': 'Estoque Grupo', 'Consumo_Grupo': 'Consumo Mensal Grupo'
+    })
+    return consolidado.sort_values('Cobertura Grupo (meses)').reset_index()
+
+def show_consolidated():
+    """Consolidated MINIPA + MINIPA INDUSTRIA view (companies loaded concurrently)"""
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.title("🏢 VISÃO CONSOLIDADA DO GRUPO")
+        st.markdown("### 📊 Estoque, cobertura e necessidade de compra - MINIPA + MINIPA INDUSTRIA")
+
+    with col2:
+        if st.button("🔄 Forçar Atualização", use_container_width=True, key="consolidado_atualizar"):
+            from bd.snowflake_config import load_analytics_data, load_timeline_analyses
+            load_analytics_data.clear()
+            load_timeline_analyses.clear()
+            st.rerun()
+
+    try:
+        from bd.snowflake_config import load_company_group
+    except ImportError:
+        st.warning("⚠️ Snowflake não configurado. A visão consolidada usa os dados salvos na nuvem.")
+        return
+
+    dados, tempo = load_company_group(("ANALYTICS", "ANALISES"))
+    st.caption(f"⚡ {len(dados)} empresas carregadas em paralelo em {tempo:.2f}s")
+
+    resumos = {EMPRESAS_GRUPO.get(empresa, empresa): resumir_empresa(datasets["ANALYTICS"], datasets["ANALISES"])
+               for empresa, datasets in dados.items()}
+    if not any(resumo['Produtos'] for resumo in resumos.values()):
+        st.info("💡 Nenhum dado de análise encontrado para as empresas do grupo.")
+        st.markdown("👉 **Vá para 'Upload de Dados' para enviar dados primeiro.**")
+        return
+
+    # Group totals
+    st.subheader("📊 Totais do Grupo")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("📦 Produtos", f"{sum(r['Produtos'] for r in resumos.values()):,}")
+    col2.metric("🏭 Estoque Total", f"{sum(r['Estoque Total'] for r in resumos.values()):,.0f}")
+    col3.metric("🔴 Críticos", sum(r['Críticos (≤1 mês)'] for r in resumos.values()))
+    investimento = [r['Investimento Timeline (R$)'] for r in resumos.values() if not np.isnan(r['Investimento Timeline (R$)'])]
+    col4.metric("💰 Investimento Timeline", f"R$ {sum(investimento):,.0f}" if investimento else "N/A")
+
+    # Per company
+    st.subheader("🏢 Por Empresa")
+    st.dataframe(pd.DataFrame(resumos).T.round(1), use_container_width=True)
+
+    # Per product across the group
+    st.subheader("🔗 Produtos Consolidados")
+    consolidado = consolidar_produtos(dados)
+    if consolidado is None:
+        st.info("Nenhum produto disponível para consolidar")
+        return
+
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        apenas_ambas = st.checkbox("Somente produtos presentes nas duas empresas", key="consolidado_ambas")
+    with col2:
+        cobertura_max = st.selectbox("📊 Cobertura do grupo até:", [1, 3, 6, 999], index=1,
+                                     format_func=lambda m: "Todos" if m == 999 else f"{m} meses",
+                                     key="consolidado_cobertura")
+
+    filtrado = consolidado[consolidado['Cobertura Grupo (meses)'] <= cobertura_max]
+    if apenas_ambas:
+        filtrado = filtrado[filtrado['Empresas'] > 1]
+
+    st.info(f"📊 {len(filtrado)} de {len(consolidado)} produtos")
+    st.dataframe(filtrado.head(1000).round(1), use_container_width=True, hide_index=True)
+    if len(filtrado) > 1000:
+        st.caption("Exibindo os 1000 produtos mais urgentes")
@@ -113,7 +113,7 @@ def load_page():
     # Cache management
     st.subheader("🔄 Cache")
     
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     
     with col1:
         if st.button("🧹 Limpar Cache Analytics", use_container_width=True):
@@ -130,6 +130,13 @@ def load_page():
             st.cache_data.clear()
             st.success("✅ Todo cache limpo!")
     
+    with col3:
+        if st.button("📈 Reconstruir Histórico", use_container_width=True):
+            from bd.snowflake_config import backfill_product_history
+            recorded = backfill_product_history()
+            if recorded is not None:
+                st.success(f"✅ Histórico atualizado: {recorded} versões registradas")
+    
     # Help
     with st.expander("💡 Como usar"):
         st.markdown("""
@@ -3,69 +3,30 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from datetime import datetime, timedelta
+from bd.timeline_calc import calcular_timeline, timeline_de_analises
 
 def detect_excel_headers(uploaded_file):
     """Smart detection of Excel headers for different file formats"""
+    from bd.excel_headers import detect_excel_table, read_sheet
+    
     try:
-        # Read the Excel file to understand structure
-        xl_file = pd.ExcelFile(uploaded_file)
-        sheets = xl_file.sheet_names
-        
-        # Try different sheets and header positions
-        best_sheet = None
-        best_header_row = 9  # Default for MINIPA
-        best_df = None
-        best_score = 0
-        
-        # Try different starting rows to find headers
-        for sheet in sheets[:3]:  # Check first 3 sheets
-            for header_row in [0, 8, 9, 10, 7, 6, 11, 12]:
-                try:
-                    df_sample = pd.read_excel(uploaded_file, sheet_name=sheet, header=header_row, nrows=20)
-                    
-                    # Check if we found real headers (not None or Unnamed)
-                    valid_columns = 0
-                    real_headers = []
-                    
-                    for col in df_sample.columns:
-                        col_str = str(col).strip()
-                        if (col_str != 'None' and 
-                            not col_str.startswith('Unnamed') and 
-                            col_str != 'nan' and
-                            len(col_str) > 0):
-                            valid_columns += 1
-                            real_headers.append(col_str)
-                    
-                    # Score this attempt (prioritize files with expected timeline columns)
-                    expected_cols = ['Item', 'Modelo', 'Fornecedor', 'QTD', 'MOQ', 'Estoque']
-                    timeline_score = sum(1 for expected in expected_cols if any(expected.lower() in col.lower() for col in real_headers))
-                    data_rows = len(df_sample.dropna(how='all'))
-                    score = valid_columns * data_rows + timeline_score * 10
-                    
-                    if score > best_score and valid_columns >= 3 and data_rows >= 3:
-                        best_score = score
-                        best_sheet = sheet
-                        best_header_row = header_row
-                        best_df = df_sample
-                        
-                except Exception as e:
-                    continue
+        # Parse each sheet once and score every header position in memory
+        # (prioritize files with expected timeline columns)
+        expected_cols = ['Item', 'Modelo', 'Fornecedor', 'QTD', 'MOQ', 'Estoque']
+        detection = detect_excel_table(uploaded_file, max_sheets=3, expected_columns=expected_cols)
         
-        if best_df is not None:
-            # Load the full dataset
-            df_full = pd.read_excel(uploaded_file, sheet_name=best_sheet, header=best_header_row)
-            df_full = df_full.dropna(how='all')  # Remove completely empty rows
-            st.info(f"🔍 Header detectado: planilha '{best_sheet}', linha {best_header_row + 1}")
-            return df_full
+        if detection['df'] is not None:
+            st.info(f"🔍 Header detectado: planilha '{detection['sheet']}', linha {detection['header_row'] + 1}")
+            return detection['df']
         else:
             st.warning("⚠️ Usando detecção padrão: linha 10")
-            return pd.read_excel(uploaded_file, header=9)
+            return read_sheet(uploaded_file, header_row=9, max_sheets=3)
                         
     except Exception as e:
         st.error(f"❌ Erro na detecção: {str(e)}")
         # Fallback to default
-        return pd.read_excel(uploaded_file, header=9)
+        from bd.excel_reader import read_excel_fast
+        return read_excel_fast(uploaded_file, header=9)
 
 @st.cache_data
 def carregar_dados(uploaded_file=None):
@@ -116,116 +77,30 @@ def criar_dados_exemplo():
     }
     return pd.DataFrame(dados_exemplo)
 
-def otimizar_quantidade_moq(vendas_mensais, moq, meta_meses=6):
-    """Optimize quantity based on MOQ"""
-    if vendas_mensais <= 0:
-        return moq if moq > 0 else 0
-    
-    qtd_ideal = vendas_mensais * meta_meses
-    
-    if moq > qtd_ideal:
-        return moq
-    
-    if moq <= 0:
-        return int(qtd_ideal)
-    
-    multiplos = max(1, int(np.ceil(qtd_ideal / moq)))
-    return multiplos * moq
+# Chart limits - products per page and maximum figure height (px)
+GRAFICO_MAX_PRODUTOS = 50
+GRAFICO_ALTURA_MAX = 2400
 
-def calcular_timeline(df, meta_meses=6):
-    """Calculate timeline data for products"""
-    hoje = datetime.now()
-    timeline_data = []
-    
-    # Check if we have any data
-    if df.empty:
-        st.warning("⚠️ DataFrame vazio - nenhum dado para calcular timeline")
-        return []
-    
-    for idx, row in df.iterrows():
-        # Safely access columns with fallbacks - handle NaN values properly
-        produto = str(row.get('Modelo', f'Produto_{idx}')) if pd.notna(row.get('Modelo')) else f'Produto_{idx}'
-        fornecedor = str(row.get('Fornecedor', 'Fornecedor Desconhecido')) if pd.notna(row.get('Fornecedor')) else 'Fornecedor Desconhecido'
-        
-        # Handle numeric columns properly - convert NaN to 0
-        estoque_atual = (pd.to_numeric(row.get('Estoque_Total', 0), errors='coerce') or 0) + (pd.to_numeric(row.get('In_Transit', 0), errors='coerce') or 0)
-        vendas_mensais = pd.to_numeric(row.get('Vendas_Medias', 0), errors='coerce') or 0
-        moq = pd.to_numeric(row.get('MOQ', 0), errors='coerce') or 0
-        preco = pd.to_numeric(row.get('Preco_Unitario', 0), errors='coerce') or 0
-        cbm = pd.to_numeric(row.get('CBM', 0), errors='coerce') or 0
-        
+def filtrar_timeline(timeline_data, filtro_urgencia="Todos"):
+    """Rows of the timeline matching the urgency filter"""
+    if filtro_urgencia != "Todos":
+        return timeline_data[timeline_data['Urgencia'] == filtro_urgencia]
+    return timeline_data
 
-        
-        # Process all products with proper data - exactly like MINIPA
-        if vendas_mensais > 0:
-            meses_ate_zerar = estoque_atual / vendas_mensais
-            data_esgotamento = hoje + timedelta(days=int(meses_ate_zerar * 30))
-            data_pedido = data_esgotamento - timedelta(days=45)
-            if data_pedido < hoje:
-                data_pedido = hoje
-            
-            qtd_otimizada = otimizar_quantidade_moq(vendas_mensais, moq, meta_meses)
-            valor_pedido = qtd_otimizada * preco
-            cbm_pedido = qtd_otimizada * cbm
-            
-            if meses_ate_zerar <= 1:
-                cor = '#FF0000'
-                urgencia = 'CRÍTICO'
-            elif meses_ate_zerar <= 3:
-                cor = '#FF8C00'
-                urgencia = 'MÉDIO'
-            elif meses_ate_zerar <= 6:
-                cor = '#FFD700'
-                urgencia = 'ATENÇÃO'
-            else:
-                cor = '#32CD32'
-                urgencia = 'OK'
-            
-            timeline_data.append({
-                'Produto': produto,
-                'Fornecedor': fornecedor,
-                'Dias_Restantes': int(meses_ate_zerar * 30),
-                'Estoque_Atual': estoque_atual,
-                'Vendas_Mensais': vendas_mensais,
-                'MOQ': moq,
-                'Qtd_Otimizada': qtd_otimizada,
-                'Valor_Pedido': valor_pedido,
-                'CBM_Pedido': cbm_pedido,
-                'Cor': cor,
-                'Urgencia': urgencia
-            })
-        elif (estoque_atual > 0 or moq > 0) and produto != 'nan':
-            # Products without sales but with stock/MOQ data - show as monitoring
-            qtd_otimizada = max(moq, 50) if moq > 0 else 50
-            valor_pedido = qtd_otimizada * preco
-            cbm_pedido = qtd_otimizada * cbm
-            
-            cor = '#87CEEB'  # Light blue
-            urgencia = 'MONITORAR'
-            dias_restantes = 999
-            
-            timeline_data.append({
-                'Produto': produto,
-                'Fornecedor': fornecedor,
-                'Dias_Restantes': dias_restantes,
-                'Estoque_Atual': estoque_atual,
-                'Vendas_Mensais': vendas_mensais,
-                'MOQ': moq,
-                'Qtd_Otimizada': qtd_otimizada,
-                'Valor_Pedido': valor_pedido,
-                'CBM_Pedido': cbm_pedido,
-                'Cor': cor,
-                'Urgencia': urgencia
-            })
+def criar_grafico_interativo(timeline_data, filtro_urgencia="Todos", max_produtos=GRAFICO_MAX_PRODUTOS, pagina=0):
+    """
+    Create interactive timeline charts - one bar trace per subplot
+    Colors and hover details come from per-bar arrays (marker color + customdata),
+    so payload grows with the page size, not with the catalog size
+    Shows page `pagina` of `max_produtos` products (None = all)
+    """
+    timeline_data = filtrar_timeline(timeline_data, filtro_urgencia)
     
-    return sorted(timeline_data, key=lambda x: x['Dias_Restantes'])
-
-def criar_grafico_interativo(timeline_data, filtro_urgencia="Todos"):
-    """Create interactive timeline charts"""
-    if filtro_urgencia != "Todos":
-        timeline_data = [item for item in timeline_data if item['Urgencia'] == filtro_urgencia]
+    if max_produtos:
+        inicio = pagina * max_produtos
+        timeline_data = timeline_data.iloc[inicio:inicio + max_produtos]
     
-    if not timeline_data:
+    if timeline_data.empty:
         return None
     
     fig = make_subplots(
@@ -234,66 +109,123 @@ def criar_grafico_interativo(timeline_data, filtro_urgencia="Todos"):
         vertical_spacing=0.15
     )
     
-    produtos = [item['Produto'] for item in timeline_data]
+    posicoes = np.arange(len(timeline_data))
+    produtos = timeline_data['Produto'].tolist()
+    customdata = np.column_stack([
+        timeline_data['Produto'].to_numpy(dtype=object),
+        timeline_data['Fornecedor'].to_numpy(dtype=object),
+        timeline_data['Estoque_Atual'].to_numpy(dtype=float),
+        timeline_data['Dias_Restantes'].to_numpy(dtype=float),
+        timeline_data['MOQ'].to_numpy(dtype=float),
+        timeline_data['Qtd_Otimizada'].to_numpy(dtype=float),
+        timeline_data['Valor_Pedido'].to_numpy(dtype=float),
+        timeline_data['CBM_Pedido'].to_numpy(dtype=float)
+    ])
+    cores = timeline_data['Cor'].tolist()
     
     # Chart 1: Timeline
-    for i, item in enumerate(timeline_data):
-        fig.add_trace(
-            go.Bar(
-                y=[i],
-                x=[item['Dias_Restantes']],
-                orientation='h',
-                marker_color=item['Cor'],
-                opacity=0.7,
-                showlegend=False,
-                hovertemplate=(
-                    f"<b>{item['Produto']}</b><br>" +
-                    f"Fornecedor: {item['Fornecedor']}<br>" +
-                    f"Estoque: {item['Estoque_Atual']:.0f} un.<br>" +
-                    f"Dias restantes: {item['Dias_Restantes']}<br>" +
-                    f"MOQ: {item['MOQ']:.0f}<br>" +
-                    f"Comprar: {item['Qtd_Otimizada']:.0f}<br>" +
-                    "<extra></extra>"
-                )
-            ),
-            row=1, col=1
-        )
+    fig.add_trace(
+        go.Bar(
+            y=posicoes,
+            x=timeline_data['Dias_Restantes'],
+            orientation='h',
+            marker_color=cores,
+            opacity=0.7,
+            showlegend=False,
+            customdata=customdata,
+            hovertemplate=(
+                "<b>%{customdata[0]}</b><br>" +
+                "Fornecedor: %{customdata[1]}<br>" +
+                "Estoque: %{customdata[2]:.0f} un.<br>" +
+                "Dias restantes: %{customdata[3]:.0f}<br>" +
+                "MOQ: %{customdata[4]:.0f}<br>" +
+                "Comprar: %{customdata[5]:.0f}<br>" +
+                "<extra></extra>"
+            )
+        ),
+        row=1, col=1
+    )
     
     # Chart 2: Quantities
-    for i, item in enumerate(timeline_data):
-        fig.add_trace(
-            go.Bar(
-                y=[i],
-                x=[item['Qtd_Otimizada']],
-                orientation='h',
-                marker_color=item['Cor'],
-                opacity=0.7,
-                showlegend=False,
-                hovertemplate=(
-                    f"<b>{item['Produto']}</b><br>" +
-                    f"Quantidade: {item['Qtd_Otimizada']:.0f} un.<br>" +
-                    f"MOQ: {item['MOQ']:.0f}<br>" +
-                    f"Valor: R$ {item['Valor_Pedido']:,.0f}<br>" +
-                    f"CBM: {item['CBM_Pedido']:.1f}<br>" +
-                    "<extra></extra>"
-                )
-            ),
-            row=2, col=1
-        )
+    fig.add_trace(
+        go.Bar(
+            y=posicoes,
+            x=timeline_data['Qtd_Otimizada'],
+            orientation='h',
+            marker_color=cores,
+            opacity=0.7,
+            showlegend=False,
+            customdata=customdata,
+            hovertemplate=(
+                "<b>%{customdata[0]}</b><br>" +
+                "Quantidade: %{customdata[5]:.0f} un.<br>" +
+                "MOQ: %{customdata[4]:.0f}<br>" +
+                "Valor: R$ %{customdata[6]:,.0f}<br>" +
+                "CBM: %{customdata[7]:.1f}<br>" +
+                "<extra></extra>"
+            )
+        ),
+        row=2, col=1
+    )
     
     fig.update_layout(
         title="📅 TIMELINE INTERATIVA COM MOQ",
-        height=max(800, len(timeline_data) * 40),
+        height=min(max(800, len(timeline_data) * 40), GRAFICO_ALTURA_MAX),
         showlegend=False
     )
     
-    fig.update_yaxes(tickvals=list(range(len(produtos))), ticktext=produtos, row=1, col=1)
-    fig.update_yaxes(tickvals=list(range(len(produtos))), ticktext=produtos, row=2, col=1)
+    fig.update_yaxes(tickvals=posicoes, ticktext=produtos, row=1, col=1)
+    fig.update_yaxes(tickvals=posicoes, ticktext=produtos, row=2, col=1)
     fig.update_xaxes(title_text="Dias", row=1, col=1)
     fig.update_xaxes(title_text="Quantidade", row=2, col=1)
     
     return fig
 
+def mostrar_comparacao_versoes(empresa, versions):
+    """Produtos novos, removidos e alterados entre duas versões da Timeline"""
+    from bd.snowflake_config import diff_versions
+    
+    with st.expander("🔀 Comparar versões"):
+        rotulos = {v['version_id']: f"v{v['version_id']} - {v.get('description') or v['upload_date']}" for v in versions}
+        ids = list(rotulos)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            versao_de = st.selectbox("De:", ids, index=1, format_func=rotulos.get, key="timeline_diff_de")
+        with col2:
+            versao_para = st.selectbox("Para:", ids, index=0, format_func=rotulos.get, key="timeline_diff_para")
+        
+        if versao_de == versao_para:
+            st.info("💡 Selecione duas versões diferentes")
+            return
+        if not st.checkbox("Mostrar diferenças", key="timeline_diff_mostrar"):
+            return
+        
+        diff = diff_versions(empresa, "TIMELINE", versao_de, versao_para)
+        if diff is None:
+            st.warning("⚠️ Não foi possível carregar as duas versões")
+            return
+        
+        resumo = diff['summary']
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("🆕 Novos", resumo['added'])
+        col2.metric("🗑️ Removidos", resumo['removed'])
+        col3.metric("✏️ Alterados", resumo['changed'])
+        col4.metric("✅ Sem alteração", resumo['unchanged'])
+        
+        st.dataframe(pd.DataFrame([
+            {'Coluna': coluna, 'Produtos alterados': info['changed'], 'Variação total': info['delta_total']}
+            for coluna, info in resumo['per_column'].items()
+        ]), use_container_width=True, hide_index=True)
+        
+        for titulo, chave in [("✏️ Alterados", 'changed'), ("🆕 Novos", 'added'), ("🗑️ Removidos", 'removed')]:
+            tabela = diff[chave]
+            if len(tabela) > 0:
+                st.write(f"**{titulo}** ({len(tabela)})")
+                st.dataframe(tabela.head(1000), use_container_width=True, hide_index=True)
+                if len(tabela) > 1000:
+                    st.caption("Exibindo os primeiros 1000 produtos")
+
 def load_page():
     # Header with company selector
     col1, col2, col3 = st.columns([2, 1, 1])
@@ -316,7 +248,7 @@ def load_page():
     
     with col3:
         if st.button("🔄 Forçar Atualização", 
-                    help="Atualizar dados do Snowflake (normalmente cache por 30 dias)",
+                    help="Atualizar dados do Snowflake (novas versões aparecem automaticamente)",
                     use_container_width=True):
             from bd.snowflake_config import load_data_with_history
             load_data_with_history.clear()  # Clear specific function cache only
@@ -324,6 +256,7 @@ def load_page():
             st.rerun()
 
     # Try to load data from Snowflake first
+    dados_snowflake = False
     try:
         from bd.snowflake_config import load_data_with_history, get_upload_versions
         
@@ -369,6 +302,9 @@ def load_page():
                 st.metric("📊 Versões Disponíveis", len(versions))
                 active_versions = len([v for v in versions if v['is_active']])
                 st.metric("🟢 Versão Ativa", f"{active_versions}/1")
+            
+            if len(versions) > 1:
+                mostrar_comparacao_versoes(empresa_code, versions)
         else:
             selected_version_id = None
             st.info(f"💡 Nenhuma versão encontrada para {empresa_selecionada}")
@@ -377,6 +313,7 @@ def load_page():
         df = load_data_with_history(empresa=empresa_code, version_id=selected_version_id)
         
         if df is not None and len(df) > 0:
+            dados_snowflake = True
             version_text = f"v{selected_version_id}" if selected_version_id else "ativa"
             st.success(f"✅ {empresa_selecionada} - Versão {version_text}: {len(df)} produtos carregados")
             
@@ -435,20 +372,30 @@ def load_page():
         
         meta_meses = st.sidebar.slider("🎯 Meta (meses)", 3, 12, 6)
         
+        # Snowflake versions: rows precomputed at upload; recompute only when missing
+        timeline_data = None
+        if dados_snowflake:
+            from bd.snowflake_config import load_timeline_analyses
+            analises = load_timeline_analyses(empresa_code, selected_version_id, meta_meses)
+            if analises is not None:
+                timeline_data = timeline_de_analises(analises)
+        
         # Calculate timeline data
-        timeline_data = calcular_timeline(df, meta_meses)
+        if timeline_data is None:
+            timeline_data = calcular_timeline(df, meta_meses)
         
-        if timeline_data:
-            urgencias = ["Todos"] + sorted(list(set(item['Urgencia'] for item in timeline_data)))
+        if not timeline_data.empty:
+            urgencias = ["Todos"] + sorted(timeline_data['Urgencia'].unique())
             filtro = st.sidebar.selectbox("🔍 Filtrar", urgencias)
             
             # Show company-specific metrics
             st.subheader(f"📊 Métricas - {empresa_selecionada}")
             col1, col2, col3, col4 = st.columns(4)
-            criticos = len([x for x in timeline_data if x['Urgencia'] == 'CRÍTICO'])
-            medios = len([x for x in timeline_data if x['Urgencia'] == 'MÉDIO'])
-            atencao = len([x for x in timeline_data if x['Urgencia'] == 'ATENÇÃO'])
-            ok = len([x for x in timeline_data if x['Urgencia'] == 'OK'])
+            contagem = timeline_data['Urgencia'].value_counts()
+            criticos = int(contagem.get('CRÍTICO', 0))
+            medios = int(contagem.get('MÉDIO', 0))
+            atencao = int(contagem.get('ATENÇÃO', 0))
+            ok = int(contagem.get('OK', 0))
             
             col1.metric("🔴 Críticos", criticos)
             col2.metric("🟠 Médios", medios)
@@ -456,15 +403,29 @@ def load_page():
             col4.metric("🟢 OK", ok)
             
             # Show total investment with company context
-            valor_total = sum(item['Valor_Pedido'] for item in timeline_data)
+            valor_total = timeline_data['Valor_Pedido'].sum()
             st.metric(f"💰 Investimento Total - {empresa_selecionada}", f"R$ {valor_total:,.0f}")
             
+            # Large catalogs are charted one page of products at a time (most urgent first)
+            total_filtrado = len(timeline_data) if filtro == 'Todos' else int(contagem.get(filtro, 0))
+            por_pagina = st.sidebar.selectbox("📄 Produtos por página", [25, 50, 100, 200],
+                                              index=1, key="timeline_por_pagina")
+            total_paginas = max(1, -(-total_filtrado // por_pagina))
+            pagina = 0
+            if total_paginas > 1:
+                if st.session_state.get("timeline_pagina", 1) > total_paginas:
+                    st.session_state.timeline_pagina = 1  # Filter shrank the list
+                pagina = st.sidebar.number_input("📑 Página do gráfico", min_value=1, max_value=total_paginas,
+                                                 step=1, key="timeline_pagina") - 1
+            
             # Create and display chart with company title
-            fig = criar_grafico_interativo(timeline_data, filtro)
+            fig = criar_grafico_interativo(timeline_data, filtro, por_pagina, pagina)
             if fig:
                 # Update chart title to include company name
+                inicio = pagina * por_pagina
+                faixa = f"{inicio + 1}-{min(inicio + por_pagina, total_filtrado)} de " if total_paginas > 1 else ""
                 fig.update_layout(
-                    title=f"Timeline de Compras - {empresa_selecionada} ({len([x for x in timeline_data if filtro == 'Todos' or x['Urgencia'] == filtro])} produtos)",
+                    title=f"Timeline de Compras - {empresa_selecionada} ({faixa}{total_filtrado} produtos)",
                     title_x=0.5
                 )
                 st.plotly_chart(fig, use_container_width=True)
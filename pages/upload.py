@@ -5,60 +5,23 @@ from datetime import datetime
 def analyze_and_process_excel(uploaded_file, file_type="Auto-detectar"):
     """Advanced Excel analysis and processing based on actual user table structure"""
     try:
-        # Read the Excel file to understand structure
-        xl_file = pd.ExcelFile(uploaded_file)
-        sheets = xl_file.sheet_names
+        from bd.excel_headers import detect_excel_table, read_sheet
         
-        st.info(f"📋 Planilhas encontradas: {sheets}")
-        
-        # Try different sheets and header positions
-        best_sheet = None
-        best_header_row = 0
-        best_df = None
-        best_score = 0
+        # Parse each sheet once and score every header position in memory
+        detection = detect_excel_table(uploaded_file, max_sheets=5)
+        sheets = detection['sheets']
         
-        # Try different starting rows to find headers - expanded range
-        for sheet in sheets[:5]:  # Check first 5 sheets
-            for header_row in [0, 8, 9, 10, 7, 6, 11, 12]:
-                try:
-                    df_sample = pd.read_excel(uploaded_file, sheet_name=sheet, header=header_row, nrows=20)
-                    
-                    # Check if we found real headers (not None or Unnamed)
-                    valid_columns = 0
-                    real_headers = []
-                    
-                    for col in df_sample.columns:
-                        col_str = str(col).strip()
-                        if (col_str != 'None' and 
-                            not col_str.startswith('Unnamed') and 
-                            col_str != 'nan' and
-                            len(col_str) > 0):
-                            valid_columns += 1
-                            real_headers.append(col_str)
-                    
-                    # Score this attempt
-                    data_rows = len(df_sample.dropna(how='all'))
-                    score = valid_columns * data_rows
-                    
-                    if score > best_score and valid_columns >= 3 and data_rows >= 3:
-                        best_score = score
-                        best_sheet = sheet
-                        best_header_row = header_row
-                        best_df = df_sample
-                        
-                except Exception as e:
-                    continue
+        st.info(f"📋 Planilhas encontradas: {sheets}")
         
-        if best_df is not None:
-            # Load the full dataset
-            df_full = pd.read_excel(uploaded_file, sheet_name=best_sheet, header=best_header_row)
-            df_full = df_full.dropna(how='all')  # Remove completely empty rows
+        if detection['df'] is not None:
+            best_sheet = detection['sheet']
+            best_header_row = detection['header_row']
             
             st.success(f"✅ Detectado automaticamente: planilha '{best_sheet}', linha {best_header_row + 1}")
-            return df_full, best_sheet, best_header_row
+            return detection['df'], best_sheet, best_header_row
         else:
             st.warning("⚠️ Detecção automática falhou. Usando primeira planilha, linha 1.")
-            df_full = pd.read_excel(uploaded_file, sheet_name=sheets[0], header=0)
+            df_full = read_sheet(uploaded_file, sheet_name=sheets[0], header_row=0)
             return df_full, sheets[0], 0
                         
     except Exception as e:
@@ -72,9 +35,10 @@ def show_data_upload():
     
     # Import Snowflake functions
     try:
-        from bd.snowflake_config import (upload_excel_to_snowflake, load_data_with_history, 
-                                        load_analytics_data, test_connection, get_upload_versions, 
-                                        delete_version, fix_active_versions)
+        from bd.snowflake_config import (upload_excel_to_snowflake, test_connection, get_upload_versions, 
+                                        delete_version, fix_active_versions, find_duplicate_version,
+                                        upload_data_hash, load_concurrently)
+        from bd.excel_reader import file_hash
         snowflake_available = True
     except ImportError:
         snowflake_available = False
@@ -108,9 +72,10 @@ def show_data_upload():
         col1, col2 = st.columns([3, 1])
         
         with col1:
-            # Try to load existing data for selected company
-            timeline_data = load_data_with_history(empresa=empresa_code)
-            analytics_data = load_analytics_data(empresa=empresa_code)
+            # Try to load existing data for selected company (both table types in parallel)
+            dados, _ = load_concurrently([(empresa_code, "TIMELINE"), (empresa_code, "ANALYTICS")])
+            timeline_data = dados[(empresa_code, "TIMELINE")]
+            analytics_data = dados[(empresa_code, "ANALYTICS")]
             
             # Show data summary
             if timeline_data is not None and len(timeline_data) > 0:
@@ -145,6 +110,8 @@ def show_data_upload():
                             
                             # Show filename if available
                             filename_info = f" - 📁 {v.get('arquivo_origem', 'N/A')}" if v.get('arquivo_origem') else ""
+                            if v.get('load_mode') == 'DELTA':
+                                filename_info += f" - 🔀 incremental (base v{v.get('base_version_id')})"
                             
                             # Create a container for each version
                             version_container = st.container()
@@ -205,6 +172,8 @@ def show_data_upload():
                             
                             # Show filename if available
                             filename_info = f" - 📁 {v.get('arquivo_origem', 'N/A')}" if v.get('arquivo_origem') else ""
+                            if v.get('load_mode') == 'DELTA':
+                                filename_info += f" - 🔀 incremental (base v{v.get('base_version_id')})"
                             
                             # Create a container for each version
                             version_container = st.container()
@@ -292,6 +261,14 @@ def show_data_upload():
         help="Adicione uma descrição para identificar facilmente esta versão"
     )
     
+    load_mode_label = st.radio(
+        "🔀 Modo de carga:",
+        ["📦 Completa", "🔀 Incremental (somente alterações)"],
+        horizontal=True,
+        help="Incremental compara com a versão ativa e grava apenas produtos novos, alterados ou removidos"
+    )
+    load_mode = "DELTA" if load_mode_label.startswith("🔀") else "FULL"
+    
     if upload_type == "📅 Timeline de Compras (MOQ/Fornecedores)":
         st.info("📝 **Para Timeline:** Upload com colunas Item, Fornecedor, QTD, Modelo, Preço FOB, MOQ, etc.")
         table_prefix = "TIMELINE"
@@ -316,104 +293,114 @@ def show_data_upload():
         
         if snowflake_available:
             try:
-                # Use sophisticated Excel analysis to handle different header positions
-                df_full, detected_sheet, detected_header = analyze_and_process_excel(uploaded_file)
+                # Identical bytes (even under another file name) - stop before any parsing
+                arquivo_hash = file_hash(uploaded_file)
+                content_duplicate = find_duplicate_version(empresa_code, table_prefix, content_hash=arquivo_hash)
+                force_upload = False
+                
+                if content_duplicate:
+                    st.warning(f"⚠️ **Arquivo duplicado detectado!** \n\n📁 **{uploaded_file.name}** tem o mesmo conteúdo de "
+                               f"**{content_duplicate['arquivo_origem']}**, enviado como versão v{content_duplicate['version_id']} "
+                               f"em {content_duplicate['upload_date']}")
+                    force_upload = st.checkbox("🔄 Enviar mesmo assim (criar nova versão)", key="force_upload")
+                
+                if content_duplicate and not force_upload:
+                    st.error("🚫 Duplicado - arquivo não processado")
+                else:
+                    # Use sophisticated Excel analysis to handle different header positions
+                    df_full, detected_sheet, detected_header = analyze_and_process_excel(uploaded_file)
                 
-                if df_full is not None and len(df_full) > 0:
-                    st.success(f"✅ Dados carregados: {len(df_full)} linhas")
-                    st.dataframe(df_full.head(10))
+                    if df_full is not None and len(df_full) > 0:
+                        st.success(f"✅ Dados carregados: {len(df_full)} linhas")
+                        st.dataframe(df_full.head(10))
                     
-                    # Show data quality info
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        st.metric("📊 Linhas", len(df_full))
-                    with col2:
-                        st.metric("📋 Colunas", len(df_full.columns))
-                    with col3:
-                        st.metric("✅ Valores válidos", df_full.count().sum())
-                    with col4:
-                        file_size = len(uploaded_file.getvalue()) / 1024
-                        st.metric("📁 Tamanho", f"{file_size:.1f} KB")
+                        # Show data quality info
+                        col1, col2, col3, col4 = st.columns(4)
+                        with col1:
+                            st.metric("📊 Linhas", len(df_full))
+                        with col2:
+                            st.metric("📋 Colunas", len(df_full.columns))
+                        with col3:
+                            st.metric("✅ Valores válidos", df_full.count().sum())
+                        with col4:
+                            file_size = len(uploaded_file.getvalue()) / 1024
+                            st.metric("📁 Tamanho", f"{file_size:.1f} KB")
                     
-                    # Check for duplicate files
-                    file_hash = str(hash(str(df_full.values.tobytes())))
-                    is_duplicate = False
+                        # Clean DataFrame for upload
+                        df_clean = df_full.copy()
+                        for col in df_clean.columns:
+                            if df_clean[col].dtype == 'object':
+                                df_clean[col] = df_clean[col].fillna('')
+                            else:
+                                df_clean[col] = df_clean[col].fillna(0)
                     
-                    try:
-                        existing_versions = get_upload_versions(empresa_code, table_prefix, limit=50)
-                        for version in existing_versions:
-                            if version.get('arquivo_origem') == uploaded_file.name:
-                                is_duplicate = True
-                                st.warning(f"⚠️ **Arquivo duplicado detectado!** \n\n📁 **{uploaded_file.name}** já foi enviado anteriormente como versão v{version['version_id']} em {version['upload_date']}")
+                        # Same rows in a different file (re-saved or re-exported workbook)
+                        is_duplicate = False
+                        if not force_upload:
+                            try:
+                                data_duplicate = find_duplicate_version(empresa_code, table_prefix,
+                                                                        data_hash=upload_data_hash(df_clean, table_prefix))
+                                if data_duplicate:
+                                    is_duplicate = True
+                                    st.warning(f"⚠️ **Dados duplicados detectados!** \n\n📁 **{uploaded_file.name}** tem os mesmos dados da versão "
+                                               f"v{data_duplicate['version_id']} ({data_duplicate['arquivo_origem']}) enviada em {data_duplicate['upload_date']}")
                                 
-                                # Show option to proceed anyway
-                                if st.checkbox("🔄 Enviar mesmo assim (criar nova versão)", key="force_upload"):
-                                    is_duplicate = False
-                                break
-                    except:
-                        pass  # If version check fails, allow upload
+                                    # Show option to proceed anyway
+                                    if st.checkbox("🔄 Enviar mesmo assim (criar nova versão)", key="force_upload_data"):
+                                        is_duplicate = False
+                            except Exception:
+                                pass  # If version check fails, allow upload
                     
-                    # Upload button
-                    col1, col2 = st.columns([2, 1])
-                    with col1:
-                        upload_button = st.button("💾 Salvar na Nuvem", 
-                                                 type="primary" if not is_duplicate else "secondary", 
-                                                 use_container_width=True,
-                                                 disabled=is_duplicate)
-                    with col2:
-                        if is_duplicate:
-                            st.error("🚫 Duplicado")
-                        else:
-                            st.info(f"📊 Para: {empresa_selecionada}")
+                        # Upload button
+                        col1, col2 = st.columns([2, 1])
+                        with col1:
+                            upload_button = st.button("💾 Salvar na Nuvem", 
+                                                     type="primary" if not is_duplicate else "secondary", 
+                                                     use_container_width=True,
+                                                     disabled=is_duplicate)
+                        with col2:
+                            if is_duplicate:
+                                st.error("🚫 Duplicado")
+                            else:
+                                st.info(f"📊 Para: {empresa_selecionada}")
                     
-                    if upload_button:
-                        with st.spinner(f"📤 Processando e enviando dados para Snowflake ({empresa_selecionada})..."):
-                            try:
-                                # Clean DataFrame for upload
-                                df_clean = df_full.copy()
-                                for col in df_clean.columns:
-                                    if df_clean[col].dtype == 'object':
-                                        df_clean[col] = df_clean[col].fillna('')
-                                    else:
-                                        df_clean[col] = df_clean[col].fillna(0)
-                                
-                                # Upload to Snowflake
-                                success = upload_excel_to_snowflake(
-                                    df=df_clean, 
-                                    arquivo_nome=uploaded_file.name, 
-                                    empresa=empresa_code,
-                                    usuario="minipa", 
-                                    table_type=table_prefix,
-                                    description=version_description or f"Upload {table_prefix} - {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M')}"
-                                )
+                        if upload_button:
+                            with st.spinner(f"📤 Processando e enviando dados para Snowflake ({empresa_selecionada})..."):
+                                try:
+                                    # Upload to Snowflake
+                                    success = upload_excel_to_snowflake(
+                                        df=df_clean, 
+                                        arquivo_nome=uploaded_file.name, 
+                                        empresa=empresa_code,
+                                        usuario="minipa", 
+                                        table_type=table_prefix,
+                                        description=version_description or f"Upload {table_prefix} - {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M')}",
+                                        content_hash=arquivo_hash,
+                                        load_mode=load_mode
+                                    )
                                 
-                                if success:
-                                    st.success(f"🎉 Dados salvos com sucesso para {empresa_selecionada}!")
-                                    st.balloons()
+                                    if success:
+                                        st.success(f"🎉 Dados salvos com sucesso para {empresa_selecionada}!")
+                                        st.balloons()
                                     
-                                    # Show different messages based on upload type
-                                    if table_prefix == "TIMELINE":
-                                        st.info("✅ **Dados salvos para Timeline de Compras**")
-                                        st.write("👉 Acesse a página '📅 Timeline de Compras' para ver a análise")
-                                    else:
-                                        st.info("✅ **Dados salvos para Análise de Estoque**") 
-                                        st.write("👉 Acesse a página '📊 Análise de Estoque' para ver os relatórios")
+                                        # Show different messages based on upload type
+                                        if table_prefix == "TIMELINE":
+                                            st.info("✅ **Dados salvos para Timeline de Compras**")
+                                            st.write("👉 Acesse a página '📅 Timeline de Compras' para ver a análise")
+                                        else:
+                                            st.info("✅ **Dados salvos para Análise de Estoque**") 
+                                            st.write("👉 Acesse a página '📊 Análise de Estoque' para ver os relatórios")
                                     
-                                    # Clear cache for this company to show new data immediately
-                                    if table_prefix == "TIMELINE":
-                                        load_data_with_history.clear()
+                                        # The versions fingerprint changed - new data shows up without clearing caches
+                                        st.rerun()
                                     else:
-                                        load_analytics_data.clear()
-                                        
-                                    st.rerun()
-                                else:
-                                    st.error(f"❌ Erro ao salvar dados para {empresa_selecionada}")
+                                        st.error(f"❌ Erro ao salvar dados para {empresa_selecionada}")
                                     
-                            except Exception as e:
-                                st.error(f"❌ Erro ao processar: {str(e)}")
-                else:
-                    st.error("❌ Não foi possível processar o arquivo")
-                    st.info("💡 Verifique se o arquivo Excel tem dados válidos")
+                                except Exception as e:
+                                    st.error(f"❌ Erro ao processar: {str(e)}")
+                    else:
+                        st.error("❌ Não foi possível processar o arquivo")
+                        st.info("💡 Verifique se o arquivo Excel tem dados válidos")
                     
             except Exception as e:
                 st.error(f"❌ Erro ao analisar arquivo: {str(e)}")
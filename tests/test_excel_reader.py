@@ -0,0 +1,76 @@
+"""
+bd/excel_reader: the calamine and openpyxl engines must stream the same frames
+"""
+
+import io
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bd.excel_reader import iter_excel_chunks, read_excel_fast  # noqa: E402
+
+HEADER_ROW = 3
+
+def build_workbook():
+    """Title rows, a leading empty column, blank cells and a blank row"""
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws['B1'] = 'Relatório de Compras'
+    ws.append([])
+    ws['B4'], ws['C4'], ws['D4'], ws['E4'] = 'Item', 'Modelo', 'QTD', 'CBM'
+    rows = [
+        ('A1', 'M-1', 10, 0.5),
+        ('A2', None, None, 1.25),
+        (None, None, None, None),
+        ('A3', 'M-3', 7, None),
+        ('A4', '', 3, 2.0),
+    ]
+    for offset, values in enumerate(rows, start=5):
+        for column, value in zip('BCDE', values):
+            if value is not None:
+                ws[f'{column}{offset}'] = value
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+def read_chunks(data, engine, chunk_size=2):
+    chunks = list(iter_excel_chunks(data, header_row=HEADER_ROW, chunk_size=chunk_size, engine=engine))
+    return pd.concat(chunks, ignore_index=True)
+
+def test_openpyxl_matches_read_excel():
+    data = build_workbook()
+    streamed = read_chunks(data, 'openpyxl')
+    expected = read_excel_fast(data, header=HEADER_ROW, engine='openpyxl').dropna(how='all').reset_index(drop=True)
+
+    assert list(streamed.columns) == list(expected.columns)
+    assert streamed.columns[0] == 'Unnamed: 0'
+    pd.testing.assert_frame_equal(streamed, expected, check_dtype=False)
+
+def test_calamine_matches_openpyxl():
+    pytest.importorskip('python_calamine')
+    data = build_workbook()
+    with_openpyxl = read_chunks(data, 'openpyxl')
+    with_calamine = read_chunks(data, 'calamine')
+
+    # Blank row dropped, leading empty column kept, numeric columns stay numeric
+    assert len(with_calamine) == 4
+    assert with_calamine.columns[0] == 'Unnamed: 0'
+    assert pd.api.types.is_numeric_dtype(with_calamine['CBM'])
+    pd.testing.assert_frame_equal(with_calamine, with_openpyxl)
+
+def test_usecols_selects_same_columns():
+    pytest.importorskip('python_calamine')
+    data = build_workbook()
+    frames = [
+        pd.concat(list(iter_excel_chunks(data, header_row=HEADER_ROW, usecols=['Item', 'CBM'], engine=engine)),
+                  ignore_index=True)
+        for engine in ('openpyxl', 'calamine')
+    ]
+    assert list(frames[0].columns) == ['Item', 'CBM']
+    pd.testing.assert_frame_equal(frames[0], frames[1])